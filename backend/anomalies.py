@@ -0,0 +1,224 @@
+"""
+Spending anomaly detection with robust statistics.
+
+Two kinds of anomalies are reported:
+
+* transaction: an amount far from what the merchant usually charges. Each
+  row is compared with the median and median absolute deviation (MAD) of
+  the TRAILING_TRANSACTIONS earlier rows of its (merchant, direction)
+  group, giving a robust z-score ``0.6745 * (amount - median) / MAD``.
+  Later rows never affect the score, so a price change does not flag the
+  charges made before it.
+* category: a month in which a category's spending is far above its
+  trailing TRAILING_MONTHS months, scored the same way against the rolling
+  median and MAD of the preceding months.
+
+Both are maintained incrementally. Each merchant keeps its rows in date
+order and only rows from the earliest new one onwards are re-scored;
+monthly spend per category is a matrix that new rows are added into. An
+upload never rescans the full history.
+"""
+import warnings
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from columnar import ColumnarTransactionStore, IncrementalAnalysis
+from recurring import MerchantIndex, merchant_keys
+
+# Iglewicz and Hoaglin's cut-off for modified z-scores
+Z_THRESHOLD = 3.5
+# Observations needed before a merchant or category is scored
+MIN_HISTORY = 5
+TRAILING_MONTHS = 12
+TRAILING_TRANSACTIONS = 24
+# Lower bound on the MAD as a fraction of the median, so near-constant
+# series (subscriptions) do not flag every cent of change
+MIN_SCALE_FRACTION = 0.05
+_MAD_TO_Z = 0.6745
+
+
+def robust_z(values: np.ndarray, median: np.ndarray, mad: np.ndarray) -> np.ndarray:
+    scale = np.maximum(mad, MIN_SCALE_FRACTION * np.abs(median))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = _MAD_TO_Z * (values - median) / scale
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+class AnomalyDetector(IncrementalAnalysis):
+    """Anomalies keyed by ("transaction", merchant key) and ("category", category code)"""
+
+    def reset(self):
+        super().reset()
+        self.merchants = MerchantIndex()
+        self._keys = np.empty(0, dtype=np.int64)
+        # Store rows of each merchant key, ordered by (date, id)
+        self._key_rows: Dict[int, np.ndarray] = {}
+        # Monthly expenses: row = category code + 1 (0 is uncategorized), column = month - base month
+        self._base_month = None
+        self._spend = np.zeros((0, 0))
+        self._first_month = np.empty(0, dtype=np.int64)
+
+    def update(self, store: ColumnarTransactionStore, new_rows: slice):
+        results = dict(self.results)
+        self._update_transactions(store, new_rows, results)
+        self._update_categories(store, new_rows, results)
+        self.results = results
+
+    # Transactions ---------------------------------------------------------
+
+    def _update_transactions(self, store: ColumnarTransactionStore, new_rows: slice, results: Dict):
+        keys = merchant_keys(self.merchants, store, new_rows)
+        self._keys = np.concatenate((self._keys, keys))
+        added = np.arange(new_rows.start, new_rows.stop)[keys >= 0]
+        if len(added) == 0:
+            return
+
+        # Merge the new rows into each key's ordered rows and keep, as scoring
+        # context, the TRAILING_TRANSACTIONS rows before the first new one
+        added = added[np.argsort(self._keys[added], kind="stable")]
+        dirty, starts = np.unique(self._keys[added], return_index=True)
+        segments, first_scored = [], []
+        for key, new in zip(dirty.tolist(), np.split(added, starts[1:])):
+            rows = np.concatenate((self._key_rows.get(key, np.empty(0, dtype=np.int64)), new))
+            rows = rows[np.lexsort((store.ids[rows], store.dates[rows]))]
+            self._key_rows[key] = rows
+            first = int(np.argmax(rows >= new_rows.start))
+            context = max(first - TRAILING_TRANSACTIONS, 0)
+            segments.append(rows[context:])
+            first_scored.append(first - context)
+
+        lengths = np.array([len(segment) for segment in segments])
+        rows = np.concatenate(segments)
+        groups = np.repeat(np.arange(len(dirty)), lengths)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        scored = offsets >= np.repeat(first_scored, lengths)
+
+        # Window of the TRAILING_TRANSACTIONS rows before each row, limited to its own key
+        amounts = store.amounts[rows]
+        padding = np.full(TRAILING_TRANSACTIONS, np.nan)
+        windows = sliding_window_view(np.concatenate((padding, amounts)), TRAILING_TRANSACTIONS)[:-1][scored]
+        window_groups = sliding_window_view(
+            np.concatenate((padding - np.inf, groups)), TRAILING_TRANSACTIONS
+        )[:-1][scored]
+        windows = np.where(window_groups == groups[scored][:, None], windows, np.nan)
+        observed = np.sum(~np.isnan(windows), axis=1)
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            # Windows without any history yet are all-NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(windows, axis=1)
+            mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+
+        rows, groups, amounts = rows[scored], groups[scored], amounts[scored]
+        z = robust_z(amounts, median, mad)
+        flagged = (np.abs(z) >= Z_THRESHOLD) & (observed >= MIN_HISTORY)
+
+        # Anomalies before the first re-scored row of a key still stand
+        for group, key in enumerate(dirty.tolist()):
+            first = rows[np.searchsorted(groups, group)]
+            first_date = pd.Timestamp(store.dates[first]).isoformat()
+            first_id = int(store.ids[first])
+            kept = [
+                item for item in results.pop(("transaction", key), [])
+                if (item["date"], item["transaction_id"]) < (first_date, first_id)
+            ]
+            if kept:
+                results[("transaction", key)] = kept
+        for position in np.flatnonzero(flagged):
+            row = rows[position]
+            category_code = store.category_codes[row]
+            results.setdefault(("transaction", int(dirty[groups[position]])), []).append({
+                "kind": "transaction",
+                "transaction_id": int(store.ids[row]),
+                "date": pd.Timestamp(store.dates[row]).isoformat(),
+                "description": store.descriptions.values[store.description_codes[row]],
+                "category": store.categories.values[category_code] if category_code >= 0 else None,
+                "amount": round(float(amounts[position]), 2),
+                "expected": round(float(median[position]), 2),
+                "score": round(float(z[position]), 2),
+            })
+
+    # Categories -----------------------------------------------------------
+
+    def _grow_spend(self, months: np.ndarray, categories: np.ndarray):
+        """Widen the spend matrix to cover ``months`` and ``categories``"""
+        if self._base_month is None:
+            self._base_month = int(months.min())
+        height, width = self._spend.shape
+        base = min(self._base_month, int(months.min()))
+        end = max(self._base_month + width, int(months.max()) + 1)
+        new_height = max(height, int(categories.max()) + 1)
+        if base == self._base_month and end - base == width and new_height == height:
+            return
+
+        shift = self._base_month - base
+        grown = np.zeros((new_height, end - base))
+        grown[:height, shift:shift + width] = self._spend
+        first = np.full(new_height, np.iinfo(np.int64).max, dtype=np.int64)
+        first[:height] = self._first_month
+        self._spend, self._first_month, self._base_month = grown, first, base
+
+    def _update_categories(self, store: ColumnarTransactionStore, new_rows: slice, results: Dict):
+        amounts = store.amounts[new_rows]
+        expenses = amounts < 0
+        if not expenses.any():
+            return
+        months = store.dates[new_rows][expenses].astype("datetime64[M]").astype(np.int64)
+        categories = store.category_codes[new_rows][expenses].astype(np.int64) + 1
+
+        self._grow_spend(months, categories)
+        np.add.at(self._spend, (categories, months - self._base_month), -amounts[expenses])
+        np.minimum.at(self._first_month, categories, months)
+
+        dirty = np.unique(categories)
+        spend = self._spend[dirty]
+        month_count = spend.shape[1]
+        # Months before a category's first expense are unknown, not zero
+        known = (np.arange(month_count)[None, :] + self._base_month) >= self._first_month[dirty][:, None]
+        history = np.where(known, spend, np.nan)
+
+        # Trailing window of the TRAILING_MONTHS months before each month
+        padded = np.concatenate((np.full((len(dirty), TRAILING_MONTHS), np.nan), history[:, :-1]), axis=1)
+        windows = sliding_window_view(padded, TRAILING_MONTHS, axis=1)
+        observed = np.sum(~np.isnan(windows), axis=2)
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            # Windows without any history yet are all-NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(windows, axis=2)
+            mad = np.nanmedian(np.abs(windows - median[:, :, None]), axis=2)
+
+        z = robust_z(history, median, mad)
+        flagged = known & (observed >= MIN_HISTORY) & (z >= Z_THRESHOLD)
+
+        for code in dirty.tolist():
+            results.pop(("category", code), None)
+        for index, column in zip(*np.nonzero(flagged)):
+            code = int(dirty[index])
+            month = np.datetime64(int(column) + self._base_month, "M")
+            results.setdefault(("category", code), []).append({
+                "kind": "category",
+                "category": store.categories.values[code - 1] if code > 0 else None,
+                "month": str(month),
+                "date": pd.Timestamp(month).isoformat(),
+                "amount": round(float(spend[index, column]), 2),
+                "expected": round(float(median[index, column]), 2),
+                "score": round(float(z[index, column]), 2),
+            })
+
+
+def find_anomalies(store: ColumnarTransactionStore, kind: Optional[str] = None,
+                   since: Optional[date] = None, min_score: float = Z_THRESHOLD) -> List[dict]:
+    """Anomalies newest first, optionally limited to one kind and to dates on or after ``since``"""
+    results = AnomalyDetector.for_store(store).refresh(store)
+    since_iso = pd.Timestamp(since).isoformat() if since is not None else None
+    anomalies = [
+        item
+        for (item_kind, _), items in results.items() if kind is None or item_kind == kind
+        for item in items
+        if abs(item["score"]) >= min_score and (since_iso is None or item["date"] >= since_iso)
+    ]
+    anomalies.sort(key=lambda item: (item["date"], abs(item["score"])), reverse=True)
+    return anomalies
@@ -0,0 +1,249 @@
+"""
+Cold archival of old transactions.
+
+Transactions dated before the horizon (ARCHIVE_HORIZON_MONTHS before the
+current month) are moved out of the hot ``transactions`` table into one
+archive table per calendar year, ``transactions_archive_<year>``, keeping
+their ids. Monthly rollups are left untouched, so cash flow and category
+analytics read archived months as before; the hot table and its indexes only
+hold recent history.
+
+Queries over raw transactions take their rows from ``transactions_source``:
+the Transaction model itself when no archive year can hold rows on or after
+the query's ``since`` date, otherwise an alias of Transaction over a
+UNION ALL of the hot table and the archive years that can. Callers use its
+attributes exactly like Transaction's; ``archived_source`` covers the archive
+years alone. Full-text search only indexes the hot table and falls back to
+substring matching over archived years; uploads check archived fingerprints
+so old rows are not re-added.
+
+The archive job moves rows in batches of ARCHIVE_BATCH_SIZE, committing after
+each so readers and uploads are only held up briefly, then compacts the
+database: VACUUM (ANALYZE) on PostgreSQL, which does not block readers or
+writers; on SQLite an incremental vacuum plus PRAGMA optimize. SQLite
+databases created before incremental auto-vacuum was enabled can only be
+shrunk by a full VACUUM, which rewrites the file under an exclusive lock, so
+the job skips it; run ``--full-vacuum`` as an offline maintenance step with
+the API stopped (it also switches the file to incremental auto-vacuum). Run
+the job from cron or let the API run it every ARCHIVE_INTERVAL_HOURS:
+
+    python backend/archive.py                  # archive and compact every tenant
+    python backend/archive.py --horizon-months 36 --no-vacuum
+    python backend/archive.py --full-vacuum    # offline: API stopped
+"""
+import os
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, inspect, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from models import Transaction, tenant_of
+from search import rebuild_search_index
+from tenancy import engine_for, known_tenants, tenant_session
+
+ARCHIVE_HORIZON_MONTHS = int(os.getenv("ARCHIVE_HORIZON_MONTHS", "24"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "0"))
+
+ARCHIVE_TABLE_PREFIX = "transactions_archive_"
+_ARCHIVE_TABLE_RE = re.compile(rf"^{ARCHIVE_TABLE_PREFIX}(\d{{4}})$")
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups
+_LOOKUP_CHUNK_SIZE = 500
+
+# Archive tables are created on demand, so they live outside Base.metadata
+_archive_metadata = MetaData()
+
+
+def archive_table(year: int) -> Table:
+    """The archive table for ``year``, with the hot table's columns and lookup indexes"""
+    name = f"{ARCHIVE_TABLE_PREFIX}{year}"
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+               autoincrement=False)
+        for column in Transaction.__table__.columns
+    ]
+    return Table(
+        name, _archive_metadata, *columns,
+        Index(f"ux_{name}_fingerprint", "fingerprint", unique=True),
+        Index(f"ix_{name}_tenant_date_id", "tenant_id", "date", "id"),
+        Index(f"ix_{name}_tenant_account_date_id", "tenant_id", "account_id", "date", "id"),
+    )
+
+
+def archive_years(bind) -> List[int]:
+    """Years with an archive table in ``bind``'s database"""
+    names = inspect(bind).get_table_names()
+    return sorted(int(match.group(1)) for match in map(_ARCHIVE_TABLE_RE.match, names) if match)
+
+
+def _as_date(day) -> date:
+    return day.date() if isinstance(day, datetime) else day
+
+
+def _years_since(db: Session, since: Optional[date]) -> List[int]:
+    years = archive_years(db.get_bind())
+    if since is not None:
+        years = [year for year in years if _as_date(since) < date(year + 1, 1, 1)]
+    return years
+
+
+def _union_source(db: Session, tables: List[Table], name: str):
+    tenant = tenant_of(db)
+    names = [column.name for column in Transaction.__table__.columns]
+    # Filter each branch by tenant so the planner can use the tenant-leading indexes
+    parts = [select(*(table.c[name] for name in names)).where(table.c.tenant_id == tenant) for table in tables]
+    subquery = union_all(*parts).subquery(name) if len(parts) > 1 else parts[0].subquery(name)
+    # Archive columns are not Transaction's own, so they are matched by name
+    return aliased(Transaction, subquery, adapt_on_names=True)
+
+
+def transactions_source(db: Session, since: Optional[date] = None):
+    """
+    Transaction, or an alias of it over the hot table and every archive year
+    that can hold rows dated on or after ``since`` (all of them for None)
+    """
+    years = _years_since(db, since)
+    if not years:
+        return Transaction
+    return _union_source(db, [Transaction.__table__] + [archive_table(year) for year in years], "all_transactions")
+
+
+def archived_source(db: Session, since: Optional[date] = None):
+    """
+    An alias of Transaction over the archive years alone that can hold rows
+    dated on or after ``since``, or None when there are none
+    """
+    years = _years_since(db, since)
+    if not years:
+        return None
+    return _union_source(db, [archive_table(year) for year in years], "archived_transactions")
+
+
+def archived_fingerprints(db: Session, frame: pd.DataFrame) -> set:
+    """Fingerprints in ``frame`` (with date and fingerprint columns) already stored in an archive year"""
+    years = set(archive_years(db.get_bind())) & set(pd.to_datetime(frame["date"]).dt.year.unique().tolist())
+    found = set()
+    for year in sorted(years):
+        table = archive_table(year)
+        in_year = frame.loc[pd.to_datetime(frame["date"]).dt.year == year, "fingerprint"].dropna().unique().tolist()
+        for start in range(0, len(in_year), _LOOKUP_CHUNK_SIZE):
+            chunk = in_year[start:start + _LOOKUP_CHUNK_SIZE]
+            found.update(db.execute(select(table.c.fingerprint).where(table.c.fingerprint.in_(chunk))).scalars())
+    return found
+
+
+def archive_horizon(months: int = ARCHIVE_HORIZON_MONTHS, today: Optional[date] = None) -> date:
+    """First day of the month ``months`` before the current one; older transactions are archived"""
+    start = pd.Period(today or date.today(), freq="M") - months
+    return start.start_time.date()
+
+
+def archive_transactions(db: Session, horizon: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> Dict[int, int]:
+    """
+    Move the session tenant's transactions dated before ``horizon`` into the
+    yearly archive tables, committing after every batch. Returns the number
+    of rows archived per year.
+    """
+    hot = Transaction.__table__
+    # SQLite hands out max(id) + 1 for new rows, so the newest row stays in
+    # the hot table and archived ids are never reused
+    newest = db.execute(select(func.max(hot.c.id))).scalar()
+    if newest is None:
+        return {}
+    old = (hot.c.tenant_id == tenant_of(db)) & (hot.c.date < datetime.combine(horizon, datetime.min.time())) \
+        & (hot.c.id < newest)
+
+    archived: Dict[int, int] = {}
+    while True:
+        batch = db.execute(select(hot.c.id, hot.c.date).where(old).order_by(hot.c.id).limit(batch_size)).all()
+        if not batch:
+            return archived
+        in_batch = old & hot.c.id.between(batch[0].id, batch[-1].id)
+        years = pd.Series([row.date.year for row in batch]).value_counts()
+        for year, count in years.items():
+            year = int(year)
+            table = archive_table(year)
+            # In the session's transaction, which may already hold SQLite's write lock
+            table.create(db.connection(), checkfirst=True)
+            in_year = in_batch & (hot.c.date >= datetime(year, 1, 1)) & (hot.c.date < datetime(year + 1, 1, 1))
+            db.execute(insert(table).from_select([column.name for column in hot.columns], select(*hot.c).where(in_year)))
+            archived[year] = archived.get(year, 0) + int(count)
+        db.execute(delete(hot).where(in_batch))
+        db.commit()
+
+
+_SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def compact_database(engine, full: bool = False):
+    """
+    Reclaim the space archived rows left behind and refresh planner statistics.
+
+    On SQLite without incremental auto-vacuum, pages are only returned by
+    ``full``, a VACUUM that holds an exclusive lock while it rewrites the
+    file: an offline step. It enables incremental auto-vacuum on the way.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql(f"VACUUM (ANALYZE) {Transaction.__tablename__}")
+        elif engine.dialect.name == "sqlite":
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == _SQLITE_AUTO_VACUUM_INCREMENTAL:
+                # Frees pages a few at a time without rewriting the file
+                conn.exec_driver_sql("PRAGMA incremental_vacuum")
+            elif full:
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA optimize")
+
+
+def run_archive_job(horizon_months: int = ARCHIVE_HORIZON_MONTHS, vacuum: bool = True,
+                    full_vacuum: bool = False) -> Dict[str, Dict[int, int]]:
+    """
+    Archive every tenant's old transactions, then compact each database (for
+    the scheduler); ``full_vacuum`` is for offline runs only
+    """
+
+    horizon = archive_horizon(horizon_months)
+    archived, engines = {}, {}
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            archived[tenant] = archive_transactions(db, horizon)
+        finally:
+            db.close()
+        tenant_engine = engine_for(tenant)
+        engines[id(tenant_engine)] = tenant_engine
+    if vacuum and (any(archived.values()) or full_vacuum):
+        for tenant_engine in engines.values():
+            # Shrinks the full-text index to the rows left in the hot table
+            rebuild_search_index(tenant_engine)
+            compact_database(tenant_engine, full=full_vacuum)
+    return archived
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models import create_tables
+
+    parser = argparse.ArgumentParser(description="Move old transactions into yearly archive tables")
+    parser.add_argument("--horizon-months", type=int, default=ARCHIVE_HORIZON_MONTHS,
+                        help="keep this many months (plus the current one) in the hot table")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip compacting the database afterwards")
+    parser.add_argument("--full-vacuum", action="store_true",
+                        help="SQLite: rewrite databases without incremental auto-vacuum (stop the API first)")
+    args = parser.parse_args()
+
+    create_tables()
+    archived = run_archive_job(args.horizon_months, vacuum=not args.no_vacuum, full_vacuum=args.full_vacuum)
+    for tenant, years in archived.items():
+        if years:
+            print(f"{tenant}: archived {sum(years.values())} transactions "
+                  f"({', '.join(f'{year}: {count}' for year, count in sorted(years.items()))})")
+    print(f"Transactions before {archive_horizon(args.horizon_months).isoformat()} are archived")
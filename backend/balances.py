@@ -0,0 +1,382 @@
+"""
+Running account balances derived from transactions.
+
+Every account keeps an opening balance (its balance before the first
+transaction), so the balance after any transaction is the opening balance
+plus a running ``SUM(amount) OVER (PARTITION BY account_id ORDER BY date, id)``.
+Ingest adds each batch to ``Account.balance`` so the stored current balance
+no longer drifts from the transactions behind it.
+
+Month-end checkpoints hold the running balance per account. A balance as of
+any date starts from the nearest checkpoint on or before it and only sums the
+transactions after that, so lookups stay cheap however long the history is.
+Ingest shifts the checkpoints at or after each new transaction; new month
+ends are added by the daily snapshot job or offline:
+
+    python backend/balances.py            # add checkpoints for months since the last one
+    python backend/balances.py --rebuild  # recompute every checkpoint
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import Account, BalanceCheckpoint, upsert_insert
+from rollups import month_expression
+from archive import transactions_source
+
+
+# Accounts per query: each gets its own OR term, and SQLite rejects expression
+# trees deeper than 1000, so larger account sets are summed chunk by chunk
+ACCOUNT_CHUNK_SIZE = 250
+
+
+def _chunks(items: List, size: int = ACCOUNT_CHUNK_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _day_after(day: date) -> datetime:
+    """Start of the day after ``day``, the exclusive bound for transactions dated on or before it"""
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def _month_end(label: str) -> date:
+    return pd.Period(label, freq="M").end_time.date()
+
+
+def _transaction_totals(db: Session) -> Dict[int, float]:
+    source = transactions_source(db)
+    return dict(db.query(source.account_id, func.sum(source.amount)).group_by(source.account_id).all())
+
+
+def initialize_opening_balances(db: Session) -> int:
+    """
+    Derive the opening balance of accounts that have none yet, treating
+    their stored balance as current. Returns the number of accounts updated.
+    """
+    accounts = db.query(Account.id, Account.balance).filter(Account.opening_balance.is_(None)).all()
+    if not accounts:
+        return 0
+    totals = _transaction_totals(db)
+    db.bulk_update_mappings(Account, [
+        {"id": account.id, "opening_balance": (account.balance or 0.0) - (totals.get(account.id) or 0.0)}
+        for account in accounts
+    ])
+    return len(accounts)
+
+
+def reset_opening_balances(db: Session, account_ids: Iterable[int]):
+    """
+    Re-anchor accounts whose current balance was set directly (e.g. by an
+    account upload): the opening balance and existing checkpoints move by
+    the same amount so they agree with the new balance.
+    """
+    account_ids = list(account_ids)
+    if not account_ids:
+        return
+    accounts = db.query(Account.id, Account.balance, Account.opening_balance).filter(Account.id.in_(account_ids)).all()
+    totals = _transaction_totals(db)
+    openings = {account.id: (account.balance or 0.0) - (totals.get(account.id) or 0.0) for account in accounts}
+    db.bulk_update_mappings(Account, [
+        {"id": account_id, "opening_balance": opening} for account_id, opening in openings.items()
+    ])
+
+    shifts = [
+        {"b_account_id": account.id, "shift": openings[account.id] - account.opening_balance}
+        for account in accounts
+        if account.opening_balance is not None and openings[account.id] != account.opening_balance
+    ]
+    if shifts:
+        checkpoints = BalanceCheckpoint.__table__
+        db.execute(
+            update(checkpoints)
+            .where(checkpoints.c.account_id == bindparam("b_account_id"))
+            .values(balance=checkpoints.c.balance + bindparam("shift")),
+            shifts
+        )
+
+
+def apply_balance_deltas(db: Session, frame: pd.DataFrame):
+    """
+    Add newly ingested transactions to their accounts' current balances and
+    to every checkpoint dated on or after them.
+
+    ``frame`` needs account_id, amount and date columns.
+    """
+    if frame.empty:
+        return
+    deltas = pd.DataFrame({
+        "account_id": frame["account_id"],
+        "date": pd.to_datetime(frame["date"]).dt.date,
+        "amount": frame["amount"].astype(float),
+    })
+
+    per_account = deltas.groupby("account_id")["amount"].sum()
+    accounts = Account.__table__
+    db.execute(
+        update(accounts)
+        .where(accounts.c.id == bindparam("b_id"))
+        .values(balance=func.coalesce(accounts.c.balance, 0.0) + bindparam("delta")),
+        [{"b_id": int(account_id), "delta": float(delta)} for account_id, delta in per_account.items()]
+    )
+
+    per_day = deltas.groupby(["account_id", "date"], as_index=False).agg(
+        delta=("amount", "sum"), count=("amount", "size")
+    )
+    checkpoints = BalanceCheckpoint.__table__
+    db.execute(
+        update(checkpoints)
+        .where(checkpoints.c.account_id == bindparam("b_account_id"), checkpoints.c.date >= bindparam("b_date"))
+        .values(
+            balance=checkpoints.c.balance + bindparam("delta"),
+            transaction_count=checkpoints.c.transaction_count + bindparam("b_count")
+        ),
+        [
+            {"b_account_id": int(row.account_id), "b_date": row.date, "delta": float(row.delta), "b_count": int(row.count)}
+            for row in per_day.itertuples(index=False)
+        ]
+    )
+
+
+def _monthly_running_totals(db: Session, since: Dict[int, Optional[date]]) -> pd.DataFrame:
+    """
+    Cumulative amount and transaction count per account through each month,
+    counting each account's transactions after ``since[account_id]`` (all of
+    them for None). Months are summed in a GROUP BY and accumulated with a
+    window function over the groups.
+    """
+    frames = [_chunk_running_totals(db, dict(chunk)) for chunk in _chunks(list(since.items()))]
+    if not frames:
+        return pd.DataFrame(columns=["account_id", "month", "cumulative", "count"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _chunk_running_totals(db: Session, since: Dict[int, Optional[date]]) -> pd.DataFrame:
+    source = transactions_source(db, None if None in since.values() else _day_after(min(since.values())))
+    month = month_expression(source.date, db.get_bind())
+    scope = [
+        source.account_id == account_id if day is None
+        else and_(source.account_id == account_id, source.date >= _day_after(day))
+        for account_id, day in since.items()
+    ]
+    monthly = select(
+        source.account_id.label("account_id"),
+        month.label("month"),
+        func.sum(source.amount).label("net"),
+        func.count().label("transactions")
+    ).where(or_(*scope)).group_by(source.account_id, month).subquery()
+
+    window = {"partition_by": monthly.c.account_id, "order_by": monthly.c.month}
+    stmt = select(
+        monthly.c.account_id,
+        monthly.c.month,
+        func.sum(monthly.c.net).over(**window),
+        func.sum(monthly.c.transactions).over(**window)
+    )
+    return pd.DataFrame(db.execute(stmt).all(), columns=["account_id", "month", "cumulative", "count"])
+
+
+def _latest_checkpoints(db: Session) -> Dict[int, BalanceCheckpoint]:
+    latest_dates = select(
+        BalanceCheckpoint.account_id, func.max(BalanceCheckpoint.date).label("date")
+    ).group_by(BalanceCheckpoint.account_id).subquery()
+    rows = db.query(BalanceCheckpoint).join(latest_dates, and_(
+        BalanceCheckpoint.account_id == latest_dates.c.account_id,
+        BalanceCheckpoint.date == latest_dates.c.date
+    ))
+    return {checkpoint.account_id: checkpoint for checkpoint in rows}
+
+
+def extend_checkpoints(db: Session, through: Optional[date] = None) -> int:
+    """
+    Add month-end checkpoints after each account's latest one, through the
+    last complete month (or ``through``). Months without transactions carry
+    the previous balance forward. Returns the number of checkpoints written;
+    the caller owns the commit.
+    """
+    through = through or date.today().replace(day=1) - timedelta(days=1)
+    accounts = {account.id: account.opening_balance or 0.0 for account in db.query(Account.id, Account.opening_balance)}
+    if not accounts:
+        return 0
+
+    latest = _latest_checkpoints(db)
+
+    totals = _monthly_running_totals(db, {
+        account_id: latest[account_id].date if account_id in latest else None for account_id in accounts
+    })
+    end_month = pd.Period(through, freq="M")
+
+    groups = dict(tuple(totals.groupby("account_id")))
+    records = []
+    for account_id, opening in accounts.items():
+        checkpoint = latest.get(account_id)
+        group = groups.get(account_id)
+        if checkpoint is None and group is None:
+            continue
+        if group is None:
+            group = totals.iloc[:0]
+        base = checkpoint.balance if checkpoint else opening
+        base_count = (checkpoint.transaction_count or 0) if checkpoint else 0
+        start = pd.Period(checkpoint.date, freq="M") + 1 if checkpoint else pd.Period(group["month"].min(), freq="M")
+        if start > end_month:
+            continue
+        months = pd.period_range(start, end_month, freq="M").astype(str)
+        # Carry the running totals through months without transactions
+        running = group.set_index("month")[["cumulative", "count"]].reindex(months).ffill().fillna(0)
+        records.extend(
+            {
+                "account_id": int(account_id),
+                "date": _month_end(month),
+                "balance": base + row.cumulative,
+                "transaction_count": int(base_count + row.count),
+            }
+            for month, row in zip(months, running.itertuples(index=False))
+        )
+
+    if records:
+        insert_stmt = upsert_insert(db.get_bind())(BalanceCheckpoint)
+        db.execute(
+            insert_stmt.on_conflict_do_update(index_elements=["account_id", "date"], set_={
+                "balance": insert_stmt.excluded.balance,
+                "transaction_count": insert_stmt.excluded.transaction_count,
+            }),
+            records
+        )
+    return len(records)
+
+
+def rebuild_checkpoints(db: Session) -> int:
+    """Recompute every checkpoint from raw transactions"""
+    db.query(BalanceCheckpoint).delete(synchronize_session=False)
+    return extend_checkpoints(db)
+
+
+def balances_as_of(db: Session, as_of: date, account_ids: Optional[List[int]] = None) -> List[Dict]:
+    """
+    End-of-day balance per account on ``as_of``: the nearest checkpoint on or
+    before that day plus the transactions between it and ``as_of``.
+    """
+    query = db.query(Account.id, Account.opening_balance).order_by(Account.id)
+    if account_ids is not None:
+        query = query.filter(Account.id.in_(account_ids))
+    result = []
+    for accounts in _chunks(query.all()):
+        result.extend(_chunk_balances_as_of(db, as_of, accounts))
+    return result
+
+
+def _chunk_balances_as_of(db: Session, as_of: date, accounts: List) -> List[Dict]:
+    nearest_dates = select(
+        BalanceCheckpoint.account_id, func.max(BalanceCheckpoint.date).label("date")
+    ).where(BalanceCheckpoint.date <= as_of).group_by(BalanceCheckpoint.account_id).subquery()
+    checkpoints = {
+        checkpoint.account_id: checkpoint
+        for checkpoint in db.query(BalanceCheckpoint).join(nearest_dates, and_(
+            BalanceCheckpoint.account_id == nearest_dates.c.account_id,
+            BalanceCheckpoint.date == nearest_dates.c.date
+        )).filter(BalanceCheckpoint.account_id.in_([account.id for account in accounts]))
+    }
+
+    # Only transactions after each account's checkpoint are summed
+    without_checkpoint = any(account.id not in checkpoints for account in accounts)
+    source = transactions_source(
+        db, None if without_checkpoint else _day_after(min(checkpoint.date for checkpoint in checkpoints.values()))
+    )
+    scope = [
+        and_(source.account_id == account.id, source.date >= _day_after(checkpoints[account.id].date))
+        if account.id in checkpoints else source.account_id == account.id
+        for account in accounts
+    ]
+    since = {
+        account_id: (amount, count)
+        for account_id, amount, count in db.query(
+            source.account_id, func.sum(source.amount), func.count()
+        ).filter(or_(*scope), source.date < _day_after(as_of)).group_by(source.account_id)
+    }
+
+    result = []
+    for account in accounts:
+        checkpoint = checkpoints.get(account.id)
+        amount, count = since.get(account.id, (0.0, 0))
+        base = checkpoint.balance if checkpoint else account.opening_balance or 0.0
+        result.append({
+            "account_id": account.id,
+            "as_of": as_of.isoformat(),
+            "balance": round(base + (amount or 0.0), 2),
+            "transaction_count": ((checkpoint.transaction_count or 0) if checkpoint else 0) + count,
+            "checkpoint_date": checkpoint.date.isoformat() if checkpoint else None,
+        })
+    return result
+
+
+def running_balances(db: Session, account_id: int, start: Optional[date] = None,
+                     end: Optional[date] = None, limit: int = 1000) -> List[Dict]:
+    """
+    Transactions of one account in [start, end] with the balance after each,
+    in date order. The window sum only covers the range; the balance before
+    it comes from the nearest checkpoint.
+    """
+    if start is not None:
+        base = balances_as_of(db, start - timedelta(days=1), [account_id])[0]["balance"]
+    else:
+        base = db.query(Account.opening_balance).filter(Account.id == account_id).scalar() or 0.0
+
+    source = transactions_source(db, start)
+    running = func.sum(source.amount).over(
+        partition_by=source.account_id, order_by=(source.date, source.id)
+    )
+    stmt = select(
+        source.id, source.date, source.amount, source.description,
+        source.category, running.label("running")
+    ).where(source.account_id == account_id)
+    if start is not None:
+        stmt = stmt.where(source.date >= datetime.combine(start, time.min))
+    if end is not None:
+        stmt = stmt.where(source.date < _day_after(end))
+    stmt = stmt.order_by(source.date, source.id).limit(limit)
+
+    return [
+        {
+            "id": row.id,
+            "date": row.date.isoformat(),
+            "amount": row.amount,
+            "description": row.description,
+            "category": row.category,
+            "balance": round(base + row.running, 2),
+        }
+        for row in db.execute(stmt)
+    ]
+
+
+def checkpoint_to_dict(checkpoint: BalanceCheckpoint) -> Dict:
+    return {
+        "account_id": checkpoint.account_id,
+        "date": checkpoint.date.isoformat(),
+        "balance": round(checkpoint.balance, 2),
+        "transaction_count": checkpoint.transaction_count,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models import create_tables
+    from tenancy import known_tenants, tenant_session
+
+    parser = argparse.ArgumentParser(description="Maintain month-end balance checkpoints")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every checkpoint from transactions")
+    args = parser.parse_args()
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            initialize_opening_balances(db)
+            count = rebuild_checkpoints(db) if args.rebuild else extend_checkpoints(db)
+            db.commit()
+            print(f"{tenant}: wrote {count} balance checkpoints")
+        finally:
+            db.close()
@@ -0,0 +1,99 @@
+"""
+Keep Budget.spent in step with transactions.
+
+``apply_budget_deltas`` is called for every ingested batch and adjusts the
+matching (category, month) budget rows by the batch's net spending.
+``reconcile_budgets`` recomputes every budget from raw transactions in one
+grouped query and can be run as a periodic job:
+
+    python backend/budgets.py
+"""
+import pandas as pd
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from models import Budget, tenant_of
+from rollups import month_expression, month_labels
+from archive import transactions_source
+
+
+def compute_budget_deltas(frame: pd.DataFrame) -> pd.DataFrame:
+    """Net spending (expenses minus refunds) per category and month"""
+    deltas = pd.DataFrame({
+        "category": frame["category"],
+        "month": month_labels(frame["date"]),
+        "delta": -frame["amount"].astype(float),
+    }).dropna(subset=["category"])
+    return deltas.groupby(["category", "month"], as_index=False)["delta"].sum()
+
+
+def apply_budget_deltas(db: Session, frame: pd.DataFrame):
+    """Add the spending in ``frame`` to the budgets it falls under"""
+    if frame.empty:
+        return
+    deltas = compute_budget_deltas(frame)
+    if deltas.empty:
+        return
+
+    # Core statement: executemany UPDATE keyed by (tenant, category, month), not
+    # by primary key, so the tenant filter is spelled out
+    budgets = Budget.__table__
+    stmt = update(budgets).where(
+        budgets.c.tenant_id == tenant_of(db),
+        budgets.c.category == bindparam("b_category"),
+        budgets.c.month == bindparam("b_month")
+    ).values(spent=budgets.c.spent + bindparam("delta"))
+
+    db.execute(stmt, [
+        {"b_category": row.category, "b_month": row.month, "delta": row.delta}
+        for row in deltas.itertuples(index=False)
+    ])
+
+
+def reconcile_budgets(db: Session) -> int:
+    """
+    Recompute ``spent`` for every budget from raw transactions.
+
+    Spending for all budgeted months comes from a single GROUP BY over
+    transactions; returns the number of budgets whose value changed.
+    """
+    budgets = db.query(Budget.id, Budget.category, Budget.month, Budget.spent).all()
+    if not budgets:
+        return 0
+
+    source = transactions_source(db, pd.Period(min(b.month for b in budgets), freq="M").start_time.date())
+    month = month_expression(source.date, db.get_bind())
+    spending = db.query(
+        source.category,
+        month.label("month"),
+        func.sum(-source.amount).label("spent")
+    ).filter(
+        month.in_({b.month for b in budgets}),
+        source.category.in_({b.category for b in budgets})
+    ).group_by(source.category, month).all()
+
+    spent = {(row.category, row.month): row.spent for row in spending}
+    changes = []
+    for budget in budgets:
+        actual = spent.get((budget.category, budget.month), 0.0)
+        if budget.spent is None or abs(budget.spent - actual) > 1e-9:
+            changes.append({"id": budget.id, "spent": actual})
+
+    if changes:
+        db.bulk_update_mappings(Budget, changes)
+    return len(changes)
+
+
+if __name__ == "__main__":
+    from models import create_tables
+    from tenancy import known_tenants, tenant_session
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            changed = reconcile_budgets(db)
+            db.commit()
+            print(f"{tenant}: reconciled budgets, {changed} updated")
+        finally:
+            db.close()
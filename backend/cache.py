@@ -0,0 +1,75 @@
+"""
+Data version and caches keyed on it.
+
+Every write that changes what analytics see (ingest, recategorization,
+investment and account uploads) bumps its tenant's ``data_version`` once its
+transaction commits; writes to data every tenant sees (prices, FX rates) bump
+the shared version. ``VersionedCache`` keeps computed results per tenant
+until that tenant's version moves on, so dashboards polling an endpoint
+recompute only after new data arrives, and one tenant's import leaves the
+other tenants' cached results alone.
+
+Like the columnar store, the version lives in the process: writes made by
+another process (a CLI, another worker) are picked up after a restart.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class DataVersion:
+    """A shared counter plus one per tenant"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shared = 0
+        self._tenants = {}
+
+    def value(self, tenant: Optional[str] = None) -> tuple:
+        return self._shared, self._tenants.get(tenant, 0)
+
+    def bump(self, tenant: Optional[str] = None):
+        """Bump ``tenant``'s version, or the shared one (seen by every tenant) without one"""
+        with self._lock:
+            if tenant is None:
+                self._shared += 1
+            else:
+                self._tenants[tenant] = self._tenants.get(tenant, 0) + 1
+
+
+data_version = DataVersion()
+
+
+class VersionedCache:
+    """
+    Least-recently-used results per tenant and key, valid for the data
+    version they were computed at. Results that do not depend on tenant data
+    use ``tenant=None``.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], tenant: Optional[str] = None) -> Any:
+        version = data_version.value(tenant)
+        key = (tenant, key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        # Computed outside the lock; concurrent misses may both compute
+        value = compute()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,311 @@
+"""
+Rule-based transaction categorization.
+
+Rules match a keyword or regular expression against the description and can
+be limited to an amount range. Text-only keyword rules are compiled into a
+single trie-shaped regex (the effect of an Aho-Corasick automaton with the
+standard library), so each distinct description is scanned once however many
+keywords exist; regex rules share one combined expression and the few rules
+with amount bounds are applied as vectorized masks. Descriptions repeat
+heavily (the same merchants every month), so matching runs over the unique
+descriptions and is broadcast back to the rows through their factorized
+codes.
+
+Ingest fills in missing categories with the current rules. To re-run the
+rules over stored transactions:
+
+    python backend/categorization.py [--overwrite]
+"""
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy import Table, bindparam, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import CategoryRule, Transaction, tenant_of
+from rollups import UNCATEGORIZED, rebuild_rollups
+from budgets import reconcile_budgets
+from archive import archive_table, archive_years
+
+RULE_MATCH_TYPES = ("keyword", "regex")
+
+_FLAGS = re.IGNORECASE | re.DOTALL
+# Escapes and the constructs that refer to other groups; group numbers count
+# from the start of the combined matcher, so they would point at other rules
+_GROUP_SYNTAX = re.compile(r"\\.|\(\?P|\(\?\(")
+_HISTORY_CHUNK_SIZE = 50_000
+
+
+def rule_regex(match_type: str, pattern: Optional[str]) -> str:
+    pattern = (pattern or "").strip()
+    if match_type == "regex":
+        return pattern
+    # Keywords match case-insensitively with any run of whitespace between words
+    return r"\s+".join(re.escape(word) for word in pattern.split())
+
+
+def validate_rule(category: str, match_type: str, pattern: Optional[str],
+                  min_amount: Optional[float], max_amount: Optional[float]):
+    if not (category or "").strip():
+        raise HTTPException(status_code=400, detail="Rule must have a category")
+    if match_type not in RULE_MATCH_TYPES:
+        raise HTTPException(status_code=400, detail=f"match_type must be one of {', '.join(RULE_MATCH_TYPES)}")
+    if not (pattern or "").strip() and min_amount is None and max_amount is None:
+        raise HTTPException(status_code=400, detail="Rule needs a pattern or an amount range")
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(status_code=400, detail="min_amount must not exceed max_amount")
+    if match_type == "regex":
+        for match in _GROUP_SYNTAX.finditer(pattern or ""):
+            token = match.group()
+            if token == "(?P":
+                # Each rule becomes a named group of the combined matcher
+                raise HTTPException(status_code=400, detail="Named groups are not supported in rule patterns")
+            if token == "(?(" or (token[0] == "\\" and token[1] in "123456789"):
+                raise HTTPException(status_code=400,
+                                    detail="Backreferences and conditional groups are not supported in rule patterns")
+    try:
+        re.compile(rule_regex(match_type, pattern), _FLAGS)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regex: {e}")
+
+
+def _trie_pattern(words: Sequence[str]) -> str:
+    """
+    Regex matching any of ``words``, factored into a character trie so the
+    engine tests each position once instead of once per word. Longer words
+    are preferred where one extends another.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            body = f"(?:{body})?" if len(branches) == 1 and len(body) > 1 else f"{body}?"
+        return body
+
+    return build(trie)
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class RuleMatcher:
+    """
+    Compiled form of a priority-ordered list of CategoryRule rows.
+
+    Keyword rules share one trie regex over case- and whitespace-normalized
+    text; every keyword found is looked up to its rules. Regex rules share a
+    combined expression with one named group per rule.
+    """
+
+    def __init__(self, rules: Sequence[CategoryRule]):
+        self.categories = np.array([rule.category for rule in rules] + [None], dtype=object)
+        self._no_match = len(rules)
+
+        text_rules = [(i, rule) for i, rule in enumerate(rules)
+                      if rule.min_amount is None and rule.max_amount is None]
+
+        # Keyword -> highest-priority rule using it
+        self._keyword_rules = {}
+        for i, rule in text_rules:
+            keyword = _normalize_text(rule.pattern or "")
+            if rule.match_type == "keyword" and keyword:
+                self._keyword_rules.setdefault(keyword, i)
+        self._keyword_lengths = sorted({len(keyword) for keyword in self._keyword_rules})
+        # Zero-width lookahead so finditer reports every start position, overlaps included
+        self._keywords = (
+            re.compile(f"(?=({_trie_pattern(list(self._keyword_rules))}))") if self._keyword_rules else None
+        )
+
+        # Alternatives are tried in order, so the first group that matches
+        # anywhere in the text is the highest-priority regex rule
+        regex_rules = [(i, rule) for i, rule in text_rules
+                       if rule.match_type != "keyword" or not _normalize_text(rule.pattern or "")]
+        alternation = "|".join(
+            f".*?(?P<r{i}>{rule_regex(rule.match_type, rule.pattern)})" for i, rule in regex_rules
+        )
+        self._regexes = re.compile(f"^(?:{alternation})", _FLAGS) if regex_rules else None
+
+        self._amount_rules = [
+            (i, re.compile(rule_regex(rule.match_type, rule.pattern), _FLAGS), rule.min_amount, rule.max_amount)
+            for i, rule in enumerate(rules) if rule.min_amount is not None or rule.max_amount is not None
+        ]
+
+    def __bool__(self):
+        return self._no_match > 0
+
+    def _keyword_winner(self, text: str) -> int:
+        best = self._no_match
+        for found in self._keywords.finditer(_normalize_text(text)):
+            # The trie matched the longest keyword here; shorter ones are its prefixes
+            matched = found.group(1)
+            for length in self._keyword_lengths:
+                if length > len(matched):
+                    break
+                rule = self._keyword_rules.get(matched[:length])
+                if rule is not None and rule < best:
+                    best = rule
+        return best
+
+    def _text_winners(self, uniques) -> np.ndarray:
+        winners = np.full(len(uniques), self._no_match, dtype=np.int32)
+        for position, text in enumerate(uniques):
+            best = self._no_match
+            if self._keywords is not None:
+                best = self._keyword_winner(text)
+            if self._regexes is not None:
+                found = self._regexes.match(text)
+                if found is not None:
+                    best = min(best, int(found.lastgroup[1:]))
+            winners[position] = best
+        return winners
+
+    def match(self, descriptions: pd.Series, amounts: pd.Series) -> np.ndarray:
+        """Index of the winning rule per row, or len(rules) where none matches"""
+        codes, uniques = pd.factorize(descriptions.fillna("").astype(str))
+        winners = self._text_winners(uniques)[codes]
+
+        amount_values = amounts.to_numpy(dtype=np.float64, na_value=np.nan)
+        for i, regex, min_amount, max_amount in self._amount_rules:
+            candidates = winners > i
+            if not candidates.any():
+                continue
+            hits = np.fromiter((regex.search(text) is not None for text in uniques), dtype=bool, count=len(uniques))
+            candidates &= hits[codes]
+            if min_amount is not None:
+                candidates &= amount_values >= min_amount
+            if max_amount is not None:
+                candidates &= amount_values <= max_amount
+            winners[candidates] = i
+        return winners
+
+    def categorize(self, descriptions: pd.Series, amounts: pd.Series) -> pd.Series:
+        """Category per row, None where no rule matches"""
+        return pd.Series(self.categories[self.match(descriptions, amounts)], index=descriptions.index, dtype=object)
+
+
+# Per tenant: (rules key, matcher)
+_matcher_cache = {}
+
+
+def load_matcher(db: Session) -> RuleMatcher:
+    """Matcher for the tenant's current rules, recompiled only when the rules change"""
+    rules = db.query(CategoryRule).order_by(CategoryRule.priority, CategoryRule.id).all()
+    key = tuple(
+        (rule.id, rule.category, rule.match_type, rule.pattern, rule.min_amount, rule.max_amount, rule.priority)
+        for rule in rules
+    )
+    tenant = tenant_of(db)
+    cached = _matcher_cache.get(tenant)
+    if cached is None or cached[0] != key:
+        cached = _matcher_cache[tenant] = (key, RuleMatcher(rules))
+    return cached[1]
+
+
+def fill_categories(db: Session, frame: pd.DataFrame) -> pd.DataFrame:
+    """Categorize the rows of an ingest frame that arrived without a category"""
+    missing = frame["category"].isna().to_numpy()
+    if not missing.any():
+        return frame
+    matcher = load_matcher(db)
+    if not matcher:
+        return frame
+    frame = frame.copy()
+    frame.loc[missing, "category"] = matcher.categorize(
+        frame.loc[missing, "description"], frame.loc[missing, "amount"]
+    )
+    return frame
+
+
+def recategorize_history(db: Session, overwrite: bool = False) -> int:
+    """
+    Apply the rules to stored transactions, archived years included, and
+    refresh the derived tables.
+
+    Only uncategorized transactions are considered unless ``overwrite`` is
+    set; transactions no rule matches keep their category either way.
+    Returns the number of transactions changed. The caller owns the commit.
+    """
+    matcher = load_matcher(db)
+    if not matcher:
+        return 0
+
+    tables = [Transaction.__table__] + [archive_table(year) for year in archive_years(db.get_bind())]
+    changed = sum(_recategorize_table(db, table, matcher, overwrite) for table in tables)
+    if not changed:
+        return 0
+
+    rebuild_rollups(db)
+    reconcile_budgets(db)
+    return changed
+
+
+def _recategorize_table(db: Session, table: Table, matcher: RuleMatcher, overwrite: bool) -> int:
+    stmt = select(table.c.id, table.c.description, table.c.amount, table.c.category) \
+        .where(table.c.tenant_id == tenant_of(db))
+    if not overwrite:
+        stmt = stmt.where(or_(
+            table.c.category.is_(None), table.c.category == "", table.c.category == UNCATEGORIZED
+        ))
+    stmt = stmt.order_by(table.c.id).execution_options(yield_per=_HISTORY_CHUNK_SIZE)
+
+    changes: List[pd.DataFrame] = []
+    for partition in db.execute(stmt).partitions():
+        frame = pd.DataFrame(partition, columns=["id", "description", "amount", "category"])
+        categories = matcher.categorize(frame["description"], frame["amount"])
+        changed = categories.notna() & categories.ne(frame["category"])
+        if changed.any():
+            changes.append(pd.DataFrame({"b_id": frame["id"][changed], "category": categories[changed]}))
+
+    if not changes:
+        return 0
+    updates = pd.concat(changes, ignore_index=True)
+    db.execute(update(table).where(table.c.id == bindparam("b_id")), updates.to_dict("records"))
+    return len(updates)
+
+
+def rule_to_dict(rule: CategoryRule) -> dict:
+    return {
+        "id": rule.id,
+        "category": rule.category,
+        "match_type": rule.match_type,
+        "pattern": rule.pattern,
+        "min_amount": rule.min_amount,
+        "max_amount": rule.max_amount,
+        "priority": rule.priority,
+        "created_at": rule.created_at.isoformat() if rule.created_at else None,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models import create_tables
+    from tenancy import known_tenants, tenant_session
+
+    parser = argparse.ArgumentParser(description="Apply category rules to stored transactions")
+    parser.add_argument("--overwrite", action="store_true", help="also recategorize transactions that have a category")
+    args = parser.parse_args()
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            count = recategorize_history(db, overwrite=args.overwrite)
+            db.commit()
+            print(f"{tenant}: recategorized {count} transactions")
+        finally:
+            db.close()
@@ -0,0 +1,341 @@
+"""
+In-process columnar cache of transactions for analytics.
+
+Transactions are held as NumPy arrays (ids, dates, amounts, account ids) with
+category and description strings dictionary-encoded into int32 codes. The
+store is loaded from the database once, appended to by ingest after each
+commit, and lets analytics endpoints filter and group with vectorized
+operations instead of building ORM objects and dicts per row.
+
+Each tenant has its own store; the stores of the COLUMNAR_CACHE_TENANTS most
+recently used tenants are kept. Set COLUMNAR_CACHE=false to disable the
+cache; callers then get a store loaded for the single request.
+"""
+import itertools
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import tenant_of
+from archive import transactions_source
+
+COLUMNAR_CACHE = os.getenv("COLUMNAR_CACHE", "true").lower() == "true"
+COLUMNAR_CACHE_TENANTS = int(os.getenv("COLUMNAR_CACHE_TENANTS", "16"))
+
+_LOAD_CHUNK_SIZE = 50_000
+# Distinguishes successive fillings of a store so dependent caches notice a reload
+_generations = itertools.count(1)
+_DTYPES = {
+    "ids": np.int64,
+    "dates": "datetime64[s]",
+    "amounts": np.float64,
+    "account_ids": np.int32,
+    "category_codes": np.int32,
+    "description_codes": np.int32,
+}
+
+
+class StringDictionary:
+    """Append-only mapping between strings and dense int32 codes (None is -1)"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, values) -> np.ndarray:
+        uniques_codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            code = self._codes.get(value)
+            if code is None:
+                code = len(self.values)
+                self._codes[value] = code
+                self.values.append(value)
+            mapping[i] = code
+        codes = np.full(len(uniques_codes), -1, dtype=np.int32)
+        present = uniques_codes >= 0
+        codes[present] = mapping[uniques_codes[present]]
+        return codes
+
+    def code(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def memory_usage(self) -> int:
+        strings = sum(sys.getsizeof(value) for value in self.values)
+        return strings + sys.getsizeof(self.values) + sys.getsizeof(self._codes)
+
+
+class ColumnarTransactionStore:
+    """
+    Growable column arrays for all transactions.
+
+    Hold ``store.lock`` while reading several columns so that a concurrent
+    append cannot change their length midway.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._size = 0
+        self._columns = {name: np.empty(0, dtype=dtype) for name, dtype in _DTYPES.items()}
+        self.categories = StringDictionary()
+        self.descriptions = StringDictionary()
+        self.loaded = False
+        self.version = 0
+        self.generation = next(_generations)
+
+    def __len__(self):
+        return self._size
+
+    def _column(self, name: str) -> np.ndarray:
+        # View trimmed to the filled size; stays valid when later appends regrow the buffer
+        return self._columns[name][:self._size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._column("ids")
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._column("dates")
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._column("amounts")
+
+    @property
+    def account_ids(self) -> np.ndarray:
+        return self._column("account_ids")
+
+    @property
+    def category_codes(self) -> np.ndarray:
+        return self._column("category_codes")
+
+    @property
+    def description_codes(self) -> np.ndarray:
+        return self._column("description_codes")
+
+    def load(self, db: Session):
+        """Read all transactions from the database in chunks"""
+        with self.lock:
+            self._reset()
+            # Archived years included: analytics and snapshot backfills cover all history
+            source = transactions_source(db)
+            stmt = select(
+                source.id, source.date, source.amount,
+                source.account_id, source.category, source.description
+            ).order_by(source.id).execution_options(yield_per=_LOAD_CHUNK_SIZE)
+
+            for partition in db.execute(stmt).partitions():
+                frame = pd.DataFrame(partition, columns=["id", "date", "amount", "account_id", "category", "description"])
+                self._append_frame(frame)
+            self.loaded = True
+
+    def invalidate(self):
+        """Drop the cached columns after rows were changed in place; the next reader reloads"""
+        with self.lock:
+            self._reset()
+
+    def append(self, frame: pd.DataFrame):
+        """Append newly committed transactions; ``frame`` must include their ids"""
+        with self.lock:
+            if not self.loaded or frame.empty:
+                return
+            self._append_frame(frame)
+
+    def _append_frame(self, frame: pd.DataFrame):
+        new_values = {
+            "ids": frame["id"].to_numpy(dtype=np.int64),
+            "dates": pd.to_datetime(frame["date"]).to_numpy(dtype="datetime64[s]"),
+            "amounts": frame["amount"].to_numpy(dtype=np.float64, na_value=0.0),
+            "account_ids": frame["account_id"].fillna(-1).to_numpy(dtype=np.int32),
+            "category_codes": self.categories.encode(frame["category"]),
+            "description_codes": self.descriptions.encode(frame["description"]),
+        }
+        count = len(frame)
+        required = self._size + count
+        for name, values in new_values.items():
+            column = self._columns[name]
+            if required > len(column):
+                # Grow geometrically so repeated appends stay amortized O(1) per row
+                grown = np.empty(max(required, 2 * len(column), 1024), dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                column = self._columns[name] = grown
+            column[self._size:required] = values
+        self._size = required
+        self.version += 1
+
+    def mask(self, filters=None) -> np.ndarray:
+        """Boolean row mask for a TransactionFilters instance"""
+        mask = np.ones(self._size, dtype=bool)
+        if filters is None:
+            return mask
+        if filters.account_id is not None:
+            mask &= self.account_ids == filters.account_id
+        if filters.category is not None:
+            code = self.categories.code(filters.category)
+            mask &= self.category_codes == (code if code is not None else -2)
+        if filters.description:
+            # Match each distinct description once; the extra False is for missing ones (-1)
+            matches = pd.Series(self.descriptions.values, dtype=object).str.contains(
+                filters.description, case=False, regex=False, na=False
+            ).to_numpy(dtype=bool)
+            mask &= np.append(matches, False)[self.description_codes]
+        if filters.min_amount is not None:
+            mask &= self.amounts >= filters.min_amount
+        if filters.max_amount is not None:
+            mask &= self.amounts <= filters.max_amount
+        if filters.start_date is not None:
+            mask &= self.dates >= np.datetime64(filters.start_date, "s")
+        if filters.end_date is not None:
+            mask &= self.dates < np.datetime64(filters.end_date, "s") + np.timedelta64(1, "D")
+        return mask
+
+    def memory_usage(self) -> Dict:
+        """Bytes held by each column (including spare capacity) and the dictionaries"""
+        columns = {name: int(column.nbytes) for name, column in self._columns.items()}
+        dictionaries = {
+            "categories": self.categories.memory_usage(),
+            "descriptions": self.descriptions.memory_usage(),
+        }
+        return {
+            "rows": self._size,
+            "columns": columns,
+            "dictionaries": dictionaries,
+            "total_bytes": sum(columns.values()) + sum(dictionaries.values()),
+        }
+
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def transaction_store_for(tenant: str) -> ColumnarTransactionStore:
+    """The cached store of ``tenant``, created empty (not loaded) on first use"""
+    with _stores_lock:
+        store = _stores.get(tenant)
+        if store is None:
+            store = _stores[tenant] = ColumnarTransactionStore()
+            while len(_stores) > COLUMNAR_CACHE_TENANTS:
+                _stores.popitem(last=False)
+        _stores.move_to_end(tenant)
+        return store
+
+
+def get_transaction_store(db: Session) -> ColumnarTransactionStore:
+    """Return the session tenant's cached store (loading it on first use) or a per-request one"""
+    if not COLUMNAR_CACHE:
+        store = ColumnarTransactionStore()
+        store.load(db)
+        return store
+    store = transaction_store_for(tenant_of(db))
+    if not store.loaded:
+        with store.lock:
+            if not store.loaded:
+                store.load(db)
+    return store
+
+
+def group_by_period(store: ColumnarTransactionStore, mask: np.ndarray, freq: str) -> Dict:
+    """
+    Sum income and expenses per period for the masked rows.
+
+    ``freq`` is D (day), W (week starting Monday) or M (month).
+    """
+    dates = store.dates[mask]
+    amounts = store.amounts[mask]
+    if freq == "M":
+        buckets = dates.astype("datetime64[M]")
+    elif freq == "W":
+        days = dates.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        buckets = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    else:
+        buckets = dates.astype("datetime64[D]")
+
+    periods, inverse = np.unique(buckets, return_inverse=True)
+    income = np.bincount(inverse, weights=np.clip(amounts, 0, None), minlength=len(periods))
+    expenses = np.bincount(inverse, weights=np.clip(-amounts, 0, None), minlength=len(periods))
+    counts = np.bincount(inverse, minlength=len(periods))
+
+    return {
+        "dates": [str(period) for period in periods],
+        "income": np.round(income, 2),
+        "expenses": np.round(expenses, 2),
+        "net": np.round(income - expenses, 2),
+        "count": counts,
+    }
+
+
+def grouped_median(values: np.ndarray, groups: np.ndarray, group_count: int) -> np.ndarray:
+    """Median of ``values`` per group id in ``range(group_count)``; NaN for empty groups"""
+    medians = np.full(group_count, np.nan)
+    if len(values) == 0:
+        return medians
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    counts = np.bincount(groups, minlength=group_count)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    low = starts[present] + (counts[present] - 1) // 2
+    high = starts[present] + counts[present] // 2
+    medians[present] = (values[low] + values[high]) / 2
+    return medians
+
+
+_analyses = weakref.WeakKeyDictionary()
+_analyses_lock = threading.Lock()
+
+
+class IncrementalAnalysis:
+    """
+    Per-key results derived from the store, refreshed only for the keys that
+    rows appended since the last refresh touch.
+
+    Subclasses implement ``update(store, new_rows)`` which receives the slice
+    of store positions not seen yet and updates ``self.results``. A reloaded
+    store (new generation) starts over from an empty result set. Use
+    ``for_store`` to get the instance that follows a given store.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._generation = None
+        self._processed = 0
+        self.reset()
+
+    def reset(self):
+        self.results = {}
+
+    @classmethod
+    def for_store(cls, store: ColumnarTransactionStore) -> "IncrementalAnalysis":
+        """The analysis of this class kept for ``store`` (dropped along with the store)"""
+        with _analyses_lock:
+            analyses = _analyses.setdefault(store, {})
+            if cls not in analyses:
+                analyses[cls] = cls()
+            return analyses[cls]
+
+    def update(self, store: ColumnarTransactionStore, new_rows: slice):
+        raise NotImplementedError
+
+    def refresh(self, store: ColumnarTransactionStore) -> Dict:
+        with store.lock, self.lock:
+            if self._generation != store.generation:
+                self._generation = store.generation
+                self._processed = 0
+                self.reset()
+            if self._processed < len(store):
+                self.update(store, slice(self._processed, len(store)))
+                self._processed = len(store)
+            return self.results
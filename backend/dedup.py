@@ -0,0 +1,113 @@
+"""
+Duplicate detection for uploads.
+
+Every transaction gets a fingerprint: a SHA-1 over account, timestamp, amount
+in cents and normalized description, plus the row's occurrence number among
+identical rows in the same upload (batches of a streamed upload carry the
+count over in an ``occurrences`` dict). The occurrence number keeps genuinely
+repeated purchases (two identical coffees on one statement) while an exact
+re-upload, or an overlapping statement, reproduces the same fingerprints,
+which the unique index rejects.
+
+Whole uploaded files are also hashed so an identical file is recognized
+before it is parsed. Rows stored before fingerprints existed can be
+backfilled with:
+
+    python backend/dedup.py
+"""
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from models import Transaction, UploadedFile, upsert_insert
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_description(descriptions: pd.Series) -> pd.Series:
+    """Case-fold and collapse whitespace so cosmetic differences do not matter"""
+    return descriptions.fillna("").astype(str).str.lower().str.replace(_WHITESPACE_RE, " ", regex=True).str.strip()
+
+
+def transaction_fingerprints(frame: pd.DataFrame, occurrences: Optional[Dict[str, int]] = None) -> pd.Series:
+    """
+    Fingerprint each row of a frame with account_id, date, amount and description.
+
+    ``occurrences`` counts the rows per key fingerprinted by earlier batches
+    of the same upload; numbering continues from it and it is updated in place.
+    """
+    if frame.empty:
+        return pd.Series([], index=frame.index, dtype=object)
+
+    dates = pd.to_datetime(frame["date"]).to_numpy(dtype="datetime64[s]").astype(str)
+    cents = np.round(frame["amount"].to_numpy(dtype=np.float64) * 100).astype(np.int64).astype(str)
+    accounts = frame["account_id"].astype("Int64").astype(str).to_numpy()
+    key = pd.Series(accounts, index=frame.index) + "|" + dates + "|" + cents + "|" + \
+        normalize_description(frame["description"])
+
+    occurrence = key.groupby(key).cumcount()
+    if occurrences is not None:
+        occurrence += key.map(occurrences).fillna(0).astype(np.int64)
+        for value, count in key.value_counts().items():
+            occurrences[value] = occurrences.get(value, 0) + int(count)
+    occurrence = occurrence.astype(str)
+    return pd.Series(
+        [hashlib.sha1(value.encode("utf-8")).hexdigest() for value in key + "|" + occurrence],
+        index=frame.index
+    )
+
+
+def file_sha256(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def find_uploaded_file(db: Session, kind: str, sha256: str) -> Optional[UploadedFile]:
+    return db.query(UploadedFile).filter(UploadedFile.kind == kind, UploadedFile.sha256 == sha256).first()
+
+
+def record_uploaded_file(db: Session, kind: str, sha256: str, filename: str, row_count: int, added_count: int):
+    # A concurrent upload of the same file may have recorded it first
+    db.execute(
+        upsert_insert(db.get_bind())(UploadedFile.__table__)
+        .values(kind=kind, sha256=sha256, filename=filename, row_count=row_count,
+                added_count=added_count, uploaded_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["tenant_id", "kind", "sha256"])
+    )
+
+
+def backfill_fingerprints(db: Session) -> int:
+    """Fingerprint stored transactions that predate the fingerprint column"""
+    rows = db.query(
+        Transaction.id, Transaction.account_id, Transaction.date, Transaction.amount, Transaction.description
+    ).filter(Transaction.fingerprint.is_(None)).order_by(Transaction.id).all()
+    if not rows:
+        return 0
+
+    frame = pd.DataFrame(rows, columns=["id", "account_id", "date", "amount", "description"])
+    frame["fingerprint"] = transaction_fingerprints(frame)
+
+    # Rows that already have a fingerprint keep theirs; skip any collision with them
+    taken = {fp for (fp,) in db.query(Transaction.fingerprint).filter(Transaction.fingerprint.isnot(None))}
+    frame = frame[~frame["fingerprint"].isin(taken)]
+    db.bulk_update_mappings(Transaction, frame[["id", "fingerprint"]].to_dict("records"))
+    return len(frame)
+
+
+if __name__ == "__main__":
+    from models import create_tables
+    from tenancy import known_tenants, tenant_session
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            count = backfill_fingerprints(db)
+            db.commit()
+            print(f"{tenant}: fingerprinted {count} transactions")
+        finally:
+            db.close()
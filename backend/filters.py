@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import DateTime, tuple_
+
+from models import Transaction, text_sort_key
+
+# Nullable text columns sort (and seek) on text_sort_key so NULLs are not skipped
+TEXT_SORT_COLUMNS = ("category", "description")
+
+
+class TransactionFilters:
+    """
+    Structured transaction filters shared by the list, search and export endpoints.
+
+    Declared as a class so FastAPI can inject it with ``Depends()``; every
+    argument becomes an optional query parameter.
+    """
+
+    def __init__(
+        self,
+        account_id: Optional[int] = Query(None, description="Only transactions for this account"),
+        category: Optional[str] = Query(None, description="Exact category match"),
+        description: Optional[str] = Query(None, description="Case-insensitive substring of the description"),
+        min_amount: Optional[float] = Query(None, description="Minimum amount (inclusive)"),
+        max_amount: Optional[float] = Query(None, description="Maximum amount (inclusive)"),
+        start_date: Optional[date] = Query(None, description="First day to include (YYYY-MM-DD)"),
+        end_date: Optional[date] = Query(None, description="Last day to include (YYYY-MM-DD)"),
+    ):
+        self.account_id = account_id
+        self.category = category
+        self.description = description
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def clauses(self, table=Transaction) -> list:
+        """Return the filter expressions against ``table`` (model or table columns)"""
+        clauses = []
+        if self.account_id is not None:
+            clauses.append(table.account_id == self.account_id)
+        if self.category is not None:
+            clauses.append(table.category == self.category)
+        if self.description:
+            pattern = self.description.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append(table.description.ilike(f"%{pattern}%", escape="\\"))
+        if self.min_amount is not None:
+            clauses.append(table.amount >= self.min_amount)
+        if self.max_amount is not None:
+            clauses.append(table.amount <= self.max_amount)
+        if self.start_date is not None:
+            clauses.append(table.date >= datetime.combine(self.start_date, datetime.min.time()))
+        if self.end_date is not None:
+            end = datetime.combine(self.end_date, datetime.min.time()) + timedelta(days=1)
+            clauses.append(table.date < end)
+        return clauses
+
+    def apply(self, query, table=Transaction):
+        clauses = self.clauses(table)
+        return query.filter(*clauses) if clauses else query
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list):
+            raise ValueError("cursor must encode a list")
+        return values
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+
+def sort_key(table, name: str):
+    """Expression the list endpoint orders and seeks ``table.<name>`` by"""
+    column = getattr(table, name)
+    return text_sort_key(column) if name in TEXT_SORT_COLUMNS else column
+
+
+def keyset_after(sort_column, id_column, cursor: str, descending: bool = True):
+    """
+    Build the keyset predicate for rows after ``cursor`` in (sort_column, id) order.
+
+    Seeking on a (column, id) index keeps deep pages as cheap as the first one,
+    unlike OFFSET which has to walk every skipped row.
+    """
+    values = decode_cursor(cursor)
+    try:
+        last_value, last_id = values[0], int(values[1])
+        if isinstance(sort_column.type, DateTime):
+            last_value = datetime.fromisoformat(last_value)
+    except (IndexError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+    # Row-value comparison lets the planner seek straight into the index
+    key = tuple_(sort_column, id_column)
+    if descending:
+        return key < tuple_(last_value, last_id)
+    return key > tuple_(last_value, last_id)
@@ -0,0 +1,199 @@
+"""
+Cash-flow forecasting per category.
+
+History comes from the monthly rollups as a (series x month) matrix, one
+income and one expense series per category, in BASE_CURRENCY at each
+month's closing rate (as the reports convert them); recurring items are
+converted at today's rate. Each series is projected as:
+
+* recurring items (see recurring.py) placed on the months their next
+  occurrences fall in, plus
+* a baseline for everything else: the trailing mean of the series minus the
+  recurring share, scaled by a month-of-year seasonal index once two years
+  of history exist.
+
+Bands come from the spread of the recent monthly values and widen with the
+horizon. The current (incomplete) month is left out of the history;
+forecasts start with the following month.
+"""
+from datetime import date
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Account, MonthlyRollup
+from fx import rate_table, rollups_in_base
+from recurring import PERIODS, PERIOD_MONTHS
+from rollups import UNCATEGORIZED
+
+# Months of history the baseline and spread are computed from
+BASELINE_MONTHS = 12
+# History needed before month-of-year seasonality is applied
+SEASONAL_MIN_MONTHS = 24
+
+
+def _month_number(label: str) -> int:
+    year, month = label.split("-")
+    return int(year) * 12 + int(month) - 1
+
+
+def _month_label(number: int) -> str:
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def monthly_history(db: Session, account_id: Optional[int] = None):
+    """
+    Income and expenses per category and complete month from the rollups.
+
+    Returns ``(categories, first_month, income, expenses)`` with
+    ``income``/``expenses`` shaped (categories, months), gaps filled with 0
+    and months numbered ``year * 12 + month - 1``.
+    """
+    query = db.query(
+        MonthlyRollup.category,
+        MonthlyRollup.month,
+        Account.currency,
+        func.sum(MonthlyRollup.income).label("income"),
+        func.sum(MonthlyRollup.expenses).label("expenses")
+    ).outerjoin(Account, Account.id == MonthlyRollup.account_id).filter(
+        MonthlyRollup.month < date.today().strftime("%Y-%m")
+    )
+    if account_id is not None:
+        query = query.filter(MonthlyRollup.account_id == account_id)
+    frame = rollups_in_base(db, query.group_by(MonthlyRollup.category, MonthlyRollup.month, Account.currency))
+    if frame.empty:
+        return [], None, np.zeros((0, 0)), np.zeros((0, 0))
+
+    frame = frame.groupby(["category", "month"], as_index=False)[["income", "expenses"]].sum()
+    months = frame["month"].map(_month_number).to_numpy()
+    first_month = int(months.min())
+    categories, category_index = np.unique(frame["category"].to_numpy(dtype=str), return_inverse=True)
+
+    shape = (len(categories), int(months.max()) - first_month + 1)
+    income = np.zeros(shape)
+    expenses = np.zeros(shape)
+    income[category_index, months - first_month] = frame["income"].to_numpy(dtype=np.float64)
+    expenses[category_index, months - first_month] = frame["expenses"].to_numpy(dtype=np.float64)
+    return list(categories), first_month, income, expenses
+
+
+def seasonal_index(history: np.ndarray, first_month: int) -> np.ndarray:
+    """
+    Month-of-year factors per series, shape (series, 12).
+
+    Each factor is the mean for that calendar month over the series mean;
+    series with less than SEASONAL_MIN_MONTHS of history get all ones.
+    """
+    series_count, month_count = history.shape
+    factors = np.ones((series_count, 12))
+    if month_count < SEASONAL_MIN_MONTHS:
+        return factors
+    calendar_month = (first_month + np.arange(month_count)) % 12
+    totals = np.zeros((series_count, 12))
+    np.add.at(totals.T, calendar_month, history.T)
+    counts = np.bincount(calendar_month, minlength=12)
+    overall = history.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = (totals / counts) / overall
+    return np.where(np.isfinite(factors), factors, 1.0)
+
+
+def recurring_schedule(items: List[dict], categories: List[str], start_month: int, horizon: int):
+    """
+    Expected recurring income and expenses per category and forecast month,
+    plus each category's average monthly recurring amount.
+    """
+    index = {category: i for i, category in enumerate(categories)}
+    scheduled = {"income": np.zeros((len(categories), horizon)), "expense": np.zeros((len(categories), horizon))}
+    monthly = {"income": np.zeros(len(categories)), "expense": np.zeros(len(categories))}
+    end_month = start_month + horizon
+
+    for item in items:
+        row = index.get(item["category"] or UNCATEGORIZED)
+        if row is None:
+            continue
+        kind = item["type"]
+        monthly[kind][row] += abs(item["monthly_amount"])
+
+        when = pd.Timestamp(item["next_date"])
+        months = PERIOD_MONTHS.get(item["period"])
+        step = pd.DateOffset(months=months) if months else pd.Timedelta(days=PERIODS[item["period"]])
+        while when.year * 12 + when.month - 1 < end_month:
+            month = when.year * 12 + when.month - 1
+            if month >= start_month:
+                scheduled[kind][row, month - start_month] += abs(item["amount"])
+            when = when + step
+    return scheduled, monthly
+
+
+def forecast_series(history: np.ndarray, first_month: int, start_month: int, horizon: int,
+                    scheduled: np.ndarray, recurring_monthly: np.ndarray, z: float):
+    """Mean, lower and upper forecast per series and month, each shaped (series, horizon)"""
+    recent = history[:, -BASELINE_MONTHS:]
+    observed = recent.shape[1]
+    baseline = np.clip(recent.mean(axis=1) - recurring_monthly, 0, None)
+
+    calendar_month = (start_month + np.arange(horizon)) % 12
+    factors = seasonal_index(history, first_month)[:, calendar_month]
+    mean = baseline[:, None] * factors + scheduled
+
+    spread = recent.std(axis=1, ddof=1) if observed > 1 else np.zeros(len(history))
+    steps = np.arange(1, horizon + 1)
+    width = z * spread[:, None] * np.sqrt(1 + steps[None, :] / max(observed, 1))
+    return mean, np.clip(mean - width, 0, None), mean + width
+
+
+def items_in_base(db: Session, items: List[dict]) -> List[dict]:
+    """Recurring items with their amounts converted from the account currency at today's rate"""
+    currencies = dict(db.query(Account.id, Account.currency).all())
+    rates = rate_table(db).rates([currencies.get(item["account_id"]) for item in items])
+    return [
+        {**item, "amount": item["amount"] * rate, "monthly_amount": item["monthly_amount"] * rate}
+        for item, rate in zip(items, rates.tolist())
+    ]
+
+
+def cash_flow_forecast(db: Session, items: List[dict], months: int = 6, confidence: float = 0.8,
+                       account_id: Optional[int] = None) -> Dict:
+    categories, first_month, income, expenses = monthly_history(db, account_id)
+    start_month = date.today().year * 12 + date.today().month
+    labels = [_month_label(start_month + step) for step in range(months)]
+    if not categories:
+        return {"months": labels, "confidence": confidence, "categories": [], "totals": None}
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    scheduled, recurring_monthly = recurring_schedule(items_in_base(db, items), categories, start_month, months)
+    projections = {
+        "income": forecast_series(income, first_month, start_month, months,
+                                  scheduled["income"], recurring_monthly["income"], z),
+        "expenses": forecast_series(expenses, first_month, start_month, months,
+                                    scheduled["expense"], recurring_monthly["expense"], z),
+    }
+
+    def rounded(values: np.ndarray) -> List[float]:
+        return np.round(values, 2).tolist()
+
+    result = []
+    for row, category in enumerate(categories):
+        entry = {"category": category}
+        for kind, (mean, lower, upper) in projections.items():
+            entry[kind] = {"mean": rounded(mean[row]), "lower": rounded(lower[row]), "upper": rounded(upper[row])}
+        result.append(entry)
+
+    # Category errors treated as independent: variances add
+    totals = {}
+    for kind, (mean, lower, upper) in projections.items():
+        total = mean.sum(axis=0)
+        half_width = np.sqrt(((upper - mean) ** 2).sum(axis=0))
+        totals[kind] = {
+            "mean": rounded(total),
+            "lower": rounded(np.clip(total - half_width, 0, None)),
+            "upper": rounded(total + half_width),
+        }
+    totals["net"] = rounded(projections["income"][0].sum(axis=0) - projections["expenses"][0].sum(axis=0))
+
+    return {"months": labels, "confidence": confidence, "categories": result, "totals": totals}
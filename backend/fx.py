@@ -0,0 +1,199 @@
+"""
+Currencies and FX conversion.
+
+Accounts, transactions and investments carry a currency code; NULL means
+BASE_CURRENCY. A transaction's amount is in its account's currency, so
+per-account tables (rollups, balances, checkpoints) stay single-currency and
+aggregations across accounts convert the already-aggregated rows.
+
+Rates are stored per currency and day as units of BASE_CURRENCY per unit of
+the currency. ``RateTable`` holds every stored rate as sorted per-currency
+series and answers lookups for whole arrays of (currency, day) pairs with
+the same as-of search used for prices, so conversions never query rates
+row by row. The table is loaded once per data version.
+
+New rates come from a rate source; the built-in one reads fixed rates from
+FX_RATES (e.g. ``EUR=1.08,INR=0.012``), which doubles as the local stand-in
+for tests. A real provider only needs a ``fetch(currencies, day)`` method.
+
+    python backend/fx.py                 # record today's rates from the source
+    python backend/fx.py --load rates.csv  # import history (currency,date,rate)
+"""
+import os
+from datetime import date
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import Account, FxRate, Investment, upsert_insert
+from cache import VersionedCache
+from prices import price_matrix
+
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "USD").upper()
+
+
+def normalize_currencies(currencies) -> np.ndarray:
+    """Upper-case codes with missing values replaced by BASE_CURRENCY"""
+    codes = pd.Series(currencies, dtype=object)
+    codes = codes.where(codes.notna() & (codes.astype(str).str.strip() != ""), BASE_CURRENCY)
+    return codes.astype(str).str.strip().str.upper().to_numpy(dtype=object)
+
+
+def currency_codes(values) -> pd.Series:
+    """Upper-case codes, keeping missing values missing"""
+    codes = pd.Series(values, dtype=object)
+    return codes.where(codes.isna(), codes.astype(str).str.strip().str.upper())
+
+
+class RateTable:
+    """Stored FX rates as per-currency series with array lookups"""
+
+    def __init__(self, rates: pd.DataFrame):
+        self.points = pd.DataFrame({
+            "symbol": rates["currency"].astype(str),
+            "date": pd.to_datetime(rates["date"]),
+            "close": rates["rate"].astype(float),
+        }).sort_values(["symbol", "date"], ignore_index=True)
+        self.currencies = set(self.points["symbol"])
+
+    def _check(self, currencies: np.ndarray):
+        missing = sorted(set(currencies) - self.currencies - {BASE_CURRENCY})
+        if missing:
+            raise HTTPException(
+                status_code=409,
+                detail=f"No FX rate for {', '.join(missing)}; add one with POST /api/admin/fx/rates"
+            )
+
+    def matrix(self, currencies: Sequence[str], days: np.ndarray) -> np.ndarray:
+        """Rate to BASE_CURRENCY per currency (rows) and day (``days`` as datetime64[D])"""
+        currencies = normalize_currencies(currencies)
+        self._check(currencies)
+        rates = price_matrix(self.points, list(currencies), days)
+        rates[currencies == BASE_CURRENCY] = 1.0
+        return rates
+
+    def rates(self, currencies, days=None) -> np.ndarray:
+        """Rate per element for parallel arrays of currencies and days (default: today)"""
+        currencies = normalize_currencies(currencies)
+        if days is None:
+            days = np.full(len(currencies), np.datetime64(date.today(), "D"))
+        days = np.asarray(pd.to_datetime(pd.Series(days)).to_numpy(dtype="datetime64[D]"))
+        if len(currencies) == 0:
+            return np.ones(0)
+        # Look up each distinct currency and day once
+        unique_currencies, currency_index = np.unique(currencies.astype(str), return_inverse=True)
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        return self.matrix(list(unique_currencies), unique_days)[currency_index.ravel(), day_index.ravel()]
+
+
+_rate_tables = VersionedCache(max_entries=16)
+
+
+def rate_table(db: Session) -> RateTable:
+    """All stored rates, loaded once per data version and database (tenants of a database share rates)"""
+    def load():
+        rows = db.query(FxRate.currency, FxRate.date, FxRate.rate).all()
+        return RateTable(pd.DataFrame(rows, columns=["currency", "date", "rate"]))
+    return _rate_tables.get_or_compute(str(db.get_bind().url), load)
+
+
+def to_base(db: Session, amounts, currencies, days=None) -> np.ndarray:
+    """Convert parallel arrays of amounts and currencies (at ``days``, default today) to BASE_CURRENCY"""
+    amounts = np.asarray(amounts, dtype=np.float64)
+    return amounts * rate_table(db).rates(currencies, days)
+
+
+def month_end_days(months) -> np.ndarray:
+    """Last day of each YYYY-MM label as datetime64[D]"""
+    starts = pd.to_datetime(pd.Series(months, dtype=object) + "-01").to_numpy(dtype="datetime64[M]")
+    return (starts + 1).astype("datetime64[D]") - 1
+
+
+def rollups_in_base(db: Session, query) -> pd.DataFrame:
+    """
+    Run a rollup query with ``month`` and ``currency`` columns and convert
+    its amount columns at each month's closing rate
+    """
+    frame = pd.DataFrame(query.all(), columns=[column["name"] for column in query.column_descriptions])
+    if frame.empty:
+        return frame
+    rates = rate_table(db).rates(frame["currency"], month_end_days(frame["month"]))
+    amounts = frame.columns.difference(["category", "month", "currency", "count"])
+    frame[amounts] = frame[amounts].astype(float).mul(rates, axis=0)
+    return frame
+
+
+def record_rates(db: Session, rates: Dict[str, float], day: Optional[date] = None):
+    """Store rates to BASE_CURRENCY for ``day`` (default today), replacing earlier ones for that day"""
+    if not rates:
+        return
+    day = day or date.today()
+    insert_stmt = upsert_insert(db.get_bind())(FxRate)
+    db.execute(
+        insert_stmt.on_conflict_do_update(index_elements=["currency", "date"], set_={"rate": insert_stmt.excluded.rate}),
+        [{"currency": currency.upper(), "date": day, "rate": float(rate)} for currency, rate in rates.items()]
+    )
+
+
+class StaticRateSource:
+    """Fixed rates, e.g. from FX_RATES="EUR=1.08,INR=0.012" """
+
+    def __init__(self, rates: Dict[str, float]):
+        self._rates = {currency.upper(): float(rate) for currency, rate in rates.items()}
+
+    @classmethod
+    def from_env(cls) -> "StaticRateSource":
+        pairs = (item.split("=", 1) for item in os.getenv("FX_RATES", "").split(",") if "=" in item)
+        return cls({currency.strip(): rate for currency, rate in pairs})
+
+    def fetch(self, currencies: Iterable[str], day: date) -> Dict[str, float]:
+        return {currency: self._rates[currency] for currency in currencies if currency in self._rates}
+
+
+def currencies_in_use(db: Session) -> list:
+    used = {code for (code,) in db.query(Account.currency).distinct()}
+    used |= {code for (code,) in db.query(Investment.currency).distinct()}
+    return sorted(set(normalize_currencies(list(used))) - {BASE_CURRENCY})
+
+
+def refresh_rates(db: Session, source=None, day: Optional[date] = None) -> Dict[str, float]:
+    """Record ``day``'s rates for every currency in use from ``source`` (default: FX_RATES)"""
+    source = source or StaticRateSource.from_env()
+    rates = source.fetch(currencies_in_use(db), day or date.today())
+    record_rates(db, rates, day)
+    return rates
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models import create_tables
+    from tenancy import known_tenants, market_data_engines, tenant_session
+
+    parser = argparse.ArgumentParser(description="Record FX rates to the base currency")
+    parser.add_argument("--load", metavar="CSV", help="import rates from a CSV with currency,date,rate columns")
+    args = parser.parse_args()
+
+    create_tables()
+    if args.load:
+        history = pd.read_csv(args.load, parse_dates=["date"])
+        # Rates are shared: write them to every database outside any tenant
+        for market_engine in market_data_engines():
+            with Session(bind=market_engine, autoflush=False) as db:
+                for day, group in history.groupby(history["date"].dt.date):
+                    record_rates(db, dict(zip(group["currency"], group["rate"])), day)
+                db.commit()
+        print(f"Imported {len(history)} rates")
+    else:
+        # Each tenant's accounts and holdings decide the currencies fetched
+        for tenant in known_tenants():
+            db = tenant_session(tenant)
+            try:
+                rates = refresh_rates(db)
+                db.commit()
+                print(f"{tenant}: recorded {len(rates)} rates: {rates}")
+            finally:
+                db.close()
@@ -0,0 +1,217 @@
+"""
+Single write path for new transactions.
+
+Upload handlers (and any future importer) hand a frame of validated rows to
+``ingest_transactions`` so that derived tables stay consistent with the raw
+transactions table.
+
+On PostgreSQL, large batches are streamed with COPY into a temporary staging
+table and moved over with one INSERT ... SELECT ... ON CONFLICT DO NOTHING,
+which is far cheaper than binding every row as statement parameters.
+"""
+import io
+from typing import Dict, Optional
+
+import pandas as pd
+from sqlalchemy import event, insert, select, table as table_clause, column as column_clause
+from sqlalchemy.orm import Session
+
+from models import Account, Transaction, tenant_of, upsert_insert
+from dedup import transaction_fingerprints
+from archive import archived_fingerprints
+from categorization import fill_categories
+from columnar import transaction_store_for
+from cache import data_version
+from rollups import apply_rollup_deltas
+from budgets import apply_budget_deltas
+from balances import apply_balance_deltas
+
+TRANSACTION_COLUMNS = ["account_id", "amount", "description", "category", "date", "currency"]
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups
+_LOOKUP_CHUNK_SIZE = 500
+
+# PostgreSQL batches at least this large are loaded with COPY
+COPY_MIN_ROWS = 1000
+_STAGING_TABLE = "transactions_staging"
+_STAGED_COLUMNS = TRANSACTION_COLUMNS + ["fingerprint", "tenant_id"]
+
+
+def _lookup_ids(db: Session, key_column, values) -> dict:
+    found = {}
+    for start in range(0, len(values), _LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + _LOOKUP_CHUNK_SIZE]
+        found.update(db.query(key_column, key_column.class_.id).filter(key_column.in_(chunk)).all())
+    return found
+
+
+def resolve_account_ids(db: Session, names: pd.Series, default_type: str = "checking",
+                        currencies: pd.Series = None) -> pd.Series:
+    """
+    Map account names to ids, creating any accounts that do not exist yet.
+
+    Existing accounts are fetched with one IN query per chunk of names and the
+    missing ones are inserted in bulk, in the first currency given for them
+    in ``currencies`` (base currency otherwise).
+    """
+    unique_names = list(pd.unique(names.dropna()))
+    ids = _lookup_ids(db, Account.name, unique_names)
+
+    missing = [name for name in unique_names if name not in ids]
+    if missing:
+        first_currency = {}
+        if currencies is not None:
+            given = pd.DataFrame({"name": names, "currency": currencies}).dropna()
+            first_currency = given.drop_duplicates("name").set_index("name")["currency"].to_dict()
+        new_ids = db.execute(
+            insert(Account).returning(Account.id, sort_by_parameter_order=True),
+            [
+                {"name": name, "account_type": default_type, "balance": 0.0, "opening_balance": 0.0,
+                 "currency": first_currency.get(name)}
+                for name in missing
+            ]
+        ).scalars().all()
+        ids.update(zip(missing, new_ids))
+
+    return names.map(ids)
+
+
+def account_currencies(db: Session, account_ids: pd.Series) -> dict:
+    """Currency code (None for the base currency) per account id"""
+    ids = [int(account_id) for account_id in pd.unique(account_ids.dropna())]
+    found = {}
+    for start in range(0, len(ids), _LOOKUP_CHUNK_SIZE):
+        chunk = ids[start:start + _LOOKUP_CHUNK_SIZE]
+        found.update(db.query(Account.id, Account.currency).filter(Account.id.in_(chunk)).all())
+    return found
+
+
+def upsert_by_key(db: Session, model, key: str, frame: pd.DataFrame):
+    """
+    Insert new rows and update existing ones matched on ``key``.
+
+    Later rows win when ``frame`` repeats a key. Returns (added, updated).
+    """
+    frame = frame.drop_duplicates(subset=[key], keep="last")
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    existing = _lookup_ids(db, getattr(model, key), list(frame[key]))
+
+    updates = [{**record, "id": existing[record[key]]} for record in records if record[key] in existing]
+    inserts = [record for record in records if record[key] not in existing]
+    if updates:
+        db.bulk_update_mappings(model, updates)
+    if inserts:
+        db.bulk_insert_mappings(model, inserts)
+    if records:
+        bump_version_after_commit(db)
+    return len(inserts), len(updates)
+
+
+def ingest_transactions(db: Session, frame: pd.DataFrame, occurrences: Optional[Dict[str, int]] = None) -> int:
+    """
+    Bulk insert transactions and update derived tables.
+
+    ``frame`` must provide the TRANSACTION_COLUMNS with parsed dates and
+    resolved account ids. Rows without a category are categorized with the
+    current rules and rows without a currency take their account's. Rows
+    whose fingerprint is already stored are skipped, so re-ingesting the
+    same rows is a no-op; callers ingesting one upload in several batches
+    pass the same ``occurrences`` dict to each (see
+    ``dedup.transaction_fingerprints``). Returns the number of
+    rows actually inserted; the caller owns the commit.
+    """
+    if frame.empty:
+        return 0
+
+    frame = frame.reindex(columns=TRANSACTION_COLUMNS)
+    frame["currency"] = frame["currency"].fillna(frame["account_id"].map(account_currencies(db, frame["account_id"])))
+    frame = fill_categories(db, frame)
+    frame = frame.assign(fingerprint=transaction_fingerprints(frame, occurrences))
+    # The hot table's unique index does not cover rows moved to an archive year
+    archived = archived_fingerprints(db, frame)
+    if archived:
+        frame = frame[~frame["fingerprint"].isin(archived)]
+        if frame.empty:
+            return 0
+    if db.get_bind().dialect.name == "postgresql" and len(frame) >= COPY_MIN_ROWS:
+        inserted = _copy_insert(db, frame)
+    else:
+        inserted = _bulk_insert(db, frame)
+    if not inserted:
+        return 0
+    frame = pd.DataFrame(inserted, columns=["id"] + TRANSACTION_COLUMNS)
+
+    apply_rollup_deltas(db, frame)
+    apply_budget_deltas(db, frame)
+    apply_balance_deltas(db, frame)
+
+    # In-memory caches only see the rows once they are durable
+    store = transaction_store_for(tenant_of(db))
+    after_commit(db, lambda: store.append(frame))
+    bump_version_after_commit(db)
+    return len(frame)
+
+
+def _bulk_insert(db: Session, frame: pd.DataFrame) -> list:
+    records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+    # RETURNING the full rows keeps insertmanyvalues batching (asking for ids in
+    # parameter order would fall back to one statement per row on SQLite), and
+    # only rows that survived the conflict check come back
+    table = Transaction.__table__
+    return db.execute(
+        upsert_insert(db.get_bind())(table)
+        .on_conflict_do_nothing(index_elements=["fingerprint"])
+        .returning(table.c.id, *(table.c[name] for name in TRANSACTION_COLUMNS)),
+        records
+    ).all()
+
+
+def _copy_insert(db: Session, frame: pd.DataFrame) -> list:
+    """PostgreSQL: COPY the rows into a staging table, then insert the new ones in one statement"""
+    conn = db.connection()
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} ON COMMIT DELETE ROWS AS "
+        f"SELECT {', '.join(_STAGED_COLUMNS)} FROM transactions WITH NO DATA"
+    )
+    # Left over from an earlier batch in the same transaction
+    conn.exec_driver_sql(f"TRUNCATE {_STAGING_TABLE}")
+
+    buffer = io.StringIO()
+    frame.assign(account_id=frame["account_id"].astype("Int64"), tenant_id=tenant_of(db)).reindex(columns=_STAGED_COLUMNS).to_csv(
+        buffer, index=False, header=False, na_rep="\\N", date_format="%Y-%m-%d %H:%M:%S"
+    )
+    copy_sql = f"COPY {_STAGING_TABLE} ({', '.join(_STAGED_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    driver_connection = conn.connection.driver_connection
+    cursor = driver_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+    table = Transaction.__table__
+    staged = table_clause(_STAGING_TABLE, *(column_clause(name) for name in _STAGED_COLUMNS))
+    return db.execute(
+        upsert_insert(db.get_bind())(table)
+        .from_select(_STAGED_COLUMNS, select(*staged.c))
+        .on_conflict_do_nothing(index_elements=["fingerprint"])
+        .returning(table.c.id, *(table.c[name] for name in TRANSACTION_COLUMNS))
+    ).all()
+
+
+def after_commit(db: Session, callback):
+    """Run ``callback`` once the session's current transaction commits"""
+    event.listen(db, "after_commit", lambda session: callback(), once=True)
+
+
+def bump_version_after_commit(db: Session, shared: bool = False):
+    """
+    Invalidate the session tenant's cached results once the session commits;
+    ``shared`` invalidates every tenant's (after writing prices or FX rates)
+    """
+    tenant = None if shared else tenant_of(db)
+    after_commit(db, lambda: data_version.bump(tenant))
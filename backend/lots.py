@@ -0,0 +1,458 @@
+"""
+Tax lots and cost basis.
+
+Every investment purchase is a TaxLot and every sale a LotSale. Which lots a
+sale consumed follows from replaying the sales in date order against the
+lots of their symbol, each under its own method:
+
+* fifo - the oldest open lot first
+* lifo - the newest open lot acquired on or before the sale
+* specific - the lot the sale names
+
+``LotQueue`` keeps one symbol's lots in acquisition order so each step stays
+cheap with tens of thousands of lots: FIFO advances a head pointer past
+closed lots, LIFO finds the newest open lot through a path-compressed
+"previous open lot" index, and specific-ID sales look their lot up by id.
+A full replay is one pass over the sales.
+
+The Investment row per symbol is the open position derived from its lots:
+open shares, their average cost and earliest acquisition date.
+"""
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import Investment, LotSale, TaxLot
+
+COST_BASIS_METHODS = ("fifo", "lifo", "specific")
+# Lots held longer than this are long-term at sale
+LONG_TERM_DAYS = 365
+
+_EPSILON = 1e-9
+_LOT_COLUMNS = ["id", "symbol", "shares", "price", "acquired"]
+_SALE_COLUMNS = ["id", "symbol", "shares", "price", "sold", "method", "lot_id"]
+
+
+class LotMatchError(ValueError):
+    """A sale cannot be matched to open lots"""
+
+
+def _timestamps(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype="datetime64[us]").astype(np.int64)
+
+
+class LotQueue:
+    """Open quantities of one symbol's lots, sorted by acquisition time"""
+
+    def __init__(self, ids: List[int], acquired: List[int], shares: List[float]):
+        self.ids = ids
+        self.acquired = acquired
+        self.remaining = list(shares)
+        self.position = {lot_id: i for i, lot_id in enumerate(ids)}
+        self.head = 0
+        # _previous[i] == i while lot i is open; closed lots point left
+        self._previous = list(range(len(ids)))
+
+    def _newest_open(self, i: int) -> int:
+        """Index of the newest open lot at or before ``i`` (-1 if none)"""
+        root = i
+        while root >= 0 and self._previous[root] != root:
+            root = self._previous[root]
+        while i >= 0 and self._previous[i] != i:
+            self._previous[i], i = root, self._previous[i]
+        return root
+
+    def _oldest_open(self) -> int:
+        while self.head < len(self.ids) and self.remaining[self.head] <= 0:
+            self.head += 1
+        return self.head
+
+    def _consume(self, i: int, shares: float) -> float:
+        quantity = min(shares, self.remaining[i])
+        self.remaining[i] -= quantity
+        if self.remaining[i] <= _EPSILON:
+            self.remaining[i] = 0.0
+            self._previous[i] = i - 1
+        return quantity
+
+    def take(self, method: str, shares: float, sold: int, lot_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Remove ``shares`` sold at ``sold``; returns (lot index, quantity) pairs"""
+        eligible = bisect_right(self.acquired, sold)
+        if method == "specific":
+            i = self.position.get(lot_id)
+            if i is None or i >= eligible:
+                raise LotMatchError(f"Lot {lot_id} was not held on the sale date")
+            if self.remaining[i] < shares - _EPSILON:
+                raise LotMatchError(f"Lot {lot_id} has only {self.remaining[i]:g} shares left")
+            return [(i, self._consume(i, shares))]
+
+        taken = []
+        while shares > _EPSILON:
+            i = self._oldest_open() if method == "fifo" else self._newest_open(eligible - 1)
+            if i < 0 or i >= eligible:
+                raise LotMatchError("Not enough shares held on the sale date")
+            quantity = self._consume(i, shares)
+            taken.append((i, quantity))
+            shares -= quantity
+        return taken
+
+
+class LotBook:
+    """Lot queues for a set of symbols plus the matches made so far"""
+
+    def __init__(self, lots: pd.DataFrame):
+        self.lots = lots.sort_values(["symbol", "acquired", "id"], ignore_index=True)
+        self.acquired = _timestamps(self.lots["acquired"])
+        self.queues: Dict[str, Tuple[int, LotQueue]] = {}
+        ids = self.lots["id"].tolist()
+        shares = self.lots["shares"].astype(float).tolist()
+        acquired = self.acquired.tolist()
+        boundaries = np.flatnonzero(self.lots["symbol"].ne(self.lots["symbol"].shift()).to_numpy())
+        for start, end in zip(boundaries, list(boundaries[1:]) + [len(self.lots)]):
+            self.queues[self.lots.at[start, "symbol"]] = (
+                int(start), LotQueue(ids[start:end], acquired[start:end], shares[start:end])
+            )
+        self._matches = ([], [], [])  # sale id, lot row, quantity
+
+    def replay(self, sales: pd.DataFrame, method: Optional[str] = None):
+        """
+        Match ``sales`` in (sold, id) order. ``method`` (fifo or lifo)
+        overrides each sale's recorded method.
+        """
+        if sales.empty:
+            return
+        sales = sales.sort_values(["sold", "id"])
+        sold = _timestamps(sales["sold"]).tolist()
+        sale_ids, rows, quantities = self._matches
+        for sale, when in zip(sales.itertuples(index=False), sold):
+            offset, queue = self.queues.get(sale.symbol, (0, None))
+            if queue is None:
+                raise LotMatchError(f"No lots held for {sale.symbol}")
+            sale_method = method or sale.method or "fifo"
+            lot_id = sale.lot_id if sale_method == "specific" else None
+            for i, quantity in queue.take(sale_method, float(sale.shares), when, lot_id):
+                sale_ids.append(sale.id)
+                rows.append(offset + i)
+                quantities.append(quantity)
+
+    def remaining(self) -> np.ndarray:
+        """Open shares per lot row"""
+        remaining = np.zeros(len(self.lots))
+        for offset, queue in self.queues.values():
+            remaining[offset:offset + len(queue.remaining)] = queue.remaining
+        return remaining
+
+    def matches(self, sales: pd.DataFrame) -> pd.DataFrame:
+        """One row per (sale, lot) pair matched so far for ``sales``, with cost and proceeds"""
+        sale_ids, rows, quantities = (np.asarray(values) for values in self._matches)
+        wanted = np.isin(sale_ids, sales["id"].to_numpy())
+        sale_ids, quantities = sale_ids[wanted], quantities[wanted]
+        rows = rows[wanted].astype(np.int64)
+        sale_rows = sales.set_index("id").loc[sale_ids]
+        matched = pd.DataFrame({
+            "sale_id": sale_ids,
+            "lot_id": self.lots["id"].to_numpy()[rows],
+            "symbol": self.lots["symbol"].to_numpy()[rows],
+            "shares": np.asarray(quantities, dtype=np.float64),
+            "cost": self.lots["price"].to_numpy(dtype=np.float64)[rows],
+            "proceeds": sale_rows["price"].to_numpy(dtype=np.float64),
+            "acquired": pd.to_datetime(self.lots["acquired"]).to_numpy()[rows],
+            "sold": pd.to_datetime(sale_rows["sold"]).to_numpy(),
+        })
+        matched["gain"] = matched["shares"] * (matched["proceeds"] - matched["cost"])
+        matched["long_term"] = (matched["sold"] - matched["acquired"]).dt.days > LONG_TERM_DAYS
+        return matched
+
+
+def load_lots(db: Session, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    query = db.query(TaxLot.id, TaxLot.symbol, TaxLot.shares, TaxLot.price, TaxLot.acquired)
+    if symbols is not None:
+        query = query.filter(TaxLot.symbol.in_(list(symbols)))
+    return pd.DataFrame(query.all(), columns=_LOT_COLUMNS)
+
+
+def load_sales(db: Session, symbols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    query = db.query(LotSale.id, LotSale.symbol, LotSale.shares, LotSale.price, LotSale.sold,
+                     LotSale.method, LotSale.lot_id)
+    if symbols is not None:
+        query = query.filter(LotSale.symbol.in_(list(symbols)))
+    return pd.DataFrame(query.all(), columns=_SALE_COLUMNS)
+
+
+def _replayed_book(db: Session, symbols: Optional[Iterable[str]] = None, method: Optional[str] = None):
+    lots = load_lots(db, symbols)
+    sales = load_sales(db, symbols)
+    book = LotBook(lots)
+    try:
+        book.replay(sales, method)
+    except LotMatchError as e:
+        raise HTTPException(status_code=409, detail=f"Stored sales do not match the lots: {e}")
+    return book, sales
+
+
+def add_lots(db: Session, frame: pd.DataFrame) -> int:
+    """Store one lot per row of ``frame`` (symbol, shares, purchase_price, purchase_date)"""
+    if frame.empty:
+        return 0
+    acquired = pd.to_datetime(frame["purchase_date"]).dt.to_pydatetime()
+    db.bulk_insert_mappings(TaxLot, [
+        {"symbol": symbol, "shares": float(shares), "price": float(price), "acquired": when}
+        for symbol, shares, price, when in zip(frame["symbol"], frame["shares"], frame["purchase_price"], acquired)
+    ])
+    return len(frame)
+
+
+def sync_positions(db: Session, symbols: Iterable[str], current_prices: Optional[Dict[str, float]] = None,
+                   currencies: Optional[Dict[str, str]] = None):
+    """
+    Rewrite the Investment position of each symbol from its open lots:
+    open shares, average cost and first acquisition. Symbols without open
+    lots lose their position. ``currencies`` sets the quote currency of the
+    given symbols.
+    """
+    symbols = sorted(set(symbols))
+    if not symbols:
+        return
+    current_prices = current_prices or {}
+    book, _ = _replayed_book(db, symbols)
+    lots = book.lots.assign(remaining=book.remaining())
+    lots = lots[lots["remaining"] > _EPSILON]
+    positions = lots.assign(cost=lots["remaining"] * lots["price"]).groupby("symbol").agg(
+        shares=("remaining", "sum"), cost=("cost", "sum"), acquired=("acquired", "min"), last_price=("price", "last")
+    )
+
+    existing = {inv.symbol: inv for inv in db.query(Investment).filter(Investment.symbol.in_(symbols))}
+    for symbol in symbols:
+        investment = existing.get(symbol)
+        if symbol not in positions.index:
+            if investment is not None:
+                db.delete(investment)
+            continue
+        position = positions.loc[symbol]
+        if investment is None:
+            investment = Investment(symbol=symbol, current_price=float(position["last_price"]))
+            db.add(investment)
+        investment.shares = float(position["shares"])
+        investment.purchase_price = float(position["cost"] / position["shares"])
+        investment.purchase_date = pd.Timestamp(position["acquired"]).to_pydatetime()
+        if symbol in current_prices:
+            investment.current_price = float(current_prices[symbol])
+        if currencies and currencies.get(symbol) is not None:
+            investment.currency = currencies[symbol]
+
+
+def backfill_lots(db: Session) -> int:
+    """Give positions stored before tax lots existed a lot each; returns the number created"""
+    with_lots = {symbol for (symbol,) in db.query(TaxLot.symbol).distinct()}
+    missing = [inv for inv in db.query(Investment) if inv.symbol not in with_lots and inv.shares]
+    db.bulk_insert_mappings(TaxLot, [
+        {
+            "symbol": inv.symbol,
+            "shares": inv.shares,
+            "price": inv.purchase_price if inv.purchase_price is not None else inv.current_price,
+            "acquired": inv.purchase_date or datetime.utcnow(),
+        }
+        for inv in missing
+    ])
+    return len(missing)
+
+
+def record_sale(db: Session, symbol: str, shares: float, price: float, sold: datetime,
+                method: str = "fifo", lot_ids: Optional[List[int]] = None, dry_run: bool = False) -> Dict:
+    """
+    Sell ``shares`` of ``symbol`` and return the lots consumed with their
+    gains. Specific-ID sales draw from ``lot_ids`` in the order given. The
+    sale is checked against every later stored sale; with ``dry_run``
+    nothing is written. The caller owns the commit.
+    """
+    if method not in COST_BASIS_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(COST_BASIS_METHODS)}")
+    if method == "specific" and not lot_ids:
+        raise HTTPException(status_code=400, detail="Specific-ID sales need lot_ids")
+
+    lots = load_lots(db, [symbol])
+    sales = load_sales(db, [symbol])
+    book = LotBook(lots)
+    earlier = pd.to_datetime(sales["sold"]) <= pd.Timestamp(sold)
+    # Placeholder ids sort after every stored sale on the same timestamp
+    next_id = int(sales["id"].max()) + 1 if len(sales) else 1
+
+    try:
+        book.replay(sales[earlier.to_numpy()])
+        if method == "specific":
+            offset, queue = book.queues.get(symbol, (0, None))
+            remaining = {
+                lot_id: queue.remaining[queue.position[lot_id]]
+                for lot_id in lot_ids if queue is not None and lot_id in queue.position
+            }
+            rows, left = [], shares
+            for lot_id in lot_ids:
+                quantity = min(left, remaining.get(lot_id, left))
+                if quantity > _EPSILON:
+                    rows.append((lot_id, quantity))
+                    left -= quantity
+            if left > _EPSILON:
+                raise LotMatchError("The selected lots do not hold enough shares")
+        else:
+            rows = [(None, shares)]
+        new_sales = pd.DataFrame(
+            [(next_id + i, symbol, quantity, price, sold, method, lot_id) for i, (lot_id, quantity) in enumerate(rows)],
+            columns=_SALE_COLUMNS
+        )
+        book.replay(new_sales)
+        matched = book.matches(new_sales)
+        book.replay(sales[~earlier.to_numpy()])
+    except LotMatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not dry_run:
+        db.bulk_insert_mappings(LotSale, [
+            {key: value for key, value in record.items() if key != "id"}
+            for record in new_sales.astype(object).where(new_sales.notna(), None).to_dict("records")
+        ])
+        sync_positions(db, [symbol])
+
+    return {
+        "symbol": symbol,
+        "shares": shares,
+        "price": price,
+        "sold": sold.isoformat(),
+        "method": method,
+        "proceeds": round(shares * price, 2),
+        "cost_basis": round(float((matched["shares"] * matched["cost"]).sum()), 2),
+        "gain": round(float(matched["gain"].sum()), 2),
+        "lots": [
+            {
+                "lot_id": int(row.lot_id),
+                "shares": row.shares,
+                "cost": row.cost,
+                "acquired": pd.Timestamp(row.acquired).isoformat(),
+                "gain": round(row.gain, 2),
+                "long_term": bool(row.long_term),
+            }
+            for row in matched.itertuples(index=False)
+        ],
+        "dry_run": dry_run,
+    }
+
+
+def _current_prices(db: Session) -> Dict[str, float]:
+    return {symbol: price for symbol, price in db.query(Investment.symbol, Investment.current_price)}
+
+
+def lot_frame(db: Session, symbols: Optional[Iterable[str]] = None, method: Optional[str] = None,
+              include_closed: bool = False) -> pd.DataFrame:
+    """Lots (id, symbol, shares, price, acquired) with their open shares as ``remaining``"""
+    book, _ = _replayed_book(db, symbols, method)
+    lots = book.lots.assign(remaining=book.remaining())
+    if not include_closed:
+        lots = lots[lots["remaining"] > _EPSILON]
+    return lots
+
+
+def open_lots(db: Session, symbol: Optional[str] = None, method: Optional[str] = None,
+              include_closed: bool = False) -> List[Dict]:
+    """Lots with their open shares, cost basis and unrealized gain"""
+    lots = lot_frame(db, [symbol] if symbol else None, method, include_closed)
+    current = lots["symbol"].map(_current_prices(db)).astype(float)
+    cost_basis = lots["remaining"] * lots["price"]
+    market_value = lots["remaining"] * current
+    held_days = (pd.Timestamp(datetime.utcnow()) - pd.to_datetime(lots["acquired"])).dt.days
+
+    return [
+        {
+            "lot_id": int(lot_id),
+            "symbol": lot_symbol,
+            "acquired": pd.Timestamp(acquired).isoformat(),
+            "shares": shares,
+            "remaining": round(remaining, 9),
+            "cost": price,
+            "cost_basis": round(basis, 2),
+            "market_value": round(value, 2) if np.isfinite(value) else None,
+            "unrealized_gain": round(value - basis, 2) if np.isfinite(value) else None,
+            "long_term": bool(days > LONG_TERM_DAYS),
+        }
+        for lot_id, lot_symbol, acquired, shares, remaining, price, basis, value, days in zip(
+            lots["id"], lots["symbol"], lots["acquired"], lots["shares"], lots["remaining"],
+            lots["price"], cost_basis, market_value, held_days
+        )
+    ]
+
+
+def gains_report(db: Session, method: Optional[str] = None, year: Optional[int] = None) -> Dict:
+    """
+    Realized gains (short- and long-term, optionally for sales in ``year``)
+    and unrealized gains per symbol. ``method`` (fifo or lifo) recomputes
+    every sale under that method instead of the recorded ones.
+    """
+    book, sales = _replayed_book(db, method=method)
+    realized = book.matches(sales)
+    if year is not None:
+        realized = realized[realized["sold"].dt.year == year]
+
+    realized = realized.assign(
+        proceeds_total=realized["shares"] * realized["proceeds"],
+        cost_total=realized["shares"] * realized["cost"],
+        short_term=realized["gain"].where(~realized["long_term"], 0.0),
+        long_term_gain=realized["gain"].where(realized["long_term"], 0.0),
+    )
+    realized_by_symbol = realized.groupby("symbol", sort=True)[
+        ["proceeds_total", "cost_total", "gain", "short_term", "long_term_gain"]
+    ].sum()
+
+    lots = book.lots.assign(remaining=book.remaining())
+    lots = lots[lots["remaining"] > _EPSILON]
+    lots = lots.assign(
+        cost_total=lots["remaining"] * lots["price"],
+        market_value=lots["remaining"] * lots["symbol"].map(_current_prices(db)).astype(float),
+    )
+    unrealized_by_symbol = lots.groupby("symbol", sort=True).agg(
+        shares=("remaining", "sum"), cost_total=("cost_total", "sum"), market_value=("market_value", "sum")
+    )
+    unrealized_by_symbol["gain"] = unrealized_by_symbol["market_value"] - unrealized_by_symbol["cost_total"]
+
+    def rounded(value) -> float:
+        return round(float(value), 2)
+
+    return {
+        "method": method or "recorded",
+        "year": year,
+        "realized": {
+            "proceeds": rounded(realized["proceeds_total"].sum()),
+            "cost_basis": rounded(realized["cost_total"].sum()),
+            "gain": rounded(realized["gain"].sum()),
+            "short_term": rounded(realized["short_term"].sum()),
+            "long_term": rounded(realized["long_term_gain"].sum()),
+            "by_symbol": [
+                {
+                    "symbol": symbol,
+                    "proceeds": rounded(row.proceeds_total),
+                    "cost_basis": rounded(row.cost_total),
+                    "gain": rounded(row.gain),
+                    "short_term": rounded(row.short_term),
+                    "long_term": rounded(row.long_term_gain),
+                }
+                for symbol, row in realized_by_symbol.iterrows()
+            ],
+        },
+        "unrealized": {
+            "cost_basis": rounded(unrealized_by_symbol["cost_total"].sum()),
+            "market_value": rounded(unrealized_by_symbol["market_value"].sum()),
+            "gain": rounded(unrealized_by_symbol["gain"].sum()),
+            "by_symbol": [
+                {
+                    "symbol": symbol,
+                    "shares": round(float(row.shares), 9),
+                    "cost_basis": rounded(row.cost_total),
+                    "market_value": rounded(row.market_value),
+                    "gain": rounded(row.gain),
+                }
+                for symbol, row in unrealized_by_symbol.iterrows()
+            ],
+        },
+    }
@@ -1,21 +1,67 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+import logging
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Query, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from typing import List, Dict, Optional
+import numpy as np
 import pandas as pd
 import asyncio
 import random
-import io
-from datetime import datetime, timedelta
+import json
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
+
+# Load environment variables before the local modules read their settings
+load_dotenv()
+
+from sqlalchemy import func, select
 from models import (
-    Account, Transaction, Investment, Budget,
-    get_db, create_tables, SessionLocal
+    Account, Investment, Budget, MonthlyRollup, CategoryRule,
+    AccountSnapshot, NetWorthSnapshot, BalanceCheckpoint, FxRate,
+    create_tables, engine, tenant_of
+)
+from responses import FastJSONResponse, CompressionMiddleware
+from filters import TransactionFilters, encode_cursor, keyset_after, sort_key
+from search import create_search_index, search_transactions
+from dedup import file_sha256, find_uploaded_file, record_uploaded_file
+from ingest import (
+    account_currencies, after_commit, bump_version_after_commit, ingest_transactions, resolve_account_ids,
+    upsert_by_key
+)
+from categorization import recategorize_history, rule_to_dict, validate_rule
+from readers import upload_format, read_table
+from export import (
+    EXPORT_MEDIA_TYPES, check_export_format, export_chunks,
+    transactions_arrow_schema, holdings_arrow_schema
+)
+from validation import (
+    TRANSACTION_SCHEMA, INVESTMENT_SCHEMA, ACCOUNT_SCHEMA, missing_columns, validate_frame
 )
+from budgets import reconcile_budgets
+from columnar import get_transaction_store, group_by_period, transaction_store_for
+from recurring import recurring_items
+from anomalies import Z_THRESHOLD, find_anomalies
+from cache import VersionedCache
+from forecast import cash_flow_forecast
+from prices import record_prices
+from performance import RISK_FREE_RATE, portfolio_performance
+from rebalance import DEFAULT_TOLERANCE, classify_assets, parse_targets, rebalance_plan
+from lots import add_lots, backfill_lots, gains_report, open_lots, record_sale, sync_positions
+from balances import (
+    balances_as_of, checkpoint_to_dict, extend_checkpoints, initialize_opening_balances,
+    rebuild_checkpoints, reset_opening_balances, running_balances
+)
+from fx import (
+    BASE_CURRENCY, currency_codes, normalize_currencies, rate_table, record_rates, rollups_in_base, to_base
+)
+from snapshots import SNAPSHOT_INTERVAL_HOURS, backfill_snapshots, run_snapshot_job, take_snapshot
+from tenancy import get_db, get_market_data_sessions, get_tenant, known_tenants, tenant_session
+from archive import ARCHIVE_INTERVAL_HOURS, run_archive_job, transactions_source
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=os.getenv("APP_NAME", "FPTI Financial Dashboard API"),
@@ -31,55 +77,133 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Compress large responses (brotli when available, gzip otherwise)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+    excluded_media_types=("application/vnd.apache.parquet",),
 )
 
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "5000"))
+
 # Initialize database
 create_tables()
+create_search_index(engine)
+for _tenant in known_tenants():
+    with tenant_session(_tenant) as _db:
+        # Accounts created before opening balances existed take theirs from the current
+        # balance; positions created before tax lots get a lot each
+        if initialize_opening_balances(_db) + backfill_lots(_db):
+            _db.commit()
+
+forecast_cache = VersionedCache()
+performance_cache = VersionedCache()
+gains_cache = VersionedCache()
+
+async def _snapshot_loop():
+    while True:
+        try:
+            await run_in_threadpool(run_snapshot_job)
+        except Exception:
+            logger.exception("Daily snapshot failed")
+        await asyncio.sleep(SNAPSHOT_INTERVAL_HOURS * 3600)
+
+@app.on_event("startup")
+async def start_snapshot_job():
+    """Snapshot net worth periodically when SNAPSHOT_INTERVAL_HOURS is set"""
+    if SNAPSHOT_INTERVAL_HOURS > 0:
+        asyncio.create_task(_snapshot_loop())
+
+async def _archive_loop():
+    while True:
+        try:
+            await run_in_threadpool(run_archive_job)
+        except Exception:
+            logger.exception("Transaction archival failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+@app.on_event("startup")
+async def start_archive_job():
+    """Archive old transactions and compact the database periodically when ARCHIVE_INTERVAL_HOURS is set"""
+    if ARCHIVE_INTERVAL_HOURS > 0:
+        asyncio.create_task(_archive_loop())
 
 class FinancialAnalyzer:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_net_worth(self) -> float:
-        accounts = self.db.query(Account).all()
-        total_assets = sum(acc.balance for acc in accounts if acc.account_type != "credit")
-        total_liabilities = sum(acc.balance for acc in accounts if acc.account_type == "credit")
+    # All totals are in BASE_CURRENCY: balances and holdings convert at today's
+    # rates, rollups at each month's closing rate
 
-        investments = self.db.query(Investment).all()
-        investment_value = sum(inv.shares * inv.current_price for inv in investments)
+    def get_net_worth(self) -> float:
+        accounts = self.db.query(Account.account_type, Account.balance, Account.currency).all()
+        balances = to_base(self.db, [acc.balance or 0.0 for acc in accounts], [acc.currency for acc in accounts])
+        is_credit = np.array([acc.account_type == "credit" for acc in accounts], dtype=bool)
+        total_assets = balances[~is_credit].sum()
+        total_liabilities = balances[is_credit].sum()
 
-        return total_assets + investment_value - total_liabilities
+        return float(total_assets + self.get_portfolio_value() - total_liabilities)
 
     def get_portfolio_value(self) -> float:
-        investments = self.db.query(Investment).all()
-        return sum(inv.shares * inv.current_price for inv in investments)
+        investments = self.db.query(Investment.shares, Investment.current_price, Investment.currency).all()
+        values = [inv.shares * inv.current_price for inv in investments]
+        return float(to_base(self.db, values, [inv.currency for inv in investments]).sum())
 
     def get_cash_flow_data(self) -> Dict:
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-
-        transactions = self.db.query(Transaction).filter(
-            Transaction.date >= start_date
-        ).all()
+        start_month = (end_date - timedelta(days=365)).strftime("%Y-%m")
 
-        df = pd.DataFrame([{
-            'date': t.date,
-            'amount': t.amount,
-            'category': t.category
-        } for t in transactions])
+        monthly_data = rollups_in_base(self.db, self.db.query(
+            func.sum(MonthlyRollup.income - MonthlyRollup.expenses).label("amount"),
+            MonthlyRollup.month,
+            Account.currency
+        ).outerjoin(Account, Account.id == MonthlyRollup.account_id).filter(
+            MonthlyRollup.month >= start_month
+        ).group_by(MonthlyRollup.month, Account.currency))
 
-        if df.empty:
+        if monthly_data.empty:
             return {'income': [], 'expenses': [], 'dates': []}
+        monthly_data = monthly_data.groupby("month", sort=True)["amount"].sum()
 
-        df['month'] = df['date'].dt.to_period('M')
-        monthly_data = df.groupby('month')['amount'].sum().reset_index()
-
-        income = [max(0, amount) for amount in monthly_data['amount']]
-        expenses = [abs(min(0, amount)) for amount in monthly_data['amount']]
-        dates = [str(month) for month in monthly_data['month']]
+        income = [max(0, amount) for amount in monthly_data]
+        expenses = [abs(min(0, amount)) for amount in monthly_data]
+        dates = list(monthly_data.index)
 
         return {'income': income, 'expenses': expenses, 'dates': dates}
 
+    def get_category_breakdown(self, start_month: str, end_month: str,
+                               account_id: Optional[int] = None) -> List[Dict]:
+        query = self.db.query(
+            MonthlyRollup.category,
+            func.sum(MonthlyRollup.income).label("income"),
+            func.sum(MonthlyRollup.expenses).label("expenses"),
+            func.sum(MonthlyRollup.income_count + MonthlyRollup.expense_count).label("count"),
+            MonthlyRollup.month,
+            Account.currency
+        ).outerjoin(Account, Account.id == MonthlyRollup.account_id).filter(
+            MonthlyRollup.month >= start_month,
+            MonthlyRollup.month <= end_month
+        )
+        if account_id is not None:
+            query = query.filter(MonthlyRollup.account_id == account_id)
+
+        frame = rollups_in_base(self.db, query.group_by(MonthlyRollup.category, MonthlyRollup.month, Account.currency))
+        if frame.empty:
+            return []
+        totals = frame.groupby("category")[["income", "expenses", "count"]].sum()
+        totals = totals.sort_values("expenses", ascending=False)
+        return [{
+            "category": category,
+            "income": round(row["income"], 2),
+            "expenses": round(row["expenses"], 2),
+            "count": int(row["count"])
+        } for category, row in totals.iterrows()]
+
 async def fetch_market_data(symbol: str) -> float:
     """Simulate market data fetch - in production, integrate with real API"""
     await asyncio.sleep(0.1)  # Simulate API call delay
@@ -99,53 +223,426 @@ async def health_check():
 async def get_portfolio_value(db: Session = Depends(get_db)):
     analyzer = FinancialAnalyzer(db)
 
-    # Update investment prices with async calls
+    # Update investment prices with async calls; the shared price history is
+    # only written through /api/admin/prices
     investments = db.query(Investment).all()
     for investment in investments:
         investment.current_price = await fetch_market_data(investment.symbol)
+    bump_version_after_commit(db)
     db.commit()
 
     return {"portfolio_value": analyzer.get_portfolio_value()}
 
+@app.get("/api/portfolio/performance", response_class=FastJSONResponse)
+def get_portfolio_performance(
+    start_date: Optional[date] = None,
+    risk_free_rate: float = Query(RISK_FREE_RATE, ge=-1, le=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Time-weighted return, IRR, annualized volatility, Sharpe ratio and max
+    drawdown for the portfolio and each holding since ``start_date``
+    (default: first purchase), cached until prices or holdings change
+    """
+    key = (start_date, risk_free_rate, date.today())
+    result = performance_cache.get_or_compute(
+        key, lambda: portfolio_performance(db, start_date, risk_free_rate), tenant=tenant_of(db)
+    )
+    return FastJSONResponse(result)
+
+@app.post("/api/portfolio/sell")
+def sell_investment(
+    symbol: str,
+    shares: float = Query(..., gt=0),
+    price: float = Query(..., ge=0),
+    sold: Optional[datetime] = Query(None, description="Sale time (default: now)"),
+    method: str = Query("fifo", pattern="^(fifo|lifo|specific)$"),
+    lot_ids: Optional[List[int]] = Query(None, description="Lots to sell from, in order (specific-ID)"),
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Sell shares matched to tax lots by FIFO, LIFO or specific ID and report the realized gain"""
+    result = record_sale(db, symbol, shares, price, sold or datetime.utcnow(), method, lot_ids, dry_run)
+    if not dry_run:
+        bump_version_after_commit(db)
+        db.commit()
+    return result
+
+@app.get("/api/portfolio/tax-lots")
+def get_tax_lots(
+    symbol: Optional[str] = None,
+    method: Optional[str] = Query(None, pattern="^(fifo|lifo)$"),
+    include_closed: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Tax lots with open shares, cost basis and unrealized gain (``method`` re-matches every sale)"""
+    return open_lots(db, symbol, method, include_closed)
+
+@app.get("/api/portfolio/gains", response_class=FastJSONResponse)
+def get_gains(
+    method: Optional[str] = Query(None, pattern="^(fifo|lifo)$"),
+    year: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Realized (short/long-term) and unrealized gains per symbol; ``method``
+    recomputes every sale under FIFO or LIFO instead of the recorded methods
+    """
+    result = gains_cache.get_or_compute(
+        (method, year, date.today()), lambda: gains_report(db, method, year), tenant=tenant_of(db)
+    )
+    return FastJSONResponse(result)
+
 @app.get("/api/net-worth")
 def get_net_worth(db: Session = Depends(get_db)):
     analyzer = FinancialAnalyzer(db)
     return {"net_worth": analyzer.get_net_worth()}
 
-@app.get("/api/transactions")
-def get_transactions(db: Session = Depends(get_db)):
-    transactions = db.query(Transaction).limit(100).all()
-    return [{
+@app.get("/api/net-worth/history", response_class=FastJSONResponse)
+def get_net_worth_history(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    include_accounts: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Daily net worth, cash, liabilities and holdings value read from the
+    snapshot tables (defaults to the last 365 days)
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=365)
+    rows = db.query(NetWorthSnapshot).filter(
+        NetWorthSnapshot.date >= start_date,
+        NetWorthSnapshot.date <= end_date
+    ).order_by(NetWorthSnapshot.date).all()
+
+    dates = [row.date.isoformat() for row in rows]
+    history = {
+        "dates": dates,
+        "net_worth": [row.net_worth for row in rows],
+        "cash": [row.cash for row in rows],
+        "liabilities": [row.liabilities for row in rows],
+        "holdings_value": [row.holdings_value for row in rows],
+    }
+    if include_accounts:
+        balances = pd.DataFrame(
+            db.query(AccountSnapshot.account_id, AccountSnapshot.date, AccountSnapshot.balance).filter(
+                AccountSnapshot.date >= start_date,
+                AccountSnapshot.date <= end_date
+            ).all(),
+            columns=["account_id", "date", "balance"]
+        )
+        pivot = balances.pivot(index="date", columns="account_id", values="balance")
+        pivot = pivot.reindex([row.date for row in rows])
+        history["accounts"] = {
+            str(account_id): pivot[account_id].round(2).where(pivot[account_id].notna(), None).tolist()
+            for account_id in pivot.columns
+        }
+    return FastJSONResponse(history)
+
+@app.post("/api/net-worth/snapshots")
+def create_net_worth_snapshots(backfill: bool = False, start_date: Optional[date] = None,
+                               db: Session = Depends(get_db)):
+    """Snapshot today, or every day since ``start_date`` (default: first transaction) with ``backfill``"""
+    if backfill or start_date is not None:
+        days = backfill_snapshots(db, start=start_date)
+        db.commit()
+        return {"message": f"Wrote snapshots for {days} days", "days": days}
+    totals = take_snapshot(db)
+    db.commit()
+    return {"message": "Snapshot written", **totals, "date": totals["date"].isoformat()}
+
+def _get_account(db: Session, account_id: int) -> Account:
+    account = db.query(Account).filter(Account.id == account_id).first()
+    if account is None:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return account
+
+@app.get("/api/accounts/{account_id}/balances", response_class=FastJSONResponse)
+def get_running_balances(
+    account_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Transactions of an account in date order with the running balance after each"""
+    _get_account(db, account_id)
+    rows = running_balances(db, account_id, start_date, end_date, limit)
+    return FastJSONResponse({"account_id": account_id, "transactions": rows})
+
+@app.get("/api/accounts/{account_id}/balance")
+def get_balance_as_of(account_id: int, as_of: Optional[date] = None, db: Session = Depends(get_db)):
+    """End-of-day balance of an account on ``as_of`` (default: today)"""
+    _get_account(db, account_id)
+    return balances_as_of(db, as_of or date.today(), [account_id])[0]
+
+@app.get("/api/accounts/{account_id}/checkpoints")
+def get_account_checkpoints(
+    account_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Month-end balance checkpoints of one account"""
+    _get_account(db, account_id)
+    query = db.query(BalanceCheckpoint).filter(BalanceCheckpoint.account_id == account_id)
+    if start_date is not None:
+        query = query.filter(BalanceCheckpoint.date >= start_date)
+    if end_date is not None:
+        query = query.filter(BalanceCheckpoint.date <= end_date)
+    return [checkpoint_to_dict(checkpoint) for checkpoint in query.order_by(BalanceCheckpoint.date)]
+
+@app.get("/api/balances/checkpoints")
+def get_checkpoints_on(as_of: Optional[date] = None, db: Session = Depends(get_db)):
+    """
+    Balance of every account on ``as_of`` (default: today), with the
+    checkpoint each one was computed from
+    """
+    balances = balances_as_of(db, as_of or date.today())
+    return {"as_of": (as_of or date.today()).isoformat(), "accounts": balances}
+
+@app.post("/api/balances/checkpoints")
+def update_checkpoints(rebuild: bool = False, db: Session = Depends(get_db)):
+    """Add month-end checkpoints since the latest ones, or recompute all of them with ``rebuild``"""
+    count = rebuild_checkpoints(db) if rebuild else extend_checkpoints(db)
+    db.commit()
+    return {"message": f"Wrote {count} balance checkpoints", "count": count}
+
+@app.get("/api/fx/rates")
+def get_fx_rates(
+    currency: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """Stored FX rates (units of the base currency per unit of ``currency``)"""
+    query = db.query(FxRate)
+    if currency:
+        query = query.filter(FxRate.currency == currency.strip().upper())
+    if start_date is not None:
+        query = query.filter(FxRate.date >= start_date)
+    if end_date is not None:
+        query = query.filter(FxRate.date <= end_date)
+    rates = query.order_by(FxRate.currency, FxRate.date).all()
+    return {
+        "base_currency": BASE_CURRENCY,
+        "rates": [{"currency": rate.currency, "date": rate.date.isoformat(), "rate": rate.rate} for rate in rates]
+    }
+
+@app.post("/api/admin/fx/rates")
+def add_fx_rate(
+    currency: str = Query(..., min_length=3, max_length=3),
+    rate: float = Query(..., gt=0),
+    day: Optional[date] = Query(None, alias="date"),
+    sessions: List[Session] = Depends(get_market_data_sessions)
+):
+    """
+    Store the rate of ``currency`` on ``date`` (default: today), replacing any
+    stored for that day; rates are shared by every tenant (admin token only)
+    """
+    currency = currency.strip().upper()
+    if currency == BASE_CURRENCY:
+        raise HTTPException(status_code=400, detail=f"{BASE_CURRENCY} is the base currency")
+    day = day or date.today()
+    for db in sessions:
+        record_rates(db, {currency: rate}, day)
+        bump_version_after_commit(db, shared=True)
+        db.commit()
+    return {"message": f"Stored {currency} rate for {day.isoformat()}", "currency": currency,
+            "date": day.isoformat(), "rate": rate}
+
+@app.post("/api/admin/prices")
+def add_price(
+    symbol: str = Query(..., min_length=1),
+    close: float = Query(..., gt=0),
+    day: Optional[date] = Query(None, alias="date"),
+    sessions: List[Session] = Depends(get_market_data_sessions)
+):
+    """
+    Store the close of ``symbol`` on ``date`` (default: today), replacing any
+    stored for that day; prices are shared by every tenant (admin token only)
+    """
+    symbol = symbol.strip()
+    day = day or date.today()
+    for db in sessions:
+        record_prices(db, {symbol: close}, day)
+        bump_version_after_commit(db, shared=True)
+        db.commit()
+    return {"message": f"Stored {symbol} close for {day.isoformat()}", "symbol": symbol,
+            "date": day.isoformat(), "close": close}
+
+@app.get("/api/transactions", response_class=FastJSONResponse)
+def get_transactions(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    sort: str = Query("date", pattern="^(date|amount|category|description)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    filters: TransactionFilters = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    List transactions using keyset pagination on (sort column, id).
+    When more rows exist, the cursor for the next page is returned in the
+    X-Next-Cursor response header. Archived years are included unless
+    start_date rules them out.
+    """
+    source = transactions_source(db, filters.start_date)
+    sort_column = sort_key(source, sort)
+    descending = order == "desc"
+
+    query = db.query(
+        source.id,
+        source.amount,
+        source.description,
+        source.category,
+        source.date,
+        Account.name.label("account"),
+        sort_column.label("sort_key")
+    ).outerjoin(Account, source.account_id == Account.id)
+
+    query = filters.apply(query, source)
+    if cursor:
+        query = query.filter(keyset_after(sort_column, source.id, cursor, descending))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), source.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), source.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = FastJSONResponse([{
         "id": t.id,
         "amount": t.amount,
         "description": t.description,
         "category": t.category,
-        "date": t.date.isoformat(),
-        "account": t.account.name
-    } for t in transactions]
+        "date": t.date,
+        "account": t.account
+    } for t in rows])
+    if has_more:
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.sort_key, last.id)
+    return response
+
+@app.get("/api/transactions/search", response_class=FastJSONResponse)
+def search_transactions_endpoint(
+    q: str = Query(..., min_length=1, description="Words to match in the description (prefix matching)"),
+    limit: int = Query(50, ge=1, le=500),
+    filters: TransactionFilters = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search over transaction descriptions, ranked by relevance;
+    archived years follow, matched by substring
+    """
+    return FastJSONResponse(search_transactions(db, q, filters, limit))
 
-@app.get("/api/cash-flow")
+@app.get("/api/cash-flow", response_class=FastJSONResponse)
 def get_cash_flow(db: Session = Depends(get_db)):
     analyzer = FinancialAnalyzer(db)
-    return analyzer.get_cash_flow_data()
+    return FastJSONResponse(analyzer.get_cash_flow_data())
+
+@app.get("/api/cash-flow/forecast", response_class=FastJSONResponse)
+def get_cash_flow_forecast(
+    months: int = Query(6, ge=1, le=36),
+    confidence: float = Query(0.8, gt=0, lt=1),
+    account_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Projected income and expenses per category for the ``months`` months
+    after the current one, with ``confidence`` bands
+    """
+    def compute():
+        items = recurring_items(get_transaction_store(db))
+        if account_id is not None:
+            items = [item for item in items if item["account_id"] == account_id]
+        return cash_flow_forecast(db, items, months=months, confidence=confidence, account_id=account_id)
+
+    # Keyed on today's month too: the forecast window moves with the calendar
+    key = (months, confidence, account_id, date.today().strftime("%Y-%m"))
+    return FastJSONResponse(forecast_cache.get_or_compute(key, compute, tenant=tenant_of(db)))
+
+@app.get("/api/analytics/categories", response_class=FastJSONResponse)
+def get_category_breakdown(
+    start_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, defaults to 12 months ago"),
+    end_month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM, defaults to the current month"),
+    account_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Income and expenses per category, read from the monthly rollups"""
+    now = datetime.now()
+    start_month = start_month or (now - timedelta(days=365)).strftime("%Y-%m")
+    end_month = end_month or now.strftime("%Y-%m")
+    analyzer = FinancialAnalyzer(db)
+    return FastJSONResponse(analyzer.get_category_breakdown(start_month, end_month, account_id))
+
+@app.get("/api/analytics/trends", response_class=FastJSONResponse)
+def get_spending_trends(
+    freq: str = Query("M", pattern="^[DWM]$", description="D (daily), W (weekly) or M (monthly)"),
+    filters: TransactionFilters = Depends(),
+    db: Session = Depends(get_db)
+):
+    """Income, expenses and net per period, computed on the columnar transaction store"""
+    store = get_transaction_store(db)
+    with store.lock:
+        mask = store.mask(filters)
+        return FastJSONResponse(group_by_period(store, mask, freq))
+
+@app.get("/api/analytics/cache")
+def get_analytics_cache_stats(db: Session = Depends(get_db)):
+    """Row count and memory footprint of the columnar transaction store"""
+    store = get_transaction_store(db)
+    return {"version": store.version, **store.memory_usage()}
+
+@app.get("/api/recurring")
+def get_recurring_transactions(
+    active_only: bool = True,
+    type: Optional[str] = Query(None, pattern="^(income|expense)$"),
+    db: Session = Depends(get_db)
+):
+    """Detected recurring transactions and subscriptions with their next expected date and amount"""
+    items = recurring_items(get_transaction_store(db), active_only=active_only)
+    if type is not None:
+        items = [item for item in items if item["type"] == type]
+    return FastJSONResponse({
+        "items": items,
+        "monthly_income": round(sum(item["monthly_amount"] for item in items if item["type"] == "income"), 2),
+        "monthly_expenses": round(-sum(item["monthly_amount"] for item in items if item["type"] == "expense"), 2),
+    })
+
+@app.get("/api/anomalies")
+def get_anomalies(
+    kind: Optional[str] = Query(None, pattern="^(transaction|category)$"),
+    since: Optional[date] = None,
+    min_score: float = Query(Z_THRESHOLD, ge=Z_THRESHOLD),
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Transactions far from their merchant's usual amount and category months
+    far above their trailing spend, newest first. ``score`` is a robust
+    (median/MAD) z-score; only scores of at least Z_THRESHOLD are kept, so
+    ``min_score`` can raise the cut-off but not lower it.
+    """
+    anomalies = find_anomalies(get_transaction_store(db), kind=kind, since=since, min_score=min_score)
+    return FastJSONResponse(anomalies[:limit])
 
 @app.get("/api/asset-allocation")
 def get_asset_allocation(db: Session = Depends(get_db)):
     investments = db.query(Investment).all()
+    asset_classes = classify_assets([inv.symbol for inv in investments])
+    values = to_base(db, [inv.shares * inv.current_price for inv in investments], [inv.currency for inv in investments])
 
     allocation = {}
     total_value = 0
 
-    for inv in investments:
-        value = inv.shares * inv.current_price
+    for value, asset_class in zip(values.tolist(), asset_classes):
         total_value += value
-
-        if inv.symbol.startswith('BOND'):
-            allocation['Bonds'] = allocation.get('Bonds', 0) + value
-        elif inv.symbol in ['SPY', 'VTI', 'QQQ']:
-            allocation['Stocks'] = allocation.get('Stocks', 0) + value
-        else:
-            allocation['Other'] = allocation.get('Other', 0) + value
+        allocation[asset_class] = allocation.get(asset_class, 0) + value
 
     # Convert to percentages
     if total_value > 0:
@@ -154,6 +651,22 @@ def get_asset_allocation(db: Session = Depends(get_db)):
 
     return allocation
 
+@app.get("/api/portfolio/rebalance")
+def get_rebalance_plan(
+    targets: str = Query("Stocks=60,Bonds=30,Other=10", description="Target weight per asset class"),
+    tolerance: float = Query(DEFAULT_TOLERANCE, ge=0, le=1, description="Band around each target weight"),
+    cash: float = Query(0.0, description="Cash to invest (negative to raise cash)"),
+    tax_aware: bool = False,
+    to_target: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Smallest trades that bring every asset class within ``tolerance`` of its
+    target (all the way to the target with ``to_target``) while investing
+    ``cash``; with ``tax_aware``, sells come from the lowest-gain lots first
+    """
+    return rebalance_plan(db, parse_targets(targets), tolerance, cash, tax_aware, to_target)
+
 @app.get("/api/monte-carlo")
 def get_monte_carlo(db: Session = Depends(get_db)):
     analyzer = FinancialAnalyzer(db)
@@ -183,214 +696,386 @@ def get_monte_carlo(db: Session = Depends(get_db)):
 @app.get("/api/budget")
 def get_budget(db: Session = Depends(get_db)):
     current_month = datetime.now().strftime("%Y-%m")
+    # spent is maintained on ingest, so this stays one row per category
     budgets = db.query(Budget).filter(Budget.month == current_month).all()
 
     return [{
         "category": b.category,
         "limit": b.monthly_limit,
-        "spent": b.spent,
-        "remaining": b.monthly_limit - b.spent
+        "spent": round(b.spent, 2),
+        "remaining": round(b.monthly_limit - b.spent, 2)
     } for b in budgets]
 
+@app.post("/api/budget/reconcile")
+def reconcile_budget_spending(db: Session = Depends(get_db)):
+    """Recompute spent for every budget month from raw transactions"""
+    updated_count = reconcile_budgets(db)
+    db.commit()
+    return {"message": f"Reconciled budgets, {updated_count} updated", "updated_count": updated_count}
+
+@app.get("/api/categorization/rules")
+def get_category_rules(db: Session = Depends(get_db)):
+    """Category rules in the order they are applied"""
+    rules = db.query(CategoryRule).order_by(CategoryRule.priority, CategoryRule.id).all()
+    return [rule_to_dict(rule) for rule in rules]
+
+@app.post("/api/categorization/rules")
+def create_category_rule(
+    category: str,
+    pattern: Optional[str] = None,
+    match_type: str = "keyword",
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    priority: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Add a rule assigning ``category`` to transactions whose description
+    contains ``pattern`` (keyword) or matches it (regex), optionally limited
+    to an amount range. Lower priorities win.
+    """
+    validate_rule(category, match_type, pattern, min_amount, max_amount)
+    rule = CategoryRule(
+        category=category.strip(),
+        match_type=match_type,
+        pattern=pattern.strip() if pattern else None,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        priority=priority
+    )
+    db.add(rule)
+    db.commit()
+    return rule_to_dict(rule)
+
+@app.delete("/api/categorization/rules/{rule_id}")
+def delete_category_rule(rule_id: int, db: Session = Depends(get_db)):
+    rule = db.query(CategoryRule).filter(CategoryRule.id == rule_id).first()
+    if rule is None:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    db.delete(rule)
+    db.commit()
+    return {"message": f"Deleted rule {rule_id}"}
+
+@app.post("/api/categorization/apply")
+def apply_category_rules(overwrite: bool = False, db: Session = Depends(get_db)):
+    """
+    Re-run the rules over stored transactions (only uncategorized ones unless
+    ``overwrite``) and rebuild rollups and budget spending
+    """
+    updated_count = recategorize_history(db, overwrite=overwrite)
+    if updated_count:
+        # Categories changed in place; the columnar cache reloads on next use
+        after_commit(db, transaction_store_for(tenant_of(db)).invalidate)
+        bump_version_after_commit(db)
+    db.commit()
+    return {"message": f"Recategorized {updated_count} transactions", "updated_count": updated_count}
+
+def _check_columns(df: pd.DataFrame, schema):
+    missing = missing_columns(df, schema)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File must contain columns: {', '.join(field.name for field in schema if field.required)}"
+        )
+
+def _ingest_transaction_frame(db: Session, df: pd.DataFrame, occurrences: Optional[Dict[str, int]] = None):
+    """
+    Validate, resolve accounts and ingest one batch of transaction rows;
+    batches of one upload share ``occurrences``
+    """
+    # Coerce and check whole columns at once
+    clean, errors = validate_frame(df, TRANSACTION_SCHEMA)
+
+    # Resolve every account name with one lookup, creating missing accounts
+    currencies = currency_codes(clean['currency']) if 'currency' in df else None
+    frame = pd.DataFrame({
+        'account_id': resolve_account_ids(db, clean['account_name'], currencies=currencies),
+        'amount': clean['amount'],
+        'description': clean['description'],
+        'category': clean['category'],
+        'date': clean['date'],
+        'currency': currencies
+    })
+
+    # Amounts are in the account's currency; reject rows that say otherwise
+    if currencies is not None:
+        account_currency = frame['account_id'].map(account_currencies(db, frame['account_id']))
+        mismatch = currencies.notna() & (normalize_currencies(currencies) != normalize_currencies(account_currency))
+        errors += [
+            f"Row {index + 1}: currency {currencies[index]} does not match the account currency "
+            f"{normalize_currencies([account_currency[index]])[0]}"
+            for index in frame.index[mismatch][:10]
+        ]
+        frame = frame[~mismatch]
+
+    # Bulk insert and update the derived tables in the same transaction;
+    # rows already stored (same fingerprint) are skipped
+    added_count = ingest_transactions(db, frame, occurrences)
+    db.commit()
+    return added_count, len(frame) - added_count, errors
+
+def _export_response(stmt, columns: List[str], fmt: str, name: str, tenant: str, arrow_schema=None):
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return StreamingResponse(
+        export_chunks(stmt, columns, fmt, tenant, arrow_schema),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/export/transactions")
+def export_transactions(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    filters: TransactionFilters = Depends(),
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """Stream every matching transaction (archived years included) as CSV or Parquet"""
+    check_export_format(format)
+    source = transactions_source(db, filters.start_date)
+    stmt = select(
+        source.id,
+        source.date,
+        source.amount,
+        source.description,
+        source.category,
+        Account.name.label("account")
+    ).outerjoin(Account, source.account_id == Account.id)
+    stmt = filters.apply(stmt, source).order_by(source.id)
+
+    columns = ["id", "date", "amount", "description", "category", "account"]
+    schema = transactions_arrow_schema() if format == "parquet" else None
+    return _export_response(stmt, columns, format, "transactions", tenant, schema)
+
+@app.get("/api/export/holdings")
+def export_holdings(
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    symbol: Optional[str] = None,
+    tenant: str = Depends(get_tenant)
+):
+    """Stream investment holdings with their market value as CSV or Parquet"""
+    check_export_format(format)
+    stmt = select(
+        Investment.id,
+        Investment.symbol,
+        Investment.shares,
+        Investment.purchase_price,
+        Investment.current_price,
+        Investment.purchase_date,
+        (Investment.shares * Investment.current_price).label("market_value")
+    )
+    if symbol is not None:
+        stmt = stmt.where(Investment.symbol == symbol)
+    stmt = stmt.order_by(Investment.id)
+
+    columns = ["id", "symbol", "shares", "purchase_price", "current_price", "purchase_date", "market_value"]
+    schema = holdings_arrow_schema() if format == "parquet" else None
+    return _export_response(stmt, columns, format, "holdings", tenant, schema)
+
 @app.post("/api/upload/transactions")
 async def upload_transactions_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
-    Upload transactions from CSV file
-    Expected columns: date, amount, description, category, account_name
+    Upload transactions from a CSV, Parquet, Arrow or NDJSON file
+    Expected columns: date, amount, description, account_name and optionally category
+    (rows without one are categorized by the category rules)
     """
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+    fmt = upload_format(file.filename)
 
     try:
-        # Read CSV file
         contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
 
-        # Validate required columns
-        required_columns = ['date', 'amount', 'description', 'category', 'account_name']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain columns: {', '.join(required_columns)}"
-            )
+        # An identical file has already been processed: nothing to parse
+        sha256 = file_sha256(contents)
+        previous = find_uploaded_file(db, "transactions", sha256)
+        if previous is not None:
+            return {
+                "message": f"File already uploaded on {previous.uploaded_at:%Y-%m-%d %H:%M}, no transactions added",
+                "added_count": 0,
+                "duplicate_count": previous.row_count,
+                "errors": []
+            }
 
-        # Process each row
-        added_count = 0
-        errors = []
+        df = read_table(contents, fmt)
 
-        for index, row in df.iterrows():
-            try:
-                # Find or create account
-                account = db.query(Account).filter(Account.name == row['account_name']).first()
-                if not account:
-                    # Create new account if it doesn't exist
-                    account = Account(
-                        name=row['account_name'],
-                        account_type='checking',  # Default type
-                        balance=0.0
-                    )
-                    db.add(account)
-                    db.commit()
-                    db.refresh(account)
-
-                # Parse date
-                transaction_date = pd.to_datetime(row['date']).to_pydatetime()
-
-                # Create transaction
-                transaction = Transaction(
-                    account_id=account.id,
-                    amount=float(row['amount']),
-                    description=row['description'],
-                    category=row['category'],
-                    date=transaction_date
-                )
-                db.add(transaction)
-                added_count += 1
-
-            except Exception as e:
-                errors.append(f"Row {index + 1}: {str(e)}")
+        # Validate required columns, then coerce and check whole columns at once
+        _check_columns(df, TRANSACTION_SCHEMA)
+        added_count, duplicate_count, errors = _ingest_transaction_frame(db, df)
 
-        db.commit()
+        # A file with rejected rows may be fixed and uploaded again
+        if not errors:
+            record_uploaded_file(db, "transactions", sha256, file.filename, added_count + duplicate_count, added_count)
+            db.commit()
 
         return {
             "message": f"Successfully uploaded {added_count} transactions",
             "added_count": added_count,
-            "errors": errors[:10] if errors else []  # Limit to first 10 errors
+            "duplicate_count": duplicate_count,
+            "errors": errors
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+
+@app.post("/api/transactions/bulk")
+async def bulk_insert_transactions(request: Request, db: Session = Depends(get_db)):
+    """
+    Stream transactions as NDJSON, one object per line with the upload columns.
+    Rows are validated and inserted in batches of BULK_BATCH_SIZE as lines
+    arrive, so the request body is never held in memory as a whole; each
+    batch is committed on its own. Columns are checked once, on the first
+    batch; rows of later batches that lack a field are reported as errors.
+    """
+    added_count = 0
+    duplicate_count = 0
+    batch_count = 0
+    errors = []
+    batch = []  # (line number, raw line)
+    # Repeats of a row in later batches are numbered after the earlier ones
+    occurrences = {}
+    columns = []  # checked on the first batch, before anything is committed
+
+    async def flush():
+        nonlocal added_count, duplicate_count, batch_count
+        records, index = [], []
+        for line_number, line in batch:
+            try:
+                records.append(json.loads(line))
+                index.append(line_number - 1)
+            except ValueError as e:
+                errors.append(f"Row {line_number}: invalid JSON ({str(e)})")
+        batch.clear()
+        if not records:
+            return
+
+        df = pd.DataFrame.from_records(records, index=index)
+        if not columns:
+            _check_columns(df, TRANSACTION_SCHEMA)
+            columns.extend(df.columns)
+        else:
+            # Fields missing from a later batch are reported per row instead
+            df = df.reindex(columns=columns + [name for name in df.columns if name not in columns])
+        added, duplicates, batch_errors = await run_in_threadpool(_ingest_transaction_frame, db, df, occurrences)
+        added_count += added
+        duplicate_count += duplicates
+        batch_count += 1
+        errors.extend(batch_errors)
+
+    line_number = 0
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            line_number += 1
+            if line.strip():
+                batch.append((line_number, line))
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+    if pending.strip():
+        batch.append((line_number + 1, pending))
+    if batch:
+        await flush()
+
+    return {
+        "message": f"Successfully inserted {added_count} transactions",
+        "added_count": added_count,
+        "duplicate_count": duplicate_count,
+        "batches": batch_count,
+        "errors": errors[:10]
+    }
 
 @app.post("/api/upload/investments")
 async def upload_investments_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
-    Upload investments from CSV file
+    Upload investment purchases from a CSV, Parquet, Arrow or NDJSON file
     Expected columns: symbol, shares, purchase_price, current_price, purchase_date
+    Each row is a tax lot; the position per symbol is rebuilt from its lots
     """
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+    fmt = upload_format(file.filename)
 
     try:
-        # Read CSV file
         contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-
-        # Validate required columns
-        required_columns = ['symbol', 'shares', 'purchase_price', 'current_price', 'purchase_date']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain columns: {', '.join(required_columns)}"
-            )
-
-        # Process each row
-        added_count = 0
-        updated_count = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # Parse date
-                purchase_date = pd.to_datetime(row['purchase_date']).to_pydatetime()
-
-                # Check if investment already exists
-                existing = db.query(Investment).filter(Investment.symbol == row['symbol']).first()
-
-                if existing:
-                    # Update existing investment
-                    existing.shares = float(row['shares'])
-                    existing.purchase_price = float(row['purchase_price'])
-                    existing.current_price = float(row['current_price'])
-                    existing.purchase_date = purchase_date
-                    updated_count += 1
-                else:
-                    # Create new investment
-                    investment = Investment(
-                        symbol=row['symbol'],
-                        shares=float(row['shares']),
-                        purchase_price=float(row['purchase_price']),
-                        current_price=float(row['current_price']),
-                        purchase_date=purchase_date
-                    )
-                    db.add(investment)
-                    added_count += 1
-
-            except Exception as e:
-                errors.append(f"Row {index + 1}: {str(e)}")
 
+        # Lots are appended, so an identical file must not be applied twice
+        sha256 = file_sha256(contents)
+        previous = find_uploaded_file(db, "investments", sha256)
+        if previous is not None:
+            return {
+                "message": f"File already uploaded on {previous.uploaded_at:%Y-%m-%d %H:%M}, no lots added",
+                "added_count": 0,
+                "updated_count": 0,
+                "errors": []
+            }
+
+        df = read_table(contents, fmt)
+
+        _check_columns(df, INVESTMENT_SCHEMA)
+        clean, errors = validate_frame(df, INVESTMENT_SCHEMA)
+        not_positive = clean['shares'] <= 0
+        errors += [f"Row {index + 1}: 'shares' must be positive" for index in clean.index[not_positive][:10]]
+        clean = clean[~not_positive]
+
+        symbols = clean['symbol'].unique().tolist()
+        existing = db.query(Investment.symbol).filter(Investment.symbol.in_(symbols)).count()
+        added_count = add_lots(db, clean)
+        current_prices = dict(zip(clean['symbol'], clean['current_price']))
+        currencies = dict(zip(clean['symbol'], currency_codes(clean['currency']))) if 'currency' in df else None
+        sync_positions(db, symbols, current_prices, currencies)
+        record_uploaded_file(db, "investments", sha256, file.filename, len(df), added_count)
+        bump_version_after_commit(db)
         db.commit()
 
         return {
-            "message": f"Successfully processed {added_count + updated_count} investments",
+            "message": f"Successfully added {added_count} tax lots",
             "added_count": added_count,
-            "updated_count": updated_count,
-            "errors": errors[:10] if errors else []
+            "updated_count": existing,
+            "errors": errors
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 @app.post("/api/upload/accounts")
 async def upload_accounts_csv(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
-    Upload accounts from CSV file
+    Upload accounts from a CSV, Parquet, Arrow or NDJSON file
     Expected columns: name, account_type, balance
     """
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(status_code=400, detail="File must be a CSV")
+    fmt = upload_format(file.filename)
 
     try:
-        # Read CSV file
         contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-
-        # Validate required columns
-        required_columns = ['name', 'account_type', 'balance']
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain columns: {', '.join(required_columns)}"
-            )
-
-        # Process each row
-        added_count = 0
-        updated_count = 0
-        errors = []
-
-        for index, row in df.iterrows():
-            try:
-                # Check if account already exists
-                existing = db.query(Account).filter(Account.name == row['name']).first()
-
-                if existing:
-                    # Update existing account
-                    existing.account_type = row['account_type']
-                    existing.balance = float(row['balance'])
-                    updated_count += 1
-                else:
-                    # Create new account
-                    account = Account(
-                        name=row['name'],
-                        account_type=row['account_type'],
-                        balance=float(row['balance'])
-                    )
-                    db.add(account)
-                    added_count += 1
-
-            except Exception as e:
-                errors.append(f"Row {index + 1}: {str(e)}")
+        df = read_table(contents, fmt)
 
+        _check_columns(df, ACCOUNT_SCHEMA)
+        clean, errors = validate_frame(df, ACCOUNT_SCHEMA)
+        if 'currency' in df:
+            clean['currency'] = currency_codes(clean['currency'])
+        else:
+            # Keep the currency of existing accounts
+            clean = clean.drop(columns='currency', errors='ignore')
+
+        # Insert new accounts and update existing ones in bulk
+        added_count, updated_count = upsert_by_key(db, Account, 'name', clean)
+        # Uploaded balances are current ones; re-anchor the running balances on them
+        uploaded = db.query(Account.id).filter(Account.name.in_(clean['name'].tolist())).all()
+        reset_opening_balances(db, [account.id for account in uploaded])
         db.commit()
 
         return {
             "message": f"Successfully processed {added_count + updated_count} accounts",
             "added_count": added_count,
             "updated_count": updated_count,
-            "errors": errors[:10] if errors else []
+            "errors": errors
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing CSV: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
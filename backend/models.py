@@ -1,22 +1,69 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, create_engine
+import os
+from sqlalchemy import (
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, UniqueConstraint,
+    create_engine, event, func, inspect, literal_column, text
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import Session, sessionmaker, relationship, with_loader_criteria
 from datetime import datetime
 
 Base = declarative_base()
 
-class Account(Base):
+# Tenant of rows written without one (CLIs, single-user deployments)
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+
+def _tenant_default(context):
+    # Sessions from tenancy.tenant_session carry their tenant as an execution option
+    return context.execution_options.get("tenant_id", DEFAULT_TENANT)
+
+class TenantMixin:
+    """Rows owned by one tenant; a session only reads and writes its own tenant's rows"""
+    tenant_id = Column(String(64), nullable=False, default=_tenant_default, server_default=DEFAULT_TENANT)
+
+def tenant_of(db: Session) -> str:
+    return db.info.get("tenant_id", DEFAULT_TENANT)
+
+@event.listens_for(Session, "do_orm_execute")
+def _filter_by_tenant(state):
+    """Add ``tenant_id = <session tenant>`` to every ORM SELECT, UPDATE and DELETE"""
+    if state.is_column_load or state.is_relationship_load:
+        return
+    if not (state.is_select or state.is_update or state.is_delete):
+        return
+    tenant = tenant_of(state.session)
+    state.statement = state.statement.options(
+        with_loader_criteria(TenantMixin, lambda cls: cls.tenant_id == tenant, include_aliases=True)
+    )
+
+class Account(TenantMixin, Base):
     __tablename__ = "accounts"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
+    name = Column(String)
     account_type = Column(String)  # checking, savings, investment, credit
-    balance = Column(Float, default=0.0)
+    balance = Column(Float, default=0.0)  # current balance, kept in step with ingested transactions
+    # Balance before the first transaction; balance = opening_balance + sum(amounts)
+    opening_balance = Column(Float)
+    currency = Column(String(3))  # ISO code; NULL means the base currency
     created_at = Column(DateTime, default=datetime.utcnow)
 
     transactions = relationship("Transaction", back_populates="account")
 
-class Transaction(Base):
+    __table_args__ = (
+        Index("ix_accounts_tenant_name", "tenant_id", "name"),
+    )
+
+def text_sort_key(column):
+    """
+    Sort key for a nullable text column: NULL sorts as '' so a (key, id) keyset
+    seek never compares with NULL. The literal keeps it identical to the
+    indexed expression.
+    """
+    return func.coalesce(column, literal_column("''"))
+
+class Transaction(TenantMixin, Base):
     __tablename__ = "transactions"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -25,37 +72,288 @@ class Transaction(Base):
     description = Column(String)
     category = Column(String)
     date = Column(DateTime, default=datetime.utcnow)
+    # Content hash of (account, date, amount, description) used to skip re-uploads
+    fingerprint = Column(String(40))
+    currency = Column(String(3))  # always the account's currency
 
     account = relationship("Account", back_populates="transactions")
 
-class Investment(Base):
+    # Composite indexes backing keyset pagination on (column, id) within a tenant
+    __table_args__ = (
+        Index("ux_transactions_fingerprint", "fingerprint", unique=True),
+        Index("ix_transactions_tenant_date_id", "tenant_id", "date", "id"),
+        Index("ix_transactions_tenant_amount_id", "tenant_id", "amount", "id"),
+        Index("ix_transactions_tenant_account_date_id", "tenant_id", "account_id", "date", "id"),
+        Index("ix_transactions_tenant_category_date_id", "tenant_id", "category", "date", "id"),
+        Index("ix_transactions_tenant_category_key_id", "tenant_id", text_sort_key(category), "id"),
+        Index("ix_transactions_tenant_description_key_id", "tenant_id", text_sort_key(description), "id"),
+    )
+
+class Investment(TenantMixin, Base):
     __tablename__ = "investments"
 
     id = Column(Integer, primary_key=True, index=True)
-    symbol = Column(String, index=True)
+    symbol = Column(String)
     shares = Column(Float)
     purchase_price = Column(Float)
     current_price = Column(Float)
     purchase_date = Column(DateTime, default=datetime.utcnow)
+    currency = Column(String(3))  # of the prices; NULL means the base currency
+
+    __table_args__ = (
+        Index("ix_investments_tenant_symbol", "tenant_id", "symbol"),
+    )
 
-class Budget(Base):
+class TaxLot(TenantMixin, Base):
+    """One purchase of a symbol; open quantities come from matching sales against lots"""
+    __tablename__ = "tax_lots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String)
+    shares = Column(Float)  # quantity bought
+    price = Column(Float)  # cost per share
+    acquired = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_tax_lots_tenant_symbol_acquired_id", "tenant_id", "symbol", "acquired", "id"),
+    )
+
+class LotSale(TenantMixin, Base):
+    """
+    A sale of a symbol. FIFO/LIFO sales are matched to lots when gains are
+    computed; specific-ID sales name their lot (one row per lot sold from).
+    """
+    __tablename__ = "lot_sales"
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String)
+    shares = Column(Float)
+    price = Column(Float)  # proceeds per share
+    sold = Column(DateTime)
+    method = Column(String, default="fifo")  # fifo, lifo, specific
+    lot_id = Column(Integer, ForeignKey("tax_lots.id"))  # specific-ID sales only
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_lot_sales_tenant_symbol_sold_id", "tenant_id", "symbol", "sold", "id"),
+    )
+
+class Budget(TenantMixin, Base):
     __tablename__ = "budgets"
 
     id = Column(Integer, primary_key=True, index=True)
-    category = Column(String, index=True)
+    category = Column(String)
     monthly_limit = Column(Float)
-    spent = Column(Float, default=0.0)
+    spent = Column(Float, default=0.0)  # maintained from transactions on ingest
+    month = Column(String)  # YYYY-MM format
+
+    __table_args__ = (
+        Index("ix_budgets_tenant_category_month", "tenant_id", "category", "month"),
+    )
+
+class MonthlyRollup(TenantMixin, Base):
+    """Pre-aggregated transaction totals per account, category and month"""
+    __tablename__ = "monthly_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"))
+    category = Column(String)
     month = Column(String)  # YYYY-MM format
+    income = Column(Float, default=0.0)
+    expenses = Column(Float, default=0.0)  # stored as a positive amount
+    income_count = Column(Integer, default=0)
+    expense_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "category", "month", name="uq_monthly_rollups_key"),
+        Index("ix_monthly_rollups_tenant_month", "tenant_id", "month"),
+    )
+
+class UploadedFile(TenantMixin, Base):
+    """Whole-file hashes of processed uploads, so identical files are skipped before parsing"""
+    __tablename__ = "uploaded_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # transactions, investments, accounts
+    sha256 = Column(String(64))
+    filename = Column(String)
+    row_count = Column(Integer, default=0)
+    added_count = Column(Integer, default=0)
+    uploaded_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "kind", "sha256", name="uq_uploaded_files_tenant_kind_sha256"),
+    )
 
-DATABASE_URL = "sqlite:///./financial_dashboard.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+class CategoryRule(TenantMixin, Base):
+    """User-defined rule assigning a category to matching transactions"""
+    __tablename__ = "category_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String)
+    match_type = Column(String, default="keyword")  # keyword, regex
+    pattern = Column(String)  # empty matches every description
+    min_amount = Column(Float)
+    max_amount = Column(Float)
+    priority = Column(Integer, default=100)  # lower values win
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_category_rules_tenant_priority_id", "tenant_id", "priority", "id"),
+    )
+
+class Price(Base):
+    """Closing price per symbol and day (market data, shared by all tenants)"""
+    __tablename__ = "prices"
+
+    id = Column(Integer, primary_key=True, index=True)
+    symbol = Column(String)
+    date = Column(Date)
+    close = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint("symbol", "date", name="uq_prices_symbol_date"),
+    )
+
+class FxRate(Base):
+    """Units of the base currency per unit of ``currency`` on a day (shared by all tenants)"""
+    __tablename__ = "fx_rates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3))
+    date = Column(Date)
+    rate = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint("currency", "date", name="uq_fx_rates_currency_date"),
+    )
+
+class AccountSnapshot(TenantMixin, Base):
+    """End-of-day balance per account"""
+    __tablename__ = "account_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"))
+    date = Column(Date)
+    balance = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "date", name="uq_account_snapshots_account_date"),
+        Index("ix_account_snapshots_tenant_date", "tenant_id", "date"),
+    )
+
+class BalanceCheckpoint(TenantMixin, Base):
+    """Running balance of an account at the end of a day, maintained on ingest"""
+    __tablename__ = "balance_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"))
+    date = Column(Date)
+    balance = Column(Float)
+    transaction_count = Column(Integer, default=0)  # transactions dated on or before ``date``
+
+    __table_args__ = (
+        UniqueConstraint("account_id", "date", name="uq_balance_checkpoints_account_date"),
+        Index("ix_balance_checkpoints_tenant_date", "tenant_id", "date"),
+    )
+
+class NetWorthSnapshot(TenantMixin, Base):
+    """End-of-day totals behind the net worth figure"""
+    __tablename__ = "net_worth_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date)
+    cash = Column(Float)  # balances of non-credit accounts
+    liabilities = Column(Float)  # balances of credit accounts
+    holdings_value = Column(Float)
+    net_worth = Column(Float)
+
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "date", name="uq_net_worth_snapshots_tenant_date"),
+    )
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./financial_dashboard.db")
+# Connections kept open, and opened beyond that under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds to wait for a free connection, and after which connections are replaced
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test connections before use so ones dropped by the server are replaced transparently
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# PostgreSQL: statement_timeout; SQLite: how long a statement waits for a locked database (0 = default)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+def make_engine(url: str):
+    """Engine for ``url`` with the pool and timeout settings above"""
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    connect_args = {}
+    if url.startswith("sqlite"):
+        # Sessions move between the request threadpool's threads
+        connect_args["check_same_thread"] = False
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["timeout"] = DB_STATEMENT_TIMEOUT_MS / 1000
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            # One shared connection per in-memory database; pool sizes do not apply
+            options = {}
+    elif url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(url, connect_args=connect_args, **options)
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def create_tables(bind=None):
+    bind = bind if bind is not None else engine
+    if bind.dialect.name == "sqlite" and not inspect(bind).get_table_names():
+        with bind.begin() as conn:
+            # Only possible before the first table exists: lets archive.compact_database
+            # free pages with an incremental vacuum, which does not lock out readers for long
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(bind=conn)
+    Base.metadata.create_all(bind=bind)
+    _add_missing_columns(bind)
+    # create_all skips indexes on tables that already exist; reflection does
+    # not see expression indexes, so let the database do the existence check
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+def _add_missing_columns(bind):
+    """
+    Add columns introduced after a table was first created: nullable ones, or
+    NOT NULL ones with a server default that existing rows take
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    if column.server_default is not None:
+                        column_type += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+def upsert_insert(bind):
+    """Return the dialect-specific insert() that supports ON CONFLICT clauses"""
+    if bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
 
 def get_db():
-    db = SessionLocal()
+    """Session for DEFAULT_TENANT; API requests use tenancy.get_db, which honours X-Tenant-ID"""
+    from tenancy import tenant_session
+
+    db = tenant_session(DEFAULT_TENANT)
     try:
         yield db
     finally:
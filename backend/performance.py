@@ -0,0 +1,228 @@
+"""
+Portfolio performance: time-weighted return, money-weighted IRR, volatility,
+Sharpe ratio and maximum drawdown, for the portfolio and every holding.
+
+A holding is a symbol. Its share count on each day is rebuilt from its tax
+lots and sales, and all holdings are valued at once on the (holdings x days)
+price matrix from ``prices.price_matrix``, where trade prices stand in for
+missing closes. Purchases are paid in at cost (shares held before the range
+at the first day's market value) and sales pay their proceeds out; those are
+the only external cash flows. Prices are converted to BASE_CURRENCY at each
+day's FX rate, so the portfolio figures add up holdings in different
+currencies.
+
+* Time-weighted return chains daily returns with the day's flows taken out:
+  ``r_t = (V_t + outflow_t) / (V_{t-1} + inflow_t) - 1``.
+* IRR solves ``sum(flow_k * (1 + r) ** -years_k) = 0`` with Newton steps
+  vectorized over every holding and the portfolio together.
+* Volatility and the Sharpe ratio annualize daily (calendar-day) returns;
+  drawdowns are measured on the time-weighted growth index, so deposits do
+  not read as gains.
+"""
+import os
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from models import Investment
+from prices import price_matrix, price_points
+from fx import rate_table
+from lots import load_lots, load_sales
+
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.02"))
+# The price matrix has a column per calendar day
+DAYS_PER_YEAR = 365.0
+
+IRR_ITERATIONS = 100
+IRR_TOLERANCE = 1e-9
+
+
+def irr(flows: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """
+    Annual internal rate of return per row of ``flows`` (series, points),
+    with ``years`` (points,) the time of each point. Rows whose flows do not
+    change sign, or where Newton's method does not converge, are NaN.
+    """
+    rate = np.full(len(flows), 0.1)
+    converged = np.zeros(len(flows), dtype=bool)
+    for _ in range(IRR_ITERATIONS):
+        discount = (1.0 + rate[:, None]) ** -years[None, :]
+        npv = (flows * discount).sum(axis=1)
+        slope = (-years[None, :] * flows * discount / (1.0 + rate[:, None])).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(slope != 0, npv / slope, 0.0)
+        # Keep 1 + rate positive so the discount factors stay defined
+        rate = np.clip(rate - step, -0.9999, 1e6)
+        converged = np.abs(step) < IRR_TOLERANCE
+        if converged.all():
+            break
+    discount = (1.0 + rate[:, None]) ** -years[None, :]
+    solved = np.abs((flows * discount).sum(axis=1)) <= 1e-6 * np.abs(flows).sum(axis=1)
+    has_sign_change = (flows.min(axis=1) < 0) & (flows.max(axis=1) > 0)
+    # Flows on a single day have no rate of return
+    spans_time = (flows != 0).sum(axis=1) > 1
+    return np.where(converged & solved & has_sign_change & spans_time, rate, np.nan)
+
+
+def max_drawdown(growth: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough fall per row of a growth index (as a negative fraction)"""
+    peaks = np.fmax.accumulate(growth, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = growth / peaks - 1.0
+    drawdowns = np.where(np.isfinite(drawdowns), drawdowns, 0.0)
+    return drawdowns.min(axis=1) if growth.shape[1] else np.zeros(len(growth))
+
+
+def return_statistics(returns: np.ndarray, risk_free_rate: float) -> Dict[str, np.ndarray]:
+    """
+    Per-row figures for daily returns shaped (series, days - 1); NaN marks
+    days a series was not held.
+    """
+    held = np.isfinite(returns)
+    filled = np.where(held, returns, 0.0)
+    growth = np.cumprod(1.0 + filled, axis=1)
+    total = growth[:, -1] - 1.0 if returns.shape[1] else np.zeros(len(returns))
+    held_days = held.sum(axis=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annualized = np.where(held_days > 0, (1.0 + total) ** (DAYS_PER_YEAR / held_days) - 1.0, np.nan)
+        mean = filled.sum(axis=1) / held_days
+        deviations = np.where(held, returns - mean[:, None], 0.0)
+        spread = np.sqrt((deviations ** 2).sum(axis=1) / (held_days - 1))
+        spread = np.where(held_days > 1, spread, np.nan)
+        daily_risk_free = (1.0 + risk_free_rate) ** (1.0 / DAYS_PER_YEAR) - 1.0
+        sharpe = np.where(spread > 0, (mean - daily_risk_free) / spread * np.sqrt(DAYS_PER_YEAR), np.nan)
+
+    return {
+        "time_weighted_return": total,
+        "annualized_return": annualized,
+        "volatility": spread * np.sqrt(DAYS_PER_YEAR),
+        "sharpe_ratio": sharpe,
+        "max_drawdown": max_drawdown(growth),
+    }
+
+
+def _value(x) -> Optional[float]:
+    return round(float(x), 6) if np.isfinite(x) else None
+
+
+def _trade_days(times: pd.Series, first_day: np.datetime64) -> np.ndarray:
+    return (pd.to_datetime(times).to_numpy(dtype="datetime64[D]") - first_day).astype(np.int64)
+
+
+def _flow_returns(values: np.ndarray, inflows: np.ndarray, outflows: np.ndarray) -> np.ndarray:
+    """Daily returns per row net of the day's flows; NaN where nothing was invested"""
+    before = values[:, :-1] + inflows[:, 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(before > 0, (values[:, 1:] + outflows[:, 1:]) / before - 1.0, np.nan)
+
+
+def portfolio_performance(db: Session, start: Optional[date] = None,
+                          risk_free_rate: float = RISK_FREE_RATE) -> Dict:
+    end = date.today()
+    investments = {inv.symbol: inv for inv in db.query(Investment).order_by(Investment.id)}
+    lots = load_lots(db)
+    # Positions stored before tax lots existed count as a single lot
+    with_lots = set(lots["symbol"])
+    legacy = pd.DataFrame([
+        (None, symbol, inv.shares, inv.purchase_price if inv.purchase_price is not None else inv.current_price,
+         inv.purchase_date or pd.Timestamp(end))
+        for symbol, inv in investments.items() if inv.shares and symbol not in with_lots
+    ], columns=lots.columns)
+    if not legacy.empty:
+        lots = pd.concat([lots, legacy], ignore_index=True) if not lots.empty else legacy
+    lots = lots.dropna(subset=["shares", "price"])
+    sales = load_sales(db)
+    if start is None:
+        start = pd.Timestamp(lots["acquired"].min()).date() if len(lots) else end
+    if lots.empty or start > end:
+        return {"start_date": start.isoformat(), "end_date": end.isoformat(), "risk_free_rate": risk_free_rate,
+                "portfolio": None, "holdings": []}
+
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    symbols = sorted(set(lots["symbol"]))
+    holdings = [investments.get(symbol) for symbol in symbols]
+    anchors = pd.concat([
+        lots[["symbol", "acquired", "price"]].set_axis(["symbol", "date", "close"], axis=1),
+        sales[["symbol", "sold", "price"]].set_axis(["symbol", "date", "close"], axis=1),
+    ], ignore_index=True)
+    prices = price_matrix(
+        price_points(db, [inv for inv in holdings if inv is not None], anchors), symbols, days
+    )
+    exchange = rate_table(db).matrix([inv.currency if inv is not None else None for inv in holdings], days)
+    prices = np.nan_to_num(prices * exchange)
+
+    # Trades as (holding, day, shares, cash in base currency); trades before
+    # the range only set the shares held on its first day
+    trades = pd.concat([
+        pd.DataFrame({"symbol": lots["symbol"], "day": _trade_days(lots["acquired"], days[0]),
+                      "shares": lots["shares"], "price": lots["price"]}),
+        pd.DataFrame({"symbol": sales["symbol"], "day": _trade_days(sales["sold"], days[0]),
+                      "shares": -sales["shares"], "price": sales["price"]}),
+    ], ignore_index=True)
+    trades = trades[trades["symbol"].isin(symbols) & (trades["day"] < len(days))]
+    row = np.searchsorted(symbols, trades["symbol"].to_numpy(dtype=str))
+    day = np.clip(trades["day"].to_numpy(), 0, None)
+    traded = trades["shares"].to_numpy(dtype=np.float64)
+    in_range = trades["day"].to_numpy() >= 0
+
+    changes = np.zeros((len(symbols), len(days)))
+    np.add.at(changes, (row, day), traded)
+    shares = np.cumsum(changes, axis=1)
+    values = shares * prices
+
+    cash = traded * trades["price"].to_numpy(dtype=np.float64) * exchange[row, day]
+    inflows = np.zeros_like(values)
+    outflows = np.zeros_like(values)
+    bought = in_range & (traded > 0)
+    sold = in_range & (traded < 0)
+    np.add.at(inflows, (row[bought], day[bought]), cash[bought])
+    np.add.at(outflows, (row[sold], day[sold]), -cash[sold])
+    # Shares held before the range enter at the first day's market value
+    held_before = np.zeros(len(symbols))
+    np.add.at(held_before, row[~in_range], traded[~in_range])
+    inflows[:, 0] += held_before * prices[:, 0]
+
+    portfolio_value = values.sum(axis=0)
+    invested, proceeds = inflows.sum(axis=0), outflows.sum(axis=0)
+    returns = _flow_returns(np.vstack([portfolio_value, values]), np.vstack([invested, inflows]),
+                            np.vstack([proceeds, outflows]))
+    stats = return_statistics(returns, risk_free_rate)
+
+    # Cash flows: purchases paid in, sales paid out, and everything still
+    # held paid out on the last day
+    flows = np.vstack([proceeds - invested, outflows - inflows])
+    flows[:, -1] += np.concatenate([[portfolio_value[-1]], values[:, -1]])
+    years = np.arange(len(days)) / DAYS_PER_YEAR
+    rates = irr(flows, years)
+
+    def figures(index: int) -> Dict:
+        return {"irr": _value(rates[index]), **{name: _value(column[index]) for name, column in stats.items()}}
+
+    active = inflows.sum(axis=1) > 0
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "risk_free_rate": risk_free_rate,
+        "portfolio": {
+            "value": round(float(portfolio_value[-1]), 2),
+            "invested": round(float(invested.sum()), 2),
+            "proceeds": round(float(proceeds.sum()), 2),
+            **figures(0),
+        },
+        "holdings": [
+            {
+                "id": inv.id if inv is not None else None,
+                "symbol": symbol,
+                "shares": round(float(shares[i, -1]), 6),
+                "value": round(float(values[i, -1]), 2),
+                "invested": round(float(inflows[i].sum()), 2),
+                "proceeds": round(float(outflows[i].sum()), 2),
+                **figures(i + 1),
+            }
+            for i, (symbol, inv) in enumerate(zip(symbols, holdings)) if active[i]
+        ],
+    }
@@ -0,0 +1,113 @@
+"""
+Daily price history for investment symbols.
+
+Prices are market data shared by the tenants of a database, one close per
+symbol and day, recorded through the admin endpoint or offline loaders and
+never from a tenant's own request. ``price_matrix`` turns the history
+into a (symbols x days) array of the last known close on or before each day,
+using one ``searchsorted`` over all symbols at once. A holding's purchase
+price (or the prices of its trades) and current price act as points when
+the table has nothing on those days.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from models import Investment, Price, upsert_insert
+
+
+def record_prices(db: Session, prices: Dict[str, float], day: date = None):
+    """Store today's (or ``day``'s) close per symbol, replacing an earlier one for that day"""
+    if not prices:
+        return
+    day = day or date.today()
+    insert_stmt = upsert_insert(db.get_bind())(Price)
+    db.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["symbol", "date"], set_={"close": insert_stmt.excluded.close}
+        ),
+        [{"symbol": symbol, "date": day, "close": float(close)} for symbol, close in prices.items()]
+    )
+
+
+def price_points(db: Session, investments: Sequence[Investment],
+                 anchors: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Known (symbol, day, close) points for the given holdings, sorted by symbol
+    and day. ``anchors`` (symbol, date, close), such as the prices of single
+    trades, replace the holdings' purchase prices as points.
+    """
+    if anchors is None:
+        anchors = pd.DataFrame(
+            [(inv.symbol, inv.purchase_date, inv.purchase_price) for inv in investments if inv.purchase_date],
+            columns=["symbol", "date", "close"]
+        )
+    symbols = sorted({inv.symbol for inv in investments} | set(anchors["symbol"]))
+    history = pd.DataFrame(
+        db.query(Price.symbol, Price.date, Price.close).filter(Price.symbol.in_(symbols)).all(),
+        columns=["symbol", "date", "close"]
+    )
+    today = pd.Timestamp(date.today())
+    current = pd.DataFrame([(inv.symbol, today, inv.current_price) for inv in investments],
+                           columns=["symbol", "date", "close"])
+    points = pd.concat([df for df in (anchors, current, history) if not df.empty], ignore_index=True)
+    if points.empty:
+        return pd.DataFrame(columns=["symbol", "date", "close"])
+    points["date"] = pd.to_datetime(points["date"]).dt.normalize()
+    points = points.dropna(subset=["close"])
+    # Recorded closes win over anchors on the same day
+    points = points.drop_duplicates(subset=["symbol", "date"], keep="last")
+    return points.sort_values(["symbol", "date"], ignore_index=True)
+
+
+def price_matrix(points: pd.DataFrame, symbols: List[str], days: np.ndarray) -> np.ndarray:
+    """
+    Last known close per symbol (rows, in ``symbols`` order) and day
+    (``days`` as datetime64[D]). Days before a symbol's first point take its
+    first close; symbols without points are NaN. A symbol may appear more
+    than once (several lots); each of its rows gets the same prices.
+    """
+    unique_symbols, rows = np.unique(np.asarray(symbols, dtype=str), return_inverse=True)
+    return _unique_price_matrix(points, list(unique_symbols), days)[rows.reshape(-1)]
+
+
+def _unique_price_matrix(points: pd.DataFrame, symbols: List[str], days: np.ndarray) -> np.ndarray:
+    matrix = np.full((len(symbols), len(days)), np.nan)
+    if points.empty or len(days) == 0:
+        return matrix
+
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    point_symbols = points["symbol"].map(symbol_index).to_numpy()
+    known = ~pd.isna(point_symbols)
+    if not known.any():
+        return matrix
+    point_symbols = point_symbols[known].astype(np.int64)
+    point_days = points["date"].to_numpy(dtype="datetime64[D]")[known].astype(np.int64)
+    closes = points["close"].to_numpy(dtype=np.float64)[known]
+
+    # Composite (symbol, day) keys sort by symbol then day, so one
+    # searchsorted finds the latest point at or before every (symbol, day)
+    day_numbers = days.astype("datetime64[D]").astype(np.int64)
+    offset = min(point_days.min(), day_numbers.min())
+    span = max(point_days.max(), day_numbers.max()) - offset + 1
+    point_keys = point_symbols * span + (point_days - offset)
+    order = np.argsort(point_keys, kind="stable")
+    point_keys, point_symbols, closes = point_keys[order], point_symbols[order], closes[order]
+
+    cell_symbols = np.repeat(np.arange(len(symbols)), len(days))
+    cell_keys = cell_symbols * span + np.tile(day_numbers - offset, len(symbols))
+    last = len(point_keys) - 1
+    position = np.searchsorted(point_keys, cell_keys, side="right") - 1
+    first = np.searchsorted(point_keys, cell_symbols * span, side="left")
+
+    # Before a symbol's first point, use that first point
+    in_symbol = (position >= 0) & (point_symbols[np.clip(position, 0, last)] == cell_symbols)
+    position = np.where(in_symbol, position, first)
+    has_points = point_symbols[np.clip(first, 0, last)] == cell_symbols
+    has_points &= first <= last
+
+    values = np.where(has_points, closes[np.clip(position, 0, last)], np.nan)
+    return values.reshape(len(symbols), len(days))
@@ -0,0 +1,61 @@
+"""
+Decode uploaded files into DataFrames.
+
+CSV is parsed straight from the uploaded bytes. Parquet and Arrow IPC files
+are opened over the same buffer with pyarrow (an optional dependency), so
+columns are read without an intermediate copy of the file.
+"""
+import io
+import os
+
+import pandas as pd
+from fastapi import HTTPException
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+UPLOAD_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+
+
+def upload_format(filename: str) -> str:
+    """Map an uploaded file name to one of the supported formats"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    fmt = UPLOAD_FORMATS.get(extension)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="File must be CSV, Parquet, Arrow or NDJSON")
+    if fmt in ("parquet", "arrow") and pa is None:
+        raise HTTPException(status_code=400, detail="Parquet and Arrow uploads require pyarrow")
+    return fmt
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    # split_blocks/self_destruct avoid consolidating columns into a second copy
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def read_table(contents: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == "parquet":
+        return _arrow_to_pandas(pq.read_table(pa.BufferReader(contents)))
+    if fmt == "arrow":
+        source = pa.BufferReader(contents)
+        try:
+            table = pa.ipc.open_file(source).read_all()
+        except pa.ArrowInvalid:
+            # Not the random-access file format: try the streaming format
+            table = pa.ipc.open_stream(pa.BufferReader(contents)).read_all()
+        return _arrow_to_pandas(table)
+    if fmt == "ndjson":
+        return pd.read_json(io.BytesIO(contents), lines=True, dtype=False, convert_dates=False)
+    return pd.read_csv(io.BytesIO(contents))
@@ -0,0 +1,217 @@
+"""
+Asset classes and portfolio rebalancing.
+
+Holdings are grouped into asset classes by ``classify_assets``. Given target
+weights and a tolerance band per class, ``rebalance_plan`` finds the
+smallest trades that bring every class inside its band while investing (or
+raising) the requested cash:
+
+1. classes outside their band are traded to the band edge (or to the target
+   with ``to_target``) - these trades are unavoidable;
+2. whatever cash is left over is spread by water-filling: buys go to the
+   most underweight classes first, sells come from the most overweight,
+   each within its band.
+
+This solves the minimum-turnover linear program exactly with a few
+vectorized passes, so no LP solver is needed. Class trades are then split
+across the positions of each class in proportion to their value, or, with
+``tax_aware``, sells draw on the lots with the lowest gain per dollar first
+(losses before gains). Values, prices and trade amounts are in BASE_CURRENCY,
+converted at today's FX rates like the asset allocation.
+"""
+from datetime import datetime, timedelta
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from models import Investment
+from lots import LONG_TERM_DAYS, lot_frame
+from fx import rate_table
+
+STOCK_SYMBOLS = ("SPY", "VTI", "QQQ")
+BOND_PREFIX = "BOND"
+DEFAULT_TOLERANCE = 0.05
+# Trades smaller than this (in currency units) are left out of the plan
+MIN_TRADE = 0.01
+
+_FILL_ITERATIONS = 100
+
+
+def classify_assets(symbols) -> np.ndarray:
+    """Asset class per symbol: Bonds, Stocks or Other"""
+    symbols = np.asarray(symbols, dtype=str)
+    classes = np.full(len(symbols), "Other", dtype=object)
+    classes[np.isin(symbols, STOCK_SYMBOLS)] = "Stocks"
+    classes[np.char.startswith(symbols, BOND_PREFIX)] = "Bonds"
+    return classes
+
+
+def parse_targets(targets: str) -> Dict[str, float]:
+    """
+    Parse ``"Stocks=60,Bonds=30,Other=10"`` into weights that sum to 1.
+    Weights may be given as percentages or fractions.
+    """
+    weights = {}
+    try:
+        for part in filter(None, (item.strip() for item in targets.split(","))):
+            name, _, value = part.partition("=")
+            weights[name.strip().capitalize()] = float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="targets must look like 'Stocks=60,Bonds=30,Other=10'")
+    total = sum(weights.values())
+    if not weights or any(weight < 0 for weight in weights.values()) or total <= 0:
+        raise HTTPException(status_code=400, detail="targets need at least one positive weight")
+    scale = 100.0 if total > 1.5 else 1.0
+    if abs(total / scale - 1.0) > 0.005:
+        raise HTTPException(status_code=400, detail=f"target weights must sum to 100%, got {total / scale:.1%}")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+def _water_fill(level: np.ndarray, room: np.ndarray, amount: float) -> np.ndarray:
+    """
+    Spread ``amount`` over slots, raising the lowest ``level`` first, each
+    slot taking at most ``room``: the allocation is clip(L - level, 0, room)
+    for the water line L where it sums to ``amount``.
+    """
+    low, high = level.min(), (level + room).max()
+    for _ in range(_FILL_ITERATIONS):
+        line = (low + high) / 2
+        if np.clip(line - level, 0, room).sum() < amount:
+            low = line
+        else:
+            high = line
+    allocation = np.clip(high - level, 0, room)
+    total = allocation.sum()
+    return allocation * (amount / total) if total > 0 else allocation
+
+
+def class_trades(values: np.ndarray, targets: np.ndarray, tolerance: float, cash: float,
+                 to_target: bool = False) -> np.ndarray:
+    """Minimum-turnover trade per class (positive buys) keeping every class in its band"""
+    total = values.sum() + cash
+    target_values = targets * total
+    lower = np.clip(targets - tolerance, 0, 1) * total
+    upper = np.clip(targets + tolerance, 0, 1) * total
+    if to_target:
+        outside = (values < lower) | (values > upper)
+        lower = np.where(outside, target_values, lower)
+        upper = np.where(outside, target_values, upper)
+
+    trades = np.clip(lower - values, 0, None) - np.clip(values - upper, 0, None)
+    after = values + trades
+    gap = cash - trades.sum()
+    if gap > MIN_TRADE:
+        trades += _water_fill(after - target_values, upper - after, gap)
+    elif gap < -MIN_TRADE:
+        trades -= _water_fill(target_values - after, after - lower, -gap)
+    return trades
+
+
+def _tax_aware_sells(db: Session, positions: pd.DataFrame, sells: np.ndarray):
+    """
+    Sell amount per position and the lots sold, drawing on each class's lots
+    with the lowest gain per dollar first
+    """
+    selling = positions.loc[sells[positions["class_index"]] > 0]
+    lots = lot_frame(db, selling["symbol"].tolist())
+    lots = lots.merge(selling[["symbol", "class_index", "price", "rate"]].rename(columns={"price": "current"}),
+                      on="symbol")
+    lots["value"] = lots["remaining"] * lots["current"]
+    # Lot prices are in the holding's currency
+    lots["gain_ratio"] = 1.0 - lots["price"] * lots["rate"] / lots["current"]
+    lots["long_term"] = pd.to_datetime(lots["acquired"]) < datetime.utcnow() - timedelta(days=LONG_TERM_DAYS)
+    # Losses first, then the smallest gains; long-term lots first among equals
+    lots = lots.sort_values(["class_index", "gain_ratio", "long_term"], ascending=[True, True, False])
+
+    sold_before = lots.groupby("class_index")["value"].cumsum() - lots["value"]
+    lots["sold"] = np.clip(sells[lots["class_index"]] - sold_before, 0, lots["value"])
+    return lots[lots["sold"] > MIN_TRADE]
+
+
+def rebalance_plan(db: Session, targets: Dict[str, float], tolerance: float = DEFAULT_TOLERANCE,
+                   cash: float = 0.0, tax_aware: bool = False, to_target: bool = False) -> Dict:
+    rows = db.query(Investment.symbol, Investment.shares, Investment.current_price, Investment.purchase_price,
+                    Investment.currency).all()
+    positions = pd.DataFrame(rows, columns=["symbol", "shares", "price", "cost", "currency"])
+    positions = positions[positions["price"].notna() & (positions["price"] > 0)].reset_index(drop=True)
+    positions["rate"] = rate_table(db).rates(positions["currency"])
+    positions[["price", "cost"]] = positions[["price", "cost"]].astype(float).mul(positions["rate"], axis=0)
+    positions["value"] = positions["shares"].fillna(0.0) * positions["price"]
+    positions["asset_class"] = classify_assets(positions["symbol"])
+
+    # Classes held without a target are sold down to zero
+    classes = list(targets) + sorted(set(positions["asset_class"]) - set(targets))
+    class_index = {name: i for i, name in enumerate(classes)}
+    positions["class_index"] = positions["asset_class"].map(class_index).astype(np.int64)
+    values = np.bincount(positions["class_index"], weights=positions["value"], minlength=len(classes))
+    weights = np.array([targets.get(name, 0.0) for name in classes])
+
+    total = values.sum() + cash
+    if total <= 0:
+        raise HTTPException(status_code=400, detail="Cash withdrawal exceeds the portfolio value")
+    trades = class_trades(values, weights, tolerance, cash, to_target)
+    trades = np.where(np.abs(trades) > MIN_TRADE, trades, 0.0)
+    buys, sells = np.clip(trades, 0, None), np.clip(-trades, 0, None)
+
+    # Buys and (plain) sells follow the current mix within each class
+    share = positions["value"].to_numpy() / np.where(values > 0, values, 1.0)[positions["class_index"]]
+    positions["buy"] = buys[positions["class_index"]] * share
+    positions["sell"] = sells[positions["class_index"]] * share
+    positions["gain"] = positions["sell"] * (1.0 - positions["cost"].fillna(positions["price"]) / positions["price"])
+
+    sold_lots = None
+    if tax_aware and sells.any():
+        sold_lots = _tax_aware_sells(db, positions, sells)
+        lot_gains = sold_lots["sold"] * sold_lots["gain_ratio"]
+        by_symbol = sold_lots.assign(lot_gain=lot_gains).groupby("symbol")[["sold", "lot_gain"]].sum()
+        positions["sell"] = positions["symbol"].map(by_symbol["sold"]).fillna(0.0)
+        positions["gain"] = positions["symbol"].map(by_symbol["lot_gain"]).fillna(0.0)
+
+    plan = []
+    for position in positions[(positions["buy"] > MIN_TRADE) | (positions["sell"] > MIN_TRADE)].itertuples():
+        amount = position.buy - position.sell
+        trade = {
+            "symbol": position.symbol,
+            "asset_class": position.asset_class,
+            "action": "buy" if amount > 0 else "sell",
+            "amount": round(abs(amount), 2),
+            "shares": round(abs(amount) / position.price, 6),
+            "price": position.price,
+            "estimated_gain": round(position.gain, 2) if amount < 0 else 0.0,
+        }
+        if sold_lots is not None and amount < 0:
+            trade["lots"] = [
+                {"lot_id": int(lot.id), "shares": round(lot.sold / lot.current, 6)}
+                for lot in sold_lots[sold_lots["symbol"] == position.symbol].itertuples()
+            ]
+        plan.append(trade)
+    # Classes with a target but no holdings yet get a class-level buy
+    for i in np.flatnonzero((values == 0) & (buys > 0)):
+        plan.append({"symbol": None, "asset_class": classes[i], "action": "buy", "amount": round(buys[i], 2),
+                     "shares": None, "price": None, "estimated_gain": 0.0})
+
+    new_values = values + trades
+    return {
+        "total_value": round(float(values.sum()), 2),
+        "cash": cash,
+        "tolerance": tolerance,
+        "classes": [
+            {
+                "asset_class": name,
+                "value": round(float(values[i]), 2),
+                "weight": round(float(values[i] / values.sum()), 4) if values.sum() > 0 else 0.0,
+                "target": round(float(weights[i]), 4),
+                "lower": round(max(weights[i] - tolerance, 0.0), 4),
+                "upper": round(min(weights[i] + tolerance, 1.0), 4),
+                "trade": round(float(trades[i]), 2),
+                "new_weight": round(float(new_values[i] / total), 4),
+            }
+            for i, name in enumerate(classes)
+        ],
+        "trades": plan,
+        "turnover": round(float(np.abs(trades).sum()), 2),
+        "estimated_realized_gain": round(float(positions["gain"].where(positions["sell"] > 0, 0.0).sum()), 2),
+    }
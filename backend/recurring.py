@@ -0,0 +1,231 @@
+"""
+Recurring transaction and subscription detection.
+
+Transactions are grouped by normalized merchant, direction (income or
+expense) and a logarithmic amount band around the merchant's typical amount,
+so "NETFLIX.COM 8841" and "Netflix" variations of one charge fall together
+while a one-off large purchase at the same merchant does not. Within each
+series the gaps between consecutive dates are computed with ``np.diff`` and
+summarized per series (median and MAD); series whose median gap sits close to
+a known period with little spread are reported as recurring, as are bills
+that land on a different day each month but appear in most calendar months.
+
+Results are kept per merchant and direction and refreshed only for the keys
+that newly ingested rows fall into.
+"""
+import re
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarTransactionStore, IncrementalAnalysis, grouped_median
+
+# Nominal length in days of each supported period
+PERIODS = {
+    "weekly": 7.0,
+    "biweekly": 14.0,
+    "monthly": 30.44,
+    "quarterly": 91.31,
+    "yearly": 365.25,
+}
+PERIOD_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+_PERIOD_NAMES = np.array(list(PERIODS))
+_PERIOD_DAYS = np.array(list(PERIODS.values()))
+
+MIN_OCCURRENCES = 3
+# Median gap within this fraction of the nominal period
+PERIOD_TOLERANCE = 0.15
+# Median absolute deviation of the gaps, as a fraction of the period
+MAX_INTERVAL_SPREAD = 0.1
+# Median absolute deviation of the amounts, as a fraction of the median amount
+MAX_AMOUNT_SPREAD = 0.15
+# Share of spanned calendar months a monthly bill must appear in
+MIN_MONTH_COVERAGE = 0.6
+# Share of a monthly bill's occurrences that must fall in distinct months
+MIN_DISTINCT_MONTHS = 0.8
+# Amount band width as a factor around a merchant's typical amount
+_BAND_BASE = np.log(1.5)
+
+_NON_LETTERS_RE = re.compile(r"[^a-z]+")
+
+
+def normalize_merchant(description: str) -> str:
+    """Lowercase letters only, so store numbers, references and punctuation drop out"""
+    return " ".join(_NON_LETTERS_RE.sub(" ", (description or "").lower()).split())
+
+
+class MerchantIndex:
+    """Maps the store's description codes to merchant codes, extended as new descriptions appear"""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._by_description = np.empty(0, dtype=np.int32)
+
+    def codes(self, store: ColumnarTransactionStore, description_codes: np.ndarray) -> np.ndarray:
+        descriptions = store.descriptions.values
+        if len(descriptions) > len(self._by_description):
+            new = [
+                self._codes.setdefault(merchant, len(self._codes))
+                for merchant in map(normalize_merchant, descriptions[len(self._by_description):])
+            ]
+            self._by_description = np.concatenate((self._by_description, np.array(new, dtype=np.int32)))
+        # -1 (no description) stays -1
+        merchants = np.full(len(description_codes), -1, dtype=np.int32)
+        present = description_codes >= 0
+        merchants[present] = self._by_description[description_codes[present]]
+        return merchants
+
+
+def merchant_keys(merchants: MerchantIndex, store: ColumnarTransactionStore, rows: slice) -> np.ndarray:
+    """(merchant, direction) key per row; -1 for rows without a description or amount"""
+    codes = merchants.codes(store, store.description_codes[rows]).astype(np.int64)
+    amounts = store.amounts[rows]
+    keys = (codes << 1) | (amounts > 0)
+    keys[(codes < 0) | (amounts == 0)] = -1
+    return keys
+
+
+def _next_date(last: pd.Timestamp, period: str, interval_days: float) -> pd.Timestamp:
+    months = PERIOD_MONTHS.get(period)
+    if months is not None:
+        return last + pd.DateOffset(months=months)
+    return last + pd.Timedelta(days=round(interval_days))
+
+
+def _group_starts(ids: np.ndarray):
+    """Start offsets and sizes of the runs of equal values in sorted ``ids``"""
+    starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+    counts = np.diff(np.append(starts, len(ids)))
+    return starts, counts
+
+
+class RecurringDetector(IncrementalAnalysis):
+    """
+    Recurring series per (merchant, direction) key, split into amount bands.
+
+    ``results`` maps each key to the list of recurring series found for it,
+    so new rows only invalidate the keys they belong to.
+    """
+
+    def reset(self):
+        super().reset()
+        self.merchants = MerchantIndex()
+        self._keys = np.empty(0, dtype=np.int64)
+
+    def update(self, store: ColumnarTransactionStore, new_rows: slice):
+        self._keys = np.concatenate((self._keys, merchant_keys(self.merchants, store, new_rows)))
+        dirty = np.unique(self._keys[new_rows])
+        dirty = dirty[dirty >= 0]
+        if len(dirty) == 0:
+            return
+
+        results = dict(self.results)
+        for key in dirty.tolist():
+            results.pop(key, None)
+        results.update(self._detect(store, np.flatnonzero(np.isin(self._keys, dirty))))
+        self.results = results
+
+    def _detect(self, store: ColumnarTransactionStore, rows: np.ndarray) -> Dict[int, List[dict]]:
+        keys = self._keys[rows]
+        magnitude = np.abs(store.amounts[rows])
+
+        # Amount bands are centred on each key's typical amount, so small
+        # variations of one bill stay together while outliers split off
+        key_values, key_of_row = np.unique(keys, return_inverse=True)
+        typical = grouped_median(magnitude, key_of_row, len(key_values))
+        bands = np.clip(np.rint(np.log(magnitude / typical[key_of_row]) / _BAND_BASE), -50, 50).astype(np.int64)
+        _, series_of_row = np.unique(key_of_row * 101 + bands + 50, return_inverse=True)
+
+        days = store.dates[rows].astype("datetime64[D]").astype(np.int64)
+        order = np.lexsort((store.ids[rows], days, series_of_row))
+        rows, keys, days, series = rows[order], keys[order], days[order], series_of_row[order]
+        starts, counts = _group_starts(series)
+        series_count = len(starts)
+        series = np.repeat(np.arange(series_count), counts)
+
+        # Gaps between consecutive occurrences within a series
+        same_series = series[1:] == series[:-1]
+        gaps = np.diff(days)[same_series].astype(np.float64)
+        gap_series = series[1:][same_series]
+        median_gap = grouped_median(gaps, gap_series, series_count)
+        gap_spread = grouped_median(np.abs(gaps - median_gap[gap_series]), gap_series, series_count)
+
+        amounts = store.amounts[rows]
+        median_amount = grouped_median(amounts, series, series_count)
+        amount_spread = grouped_median(np.abs(amounts - median_amount[series]), series, series_count)
+
+        # Nearest nominal period and how far the median gap is from it
+        with np.errstate(invalid="ignore"):
+            distance = np.abs(median_gap[:, None] - _PERIOD_DAYS[None, :]) / _PERIOD_DAYS[None, :]
+        nearest = np.argmin(np.nan_to_num(distance, nan=np.inf), axis=1)
+        period_days = _PERIOD_DAYS[nearest]
+        steady_amount = amount_spread <= MAX_AMOUNT_SPREAD * np.abs(median_amount)
+        regular = (
+            steady_amount
+            & (counts >= MIN_OCCURRENCES)
+            & (np.take_along_axis(distance, nearest[:, None], axis=1)[:, 0] <= PERIOD_TOLERANCE)
+            & (gap_spread <= MAX_INTERVAL_SPREAD * period_days)
+        )
+
+        # Bills paid on a different day each month: about one per calendar
+        # month, in most of the months the series spans
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        distinct_months = np.bincount(np.unique(series * 1_000_000 + months) // 1_000_000, minlength=series_count)
+        spanned_months = months[starts + counts - 1] - months[starts] + 1
+        calendar_monthly = (
+            ~regular
+            & steady_amount
+            & (counts >= MIN_OCCURRENCES)
+            & (distinct_months >= MIN_DISTINCT_MONTHS * counts)
+            & (distinct_months >= MIN_MONTH_COVERAGE * spanned_months)
+        )
+        nearest[calendar_monthly] = _PERIOD_NAMES.tolist().index("monthly")
+
+        last_rows = rows[starts + counts - 1]
+        results: Dict[int, List[dict]] = {}
+        for group in np.flatnonzero(regular | calendar_monthly):
+            period = str(_PERIOD_NAMES[nearest[group]])
+            last_row = last_rows[group]
+            last_date = pd.Timestamp(store.dates[last_row])
+            amount = float(median_amount[group])
+            category_code = store.category_codes[last_row]
+            results.setdefault(int(keys[starts[group]]), []).append({
+                "merchant": store.descriptions.values[store.description_codes[last_row]],
+                "category": store.categories.values[category_code] if category_code >= 0 else None,
+                "account_id": int(store.account_ids[last_row]),
+                "type": "income" if amount > 0 else "expense",
+                "period": period,
+                "interval_days": round(float(median_gap[group]), 1),
+                "occurrences": int(counts[group]),
+                "amount": round(amount, 2),
+                "amount_variation": round(float(amount_spread[group]), 2),
+                "monthly_amount": round(amount * PERIODS["monthly"] / PERIODS[period], 2),
+                "first_date": pd.Timestamp(store.dates[rows[starts[group]]]).isoformat(),
+                "last_date": last_date.isoformat(),
+                "next_date": _next_date(last_date, period, median_gap[group]).isoformat(),
+            })
+        return results
+
+
+def recurring_items(store: ColumnarTransactionStore, active_only: bool = True) -> List[dict]:
+    """
+    Recurring series sorted by next expected date.
+
+    A series is active while its next date is no more than one period past
+    the latest transaction on record.
+    """
+    results = RecurringDetector.for_store(store).refresh(store)
+    if not results:
+        return []
+    with store.lock:
+        latest = pd.Timestamp(store.dates.max())
+
+    items = []
+    for item in (item for series in results.values() for item in series):
+        overdue_days = (latest - pd.Timestamp(item["next_date"])).days
+        active = overdue_days <= PERIODS[item["period"]]
+        if active or not active_only:
+            items.append({**item, "active": active})
+    items.sort(key=lambda item: item["next_date"])
+    return items
@@ -0,0 +1,110 @@
+"""
+Monthly rollups of transactions keyed by (account_id, category, month).
+
+The rollup table is maintained incrementally by ``apply_rollup_deltas``,
+which every write path calls through ``ingest.ingest_transactions``, and can
+be rebuilt from scratch offline:
+
+    python backend/rollups.py
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import MonthlyRollup, tenant_of, upsert_insert
+from archive import transactions_source
+
+UNCATEGORIZED = "Uncategorized"
+
+
+def month_expression(column, bind):
+    """SQL expression formatting a datetime column as YYYY-MM"""
+    if bind.dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def month_labels(dates: pd.Series) -> np.ndarray:
+    """YYYY-MM label per date, formatting each distinct month only once"""
+    months = pd.to_datetime(dates).to_numpy(dtype="datetime64[M]")
+    uniques, inverse = np.unique(months, return_inverse=True)
+    return np.array([str(month) for month in uniques], dtype=object)[inverse]
+
+
+def compute_rollup_deltas(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate new transactions into rollup deltas.
+
+    ``frame`` needs account_id, category, amount and date columns.
+    """
+    amounts = frame["amount"].astype(float)
+    deltas = pd.DataFrame({
+        "account_id": frame["account_id"],
+        "category": frame["category"].fillna(UNCATEGORIZED),
+        "month": month_labels(frame["date"]),
+        "income": amounts.clip(lower=0),
+        "expenses": (-amounts).clip(lower=0),
+        "income_count": (amounts > 0).astype(int),
+        "expense_count": (amounts < 0).astype(int),
+    })
+    return deltas.groupby(["account_id", "category", "month"], as_index=False).sum()
+
+
+def apply_rollup_deltas(db: Session, frame: pd.DataFrame):
+    """Add newly ingested transactions to the rollup table with one upsert per key"""
+    if frame.empty:
+        return
+    deltas = compute_rollup_deltas(frame)
+
+    insert_stmt = upsert_insert(db.get_bind())(MonthlyRollup)
+    stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["account_id", "category", "month"],
+        set_={
+            "income": MonthlyRollup.income + insert_stmt.excluded.income,
+            "expenses": MonthlyRollup.expenses + insert_stmt.excluded.expenses,
+            "income_count": MonthlyRollup.income_count + insert_stmt.excluded.income_count,
+            "expense_count": MonthlyRollup.expense_count + insert_stmt.excluded.expense_count,
+        }
+    )
+    db.execute(stmt, deltas.to_dict("records"))
+
+
+def rebuild_rollups(db: Session):
+    """Recompute the tenant's rollups from raw (hot and archived) transactions in one grouped pass"""
+    source = transactions_source(db)
+    month = month_expression(source.date, db.get_bind())
+    category = func.coalesce(source.category, UNCATEGORIZED)
+    grouped = select(
+        source.tenant_id,
+        source.account_id,
+        category,
+        month,
+        func.sum(case((source.amount > 0, source.amount), else_=0.0)),
+        func.sum(case((source.amount < 0, -source.amount), else_=0.0)),
+        func.sum(case((source.amount > 0, 1), else_=0)),
+        func.sum(case((source.amount < 0, 1), else_=0)),
+    ).where(
+        source.tenant_id == tenant_of(db)
+    ).group_by(source.tenant_id, source.account_id, category, month)
+
+    db.query(MonthlyRollup).delete()
+    db.execute(insert(MonthlyRollup).from_select(
+        ["tenant_id", "account_id", "category", "month", "income", "expenses", "income_count", "expense_count"],
+        grouped
+    ))
+
+
+if __name__ == "__main__":
+    from models import create_tables
+    from tenancy import known_tenants, tenant_session
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            rebuild_rollups(db)
+            db.commit()
+            print(f"{tenant}: rebuilt {db.query(MonthlyRollup).count()} monthly rollup rows")
+        finally:
+            db.close()
@@ -0,0 +1,134 @@
+import re
+
+from sqlalchemy import column, func, literal_column, table, text
+from sqlalchemy.orm import Session
+
+from models import Account, Transaction
+from filters import TransactionFilters
+
+FTS_TABLE = "transactions_fts"
+
+# External-content FTS5 index over transactions.description. The triggers keep
+# it in sync for every write path, including bulk executemany inserts.
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        description,
+        content='transactions',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF description ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_supported(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def create_search_index(engine):
+    """Create the FTS5 index and sync triggers, populating it on first run"""
+    if not search_supported(engine):
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in _FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine):
+    """Rebuild the whole index in one pass, e.g. after loading data with triggers bypassed"""
+    if not search_supported(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "whole foo" matches
+    "Whole Foods Market"; terms are ANDed together.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _substring_matches(db: Session, source, query: str, filters: TransactionFilters, limit: int):
+    """Rows of ``source`` whose description contains every word of ``query``, newest first"""
+    rows = db.query(
+        source.id, source.amount, source.description, source.category, source.date, Account.name.label("account")
+    ).outerjoin(Account, source.account_id == Account.id)
+    for token in _TOKEN_RE.findall(query):
+        rows = rows.filter(source.description.ilike(f"%{token}%"))
+    rows = filters.apply(rows, source).order_by(source.date.desc()).limit(limit).all()
+    return [dict(row._mapping, score=None) for row in rows]
+
+
+def search_transactions(db: Session, query: str, filters: TransactionFilters, limit: int = 50):
+    """
+    Return transactions matching ``query``: hot rows ordered by BM25
+    relevance, then archived rows (substring matches, unscored) newest first
+    """
+    # archive imports this module (to rebuild the index after archiving)
+    from archive import archived_source, transactions_source
+
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    if not search_supported(db.get_bind()):
+        # Without FTS5, fall back to substring matching on each word
+        return _substring_matches(db, transactions_source(db, filters.start_date), query, filters, limit)
+
+    columns = [
+        Transaction.id,
+        Transaction.amount,
+        Transaction.description,
+        Transaction.category,
+        Transaction.date,
+        Account.name.label("account"),
+    ]
+    fts = table(FTS_TABLE, column("rowid"))
+    fts_ref = literal_column(FTS_TABLE)
+    score = func.bm25(fts_ref)
+    rows = db.query(*columns, score.label("score")) \
+        .select_from(fts) \
+        .join(Transaction, Transaction.id == fts.c.rowid) \
+        .outerjoin(Account, Transaction.account_id == Account.id) \
+        .filter(fts_ref.op("MATCH")(match))
+    rows = filters.apply(rows).order_by(score, Transaction.date.desc()).limit(limit).all()
+    # bm25() is lower-is-better; flip it so larger scores rank higher
+    results = [dict(row._mapping, score=-row.score) for row in rows]
+
+    # The index only covers the hot table
+    archived = archived_source(db, filters.start_date)
+    if archived is not None and len(results) < limit:
+        results += _substring_matches(db, archived, query, filters, limit - len(results))
+    return results
@@ -0,0 +1,209 @@
+"""
+Materialized daily snapshots of account balances, holdings value and net worth.
+
+Balances are reconstructed backwards from each account's current balance:
+the balance at the end of day d is the current balance minus every
+transaction dated after d. Daily flows per account come from one bincount
+over the columnar transaction store and a reverse cumulative sum turns them
+into an (accounts x days) balance matrix. Holdings are valued with the
+(symbols x days) matrix from ``prices.price_matrix``. Account snapshots stay
+in the account's currency; the totals are converted to the base currency
+with the (currencies x days) matrix of FX rates. A backfill over any range
+is therefore one vectorized pass plus one bulk upsert.
+
+The daily job snapshots today; run it from cron or let the API run it every
+SNAPSHOT_INTERVAL_HOURS:
+
+    python backend/snapshots.py             # snapshot today
+    python backend/snapshots.py --backfill  # every day since the first transaction
+"""
+import os
+from datetime import date
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from models import Account, AccountSnapshot, Investment, NetWorthSnapshot, upsert_insert
+from columnar import get_transaction_store
+from prices import price_matrix, price_points
+from balances import extend_checkpoints
+from fx import rate_table, refresh_rates
+from cache import data_version
+from tenancy import known_tenants, tenant_session
+
+SNAPSHOT_INTERVAL_HOURS = float(os.getenv("SNAPSHOT_INTERVAL_HOURS", "0"))
+
+
+def _day_range(start: date, end: date) -> np.ndarray:
+    return np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+
+
+def daily_balances(db: Session, days: np.ndarray):
+    """
+    Account ids, credit flags, currencies and end-of-day balances shaped
+    (accounts, days), in each account's currency
+    """
+    accounts = db.query(Account.id, Account.account_type, Account.balance, Account.currency).order_by(Account.id).all()
+    account_ids = np.array([account.id for account in accounts], dtype=np.int64)
+    is_credit = np.array([account.account_type == "credit" for account in accounts], dtype=bool)
+    currencies = [account.currency for account in accounts]
+    current = np.array([account.balance or 0.0 for account in accounts], dtype=np.float64)
+    if len(accounts) == 0:
+        return account_ids, is_credit, currencies, np.zeros((0, len(days)))
+
+    store = get_transaction_store(db)
+    with store.lock:
+        rows = np.searchsorted(account_ids, store.account_ids)
+        known = (rows < len(account_ids)) & (account_ids[np.clip(rows, 0, len(account_ids) - 1)] == store.account_ids)
+        # Column per day; transactions before the range land on day 0, those
+        # after it in an extra trailing column
+        columns = np.clip(store.dates.astype("datetime64[D]") - days[0], 0, len(days)).astype(np.int64)
+        flows = np.bincount(
+            rows[known] * (len(days) + 1) + columns[known],
+            weights=store.amounts[known],
+            minlength=len(account_ids) * (len(days) + 1)
+        ).reshape(len(account_ids), len(days) + 1)
+
+    # Everything dated after day d has not happened yet at the end of day d
+    after = flows.sum(axis=1, keepdims=True) - np.cumsum(flows, axis=1)[:, :len(days)]
+    return account_ids, is_credit, currencies, current[:, None] - after
+
+
+def daily_holdings_value(db: Session, days: np.ndarray) -> np.ndarray:
+    """Total market value of all holdings in the base currency at the end of each day"""
+    investments = db.query(Investment).all()
+    if not investments:
+        return np.zeros(len(days))
+
+    symbols = [inv.symbol for inv in investments]
+    prices = price_matrix(price_points(db, investments), symbols, days)
+    shares = np.array([inv.shares or 0.0 for inv in investments])
+    purchased = np.array([
+        np.datetime64(inv.purchase_date, "D") if inv.purchase_date else days[0] for inv in investments
+    ])
+    # A holding counts from its purchase date on
+    held = days[None, :] >= purchased[:, None]
+    rates = rate_table(db).matrix([inv.currency for inv in investments], days)
+    return np.nansum(np.where(held, shares[:, None] * prices * rates, 0.0), axis=0)
+
+
+def build_snapshots(db: Session, start: date, end: date):
+    """Snapshot frames for every day in [start, end]"""
+    days = _day_range(start, end)
+    account_ids, is_credit, currencies, balances = daily_balances(db, days)
+    holdings = daily_holdings_value(db, days)
+
+    converted = balances * rate_table(db).matrix(currencies, days) if len(currencies) else balances
+    cash = converted[~is_credit].sum(axis=0)
+    liabilities = converted[is_credit].sum(axis=0)
+    day_values = days.astype(object)
+
+    accounts = pd.DataFrame({
+        "account_id": np.repeat(account_ids, len(days)),
+        "date": np.tile(day_values, len(account_ids)),
+        "balance": np.round(balances.ravel(), 2),
+    })
+    totals = pd.DataFrame({
+        "date": day_values,
+        "cash": np.round(cash, 2),
+        "liabilities": np.round(liabilities, 2),
+        "holdings_value": np.round(holdings, 2),
+        "net_worth": np.round(cash + holdings - liabilities, 2),
+    })
+    return accounts, totals
+
+
+def write_snapshots(db: Session, accounts: pd.DataFrame, totals: pd.DataFrame):
+    """Upsert snapshot rows; re-running a day replaces its values"""
+    bind = db.get_bind()
+    if not accounts.empty:
+        stmt = upsert_insert(bind)(AccountSnapshot)
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=["account_id", "date"],
+                                       set_={"balance": stmt.excluded.balance}),
+            accounts.to_dict("records")
+        )
+    if not totals.empty:
+        stmt = upsert_insert(bind)(NetWorthSnapshot)
+        db.execute(
+            stmt.on_conflict_do_update(index_elements=["tenant_id", "date"], set_={
+                column: stmt.excluded[column] for column in ("cash", "liabilities", "holdings_value", "net_worth")
+            }),
+            totals.to_dict("records")
+        )
+
+
+def backfill_snapshots(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Write snapshots for every day from ``start`` (default: the first
+    transaction or purchase) through ``end`` (default: today). Returns the
+    number of days written; the caller owns the commit.
+    """
+    end = end or date.today()
+    if start is None:
+        store = get_transaction_store(db)
+        with store.lock:
+            first = store.dates.min() if len(store) else None
+        purchases = [day for (day,) in db.query(Investment.purchase_date).filter(Investment.purchase_date.isnot(None))]
+        candidates = [pd.Timestamp(first).date()] if first is not None else []
+        candidates += [min(purchases).date()] if purchases else []
+        start = min(candidates) if candidates else end
+    if start > end:
+        return 0
+
+    accounts, totals = build_snapshots(db, start, end)
+    write_snapshots(db, accounts, totals)
+    return len(totals)
+
+
+def take_snapshot(db: Session, day: Optional[date] = None) -> Dict:
+    """Snapshot one day (today by default) and return its totals"""
+    day = day or date.today()
+    accounts, totals = build_snapshots(db, day, day)
+    write_snapshots(db, accounts, totals)
+    return totals.iloc[0].to_dict()
+
+
+def run_snapshot_job():
+    """
+    For every tenant: record today's FX rates, take today's snapshot and add
+    any new month-end balance checkpoints (for the scheduler)
+    """
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            if refresh_rates(db):
+                db.commit()
+                data_version.bump()
+            take_snapshot(db)
+            extend_checkpoints(db)
+            db.commit()
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from models import create_tables
+
+    parser = argparse.ArgumentParser(description="Write daily net worth snapshots")
+    parser.add_argument("--backfill", action="store_true", help="snapshot every day since the first transaction")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day to backfill (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    create_tables()
+    for tenant in known_tenants():
+        db = tenant_session(tenant)
+        try:
+            if args.backfill or args.start:
+                count = backfill_snapshots(db, start=args.start)
+                print(f"{tenant}: wrote snapshots for {count} days")
+            else:
+                totals = take_snapshot(db)
+                print(f"{tenant}: net worth on {totals['date']}: {totals['net_worth']:,.2f}")
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,151 @@
+"""
+Tenants and per-tenant database sessions.
+
+Every request names its tenant in the X-Tenant-ID header (DEFAULT_TENANT when
+it is absent); deploy the API behind a proxy that authenticates users and
+sets the header. Tenant-owned models carry ``tenant_id``: a session from
+``tenant_session`` stamps it on every row it inserts, and the ORM adds
+``tenant_id = <tenant>`` to every SELECT, UPDATE and DELETE it runs (see
+models.TenantMixin), so endpoint code never filters by tenant itself. Market
+data (prices, FX rates) is shared by the tenants of a database, so tenant
+requests never write it: only the scheduled jobs and the admin endpoints,
+which require the ADMIN_TOKEN in the X-Admin-Token header (and are disabled
+while it is unset), store prices and rates.
+
+TENANT_STORAGE chooses where tenants live:
+
+* ``shared`` (default): one database; every index on a tenant-owned table
+  leads with tenant_id, so a tenant's queries only scan its own rows.
+* ``sqlite``: each tenant other than DEFAULT_TENANT gets its own SQLite file
+  in TENANT_DB_DIR, so one tenant's bulk import never holds a database lock
+  another tenant's reads wait on. Open engines are kept in an LRU pool of
+  TENANT_ENGINE_POOL_SIZE; the least recently used one is disposed.
+"""
+import hmac
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from models import DEFAULT_TENANT, Account, Investment, create_tables, engine, make_engine
+from search import create_search_index
+
+TENANT_HEADER = "X-Tenant-ID"
+ADMIN_HEADER = "X-Admin-Token"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+TENANT_STORAGE = os.getenv("TENANT_STORAGE", "shared").lower()
+TENANT_DB_DIR = os.getenv("TENANT_DB_DIR", "./tenants")
+TENANT_ENGINE_POOL_SIZE = int(os.getenv("TENANT_ENGINE_POOL_SIZE", "16"))
+
+# Tenant ids double as file names in sqlite storage
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def check_tenant_id(tenant: str) -> str:
+    if not _TENANT_ID_RE.match(tenant):
+        raise HTTPException(status_code=400, detail=f"{TENANT_HEADER} must be 1-64 letters, digits, '-' or '_'")
+    return tenant
+
+
+class EnginePool:
+    """Least-recently-used engines for per-tenant SQLite files"""
+
+    def __init__(self, directory: str, max_engines: int):
+        self.directory = directory
+        self.max_engines = max_engines
+        self._lock = threading.Lock()
+        self._engines = OrderedDict()
+
+    def path(self, tenant: str) -> str:
+        return os.path.join(self.directory, f"{tenant}.db")
+
+    def get(self, tenant: str):
+        with self._lock:
+            tenant_engine = self._engines.get(tenant)
+            if tenant_engine is not None:
+                self._engines.move_to_end(tenant)
+                return tenant_engine
+
+            os.makedirs(self.directory, exist_ok=True)
+            tenant_engine = make_engine(f"sqlite:///{self.path(tenant)}")
+            create_tables(tenant_engine)
+            create_search_index(tenant_engine)
+            self._engines[tenant] = tenant_engine
+            while len(self._engines) > self.max_engines:
+                # Sessions still holding a connection keep it until they close
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return tenant_engine
+
+    def tenants(self) -> List[str]:
+        """Tenants with a database file"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".db"))
+
+
+tenant_engines = EnginePool(TENANT_DB_DIR, TENANT_ENGINE_POOL_SIZE)
+
+
+def engine_for(tenant: str):
+    if TENANT_STORAGE == "sqlite" and tenant != DEFAULT_TENANT:
+        return tenant_engines.get(tenant)
+    return engine
+
+
+def tenant_session(tenant: str = DEFAULT_TENANT) -> Session:
+    """Session that only sees, and writes rows owned by, ``tenant``"""
+    bind = engine_for(tenant).execution_options(tenant_id=tenant)
+    return Session(bind=bind, autoflush=False, info={"tenant_id": tenant})
+
+
+def known_tenants() -> List[str]:
+    """Every tenant with data, for jobs that run across tenants"""
+    if TENANT_STORAGE == "sqlite":
+        return sorted({DEFAULT_TENANT, *tenant_engines.tenants()})
+    # Core statement on a plain connection: no tenant criteria
+    with engine.connect() as conn:
+        owners = union(select(Account.__table__.c.tenant_id), select(Investment.__table__.c.tenant_id))
+        return sorted({DEFAULT_TENANT, *conn.execute(owners).scalars()})
+
+
+def get_tenant(x_tenant_id: Optional[str] = Header(None)) -> str:
+    return check_tenant_id(x_tenant_id) if x_tenant_id else DEFAULT_TENANT
+
+
+def get_db(tenant: str = Depends(get_tenant)):
+    db = tenant_session(tenant)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def market_data_engines() -> list:
+    """One engine per database holding shared market data"""
+    engines = {}
+    for tenant in known_tenants():
+        tenant_engine = engine_for(tenant)
+        engines[id(tenant_engine)] = tenant_engine
+    return list(engines.values())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject requests without the ADMIN_TOKEN; admin endpoints are off when it is unset"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail=f"Requires the admin token in {ADMIN_HEADER}")
+
+
+def get_market_data_sessions(_: None = Depends(require_admin)):
+    """Sessions outside any tenant on every database that holds market data"""
+    sessions = [Session(bind=market_engine, autoflush=False) for market_engine in market_data_engines()]
+    try:
+        yield sessions
+    finally:
+        for session in sessions:
+            session.close()
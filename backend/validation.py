@@ -0,0 +1,131 @@
+"""
+Column-at-a-time validation and type coercion for uploaded tables.
+
+Each upload type declares a schema of fields. ``validate_frame`` coerces
+whole columns at once (dates, numerics, strings), builds boolean masks for
+values that are missing, unparseable or not in the allowed set, and turns
+the masks into the row-level error report returned by the upload endpoints.
+"""
+import warnings
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ACCOUNT_TYPES = ("checking", "savings", "investment", "credit")
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    kind: str  # "datetime", "numeric" or "string"
+    required: bool = True
+    allowed: Optional[Tuple[str, ...]] = None
+
+
+TRANSACTION_SCHEMA = [
+    Field("date", "datetime"),
+    Field("amount", "numeric"),
+    Field("description", "string"),
+    Field("category", "string", required=False),  # filled by category rules when missing
+    Field("account_name", "string"),
+    Field("currency", "string", required=False),  # defaults to the account's currency
+]
+
+INVESTMENT_SCHEMA = [
+    Field("symbol", "string"),
+    Field("shares", "numeric"),
+    Field("purchase_price", "numeric"),
+    Field("current_price", "numeric"),
+    Field("purchase_date", "datetime"),
+    Field("currency", "string", required=False),
+]
+
+ACCOUNT_SCHEMA = [
+    Field("name", "string"),
+    Field("account_type", "string", allowed=ACCOUNT_TYPES),
+    Field("balance", "numeric"),
+    Field("currency", "string", required=False),  # base currency when missing
+]
+
+
+def missing_columns(df: pd.DataFrame, schema: List[Field]) -> List[str]:
+    return [field.name for field in schema if field.required and field.name not in df.columns]
+
+
+def _coerce_datetime(column: pd.Series) -> pd.Series:
+    with warnings.catch_warnings():
+        # Raised when the first value does not reveal the format; handled below
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(column, errors="coerce")
+    retry = parsed.isna() & column.notna()
+    if retry.any():
+        # The fast path infers one format; re-parse leftovers element by element
+        parsed[retry] = pd.to_datetime(column[retry], errors="coerce", format="mixed")
+    return parsed
+
+
+def _coerce_string(column: pd.Series) -> pd.Series:
+    strings = column.astype("string").str.strip()
+    present = strings.ne("").fillna(False).to_numpy(dtype=bool)
+    return strings.astype(object).where(present, None)
+
+
+def _blank(raw: pd.Series) -> np.ndarray:
+    """True where a raw value is an empty or whitespace-only string"""
+    return raw.astype("string").str.strip().eq("").fillna(False).to_numpy(dtype=bool)
+
+
+def coerce_column(column: pd.Series, kind: str) -> pd.Series:
+    if kind == "datetime":
+        return _coerce_datetime(column)
+    if kind == "numeric":
+        return pd.to_numeric(column, errors="coerce")
+    return _coerce_string(column)
+
+
+def validate_frame(df: pd.DataFrame, schema: List[Field], error_limit: int = 10):
+    """
+    Coerce ``df`` to ``schema`` and drop invalid rows.
+
+    Returns ``(clean, errors)`` where ``clean`` holds the valid rows with typed
+    columns (original index preserved) and ``errors`` lists up to
+    ``error_limit`` messages of the form "Row N: ...".
+    """
+    coerced = {}
+    invalid = np.zeros(len(df), dtype=bool)
+    problems = []  # (row position, field order, message template, column)
+
+    for order, field in enumerate(schema):
+        if field.name not in df.columns:
+            coerced[field.name] = pd.Series([None] * len(df), index=df.index, dtype=object)
+            continue
+
+        raw = df[field.name]
+        values = coerce_column(raw, field.kind)
+        is_null = raw.isna().to_numpy() | (values.isna().to_numpy() & _blank(raw))
+        unparseable = values.isna().to_numpy() & ~is_null
+
+        masks = [(unparseable, f"invalid {field.kind} value for '{field.name}': {{value!r}}")]
+        if field.required:
+            masks.append((is_null, f"missing value for '{field.name}'"))
+        if field.allowed is not None:
+            not_allowed = values.notna().to_numpy() & ~values.isin(field.allowed).to_numpy()
+            masks.append((not_allowed, f"'{field.name}' must be one of {', '.join(field.allowed)}, got {{value!r}}"))
+
+        for mask, message in masks:
+            if mask.any():
+                invalid |= mask
+                problems.extend((pos, order, message, raw) for pos in np.flatnonzero(mask)[:error_limit])
+
+        coerced[field.name] = values
+
+    problems.sort(key=lambda problem: (problem[0], problem[1]))
+    errors = [
+        f"Row {df.index[pos] + 1}: " + message.format(value=column.iloc[pos])
+        for pos, _, message, column in problems[:error_limit]
+    ]
+
+    clean = pd.DataFrame(coerced, index=df.index)[~invalid]
+    return clean, errors
@@ -0,0 +1,98 @@
+"""
+Benchmark API response serialization and compression.
+
+For each endpoint this reports the time to serialize the payload with
+FastAPI's default path (jsonable_encoder + json.dumps) versus
+FastJSONResponse, and the body size with identity, gzip and brotli coding.
+Endpoints cover the transaction lists, the cash-flow and analytics series
+and the history payloads (net worth, running balances of the first
+account); run it against a database with realistic data, such as one
+loaded from data/generate_data.py.
+
+Usage:
+    python benchmarks/api_benchmark.py [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from main import app
+from responses import FastJSONResponse, brotli, compress_body
+
+ENDPOINTS = [
+    "/api/transactions?limit=1000",
+    "/api/transactions/search?q=market&limit=500",
+    "/api/cash-flow",
+    "/api/cash-flow/forecast?months=12",
+    "/api/analytics/categories",
+    "/api/analytics/trends?freq=D",
+    "/api/net-worth/history?include_accounts=true",
+    "/api/portfolio/performance",
+]
+# History of one account; filled in with the first account found
+ACCOUNT_ENDPOINTS = [
+    "/api/accounts/{account_id}/balances?limit=10000",
+]
+
+
+def endpoints(client):
+    accounts = client.get("/api/balances/checkpoints").json()["accounts"]
+    if not accounts:
+        return ENDPOINTS
+    return ENDPOINTS + [path.format(account_id=accounts[0]["account_id"]) for path in ACCOUNT_ENDPOINTS]
+
+
+def _timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def benchmark_serialization(client, paths, repeat):
+    print(f"{'endpoint':<48}{'default ms':>12}{'fast ms':>10}{'identity':>12}{'gzip':>10}{'br':>10}")
+    for path in paths:
+        payload = client.get(path, headers={"Accept-Encoding": "identity"}).json()
+
+        default_ms = _timed(lambda: json.dumps(jsonable_encoder(payload)).encode("utf-8"), repeat)
+        fast_ms = _timed(lambda: FastJSONResponse(payload).body, repeat)
+
+        body = FastJSONResponse(payload).body
+        gzip_size = len(compress_body(body, "gzip"))
+        br_size = len(compress_body(body, "br")) if brotli is not None else None
+
+        print(f"{path:<48}{default_ms:>12.3f}{fast_ms:>10.3f}{len(body):>12}{gzip_size:>10}"
+              f"{br_size if br_size is not None else '-':>10}")
+
+
+def benchmark_requests(client, paths, repeat):
+    print()
+    print(f"{'endpoint':<48}{'encoding':>10}{'ms/request':>12}{'bytes':>10}")
+    for path in paths:
+        for encoding in ("identity", "gzip", "br"):
+            response = client.get(path, headers={"Accept-Encoding": encoding})
+            elapsed = _timed(lambda: client.get(path, headers={"Accept-Encoding": encoding}), repeat)
+            size = int(response.headers.get("content-length", len(response.content)))
+            print(f"{path:<48}{encoding:>10}{elapsed:>12.3f}{size:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="iterations per measurement")
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    paths = endpoints(client)
+    benchmark_serialization(client, paths, args.repeat)
+    benchmark_requests(client, paths, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
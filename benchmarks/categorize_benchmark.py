@@ -0,0 +1,79 @@
+"""
+Benchmark rule-based categorization.
+
+Builds a rule set of keyword, regex and amount-range rules, then times the
+compiled matcher over synthetic descriptions. Merchant names carry store
+numbers so that a realistic share of the descriptions is distinct.
+
+Usage:
+    python benchmarks/categorize_benchmark.py [--rows 1000000] [--rules 200]
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from categorization import RuleMatcher  # noqa: E402
+
+MERCHANTS = ["Whole Foods Market", "Uber Ride", "Netflix Subscription", "Shell Gas Station",
+             "Amazon Purchase", "Electric Bill", "Starbucks Coffee", "CVS Pharmacy",
+             "Salary Deposit", "Transfer to Savings"]
+
+
+def make_rules(count: int):
+    rules = [
+        SimpleNamespace(category="Food", match_type="keyword", pattern="whole foods", min_amount=None, max_amount=None),
+        SimpleNamespace(category="Transport", match_type="regex", pattern=r"\buber\b|\bshell\b",
+                        min_amount=None, max_amount=None),
+        SimpleNamespace(category="Large Purchase", match_type="keyword", pattern="amazon",
+                        min_amount=None, max_amount=-200.0),
+        SimpleNamespace(category="Income", match_type="keyword", pattern="", min_amount=0.01, max_amount=None),
+    ]
+    # Filler rules that never match, to show cost does not grow per rule and row
+    rules += [
+        SimpleNamespace(category=f"Merchant {i}", match_type="keyword", pattern=f"merchant-{i:05d}",
+                        min_amount=None, max_amount=None)
+        for i in range(max(count - len(rules), 0))
+    ]
+    return rules
+
+
+def make_descriptions(rows: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    merchants = np.array(MERCHANTS)[rng.integers(0, len(MERCHANTS), rows)]
+    stores = rng.integers(0, 2000, rows).astype(str)
+    descriptions = pd.Series(merchants, dtype=object) + " #" + stores
+    amounts = pd.Series(np.round(rng.normal(-60, 150, rows), 2))
+    return descriptions, amounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="descriptions to categorize")
+    parser.add_argument("--rules", type=int, default=200, help="number of rules")
+    args = parser.parse_args()
+
+    descriptions, amounts = make_descriptions(args.rows)
+    start = time.perf_counter()
+    matcher = RuleMatcher(make_rules(args.rules))
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    categories = matcher.categorize(descriptions, amounts)
+    elapsed = time.perf_counter() - start
+
+    print(f"rules:        {args.rules}")
+    print(f"rows:         {args.rows} ({descriptions.nunique()} distinct descriptions)")
+    print(f"compile:      {compiled * 1000:.1f} ms")
+    print(f"categorize:   {elapsed:.2f} s ({args.rows / elapsed:,.0f} rows/s)")
+    print(f"matched:      {categories.notna().mean():.1%}")
+
+
+if __name__ == "__main__":
+    main()
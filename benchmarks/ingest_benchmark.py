@@ -0,0 +1,92 @@
+"""
+Benchmark transaction ingestion throughput per upload format.
+
+Generates synthetic transactions, then times the upload endpoint with CSV,
+Parquet, Arrow and NDJSON files plus the streaming /api/transactions/bulk
+endpoint. Runs against a throwaway SQLite database in a temp directory.
+
+Usage:
+    python benchmarks/ingest_benchmark.py [--rows 100000]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+sys.path.insert(0, DATA_DIR)
+
+from generate_data import make_accounts, make_transactions as generate_transactions
+
+
+def make_transactions(rows: int, seed: int = 42) -> pd.DataFrame:
+    """``rows`` synthetic transactions from 2020 to 2023 in the upload format"""
+    chunks = generate_transactions(make_accounts(4, seed), rows, date(2020, 1, 1), date(2024, 1, 1), seed,
+                                   chunk_size=rows)
+    frame = next(chunks)
+    return frame.assign(date=frame["date"].dt.strftime("%Y-%m-%d"))
+
+
+def encode(df: pd.DataFrame, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "csv":
+        df.to_csv(buffer, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(buffer, index=False)
+    elif fmt == "arrow":
+        df.reset_index(drop=True).to_feather(buffer)
+    else:
+        df.to_json(buffer, orient="records", lines=True)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="transactions per run")
+    args = parser.parse_args()
+
+    # The app's SQLite URL is relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="ingest-bench-"))
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    from main import app
+
+    client = TestClient(app)
+    df = make_transactions(args.rows)
+
+    print(f"{'format':<16}{'bytes':>14}{'seconds':>10}{'rows/s':>12}")
+    for fmt, extension in (("csv", "csv"), ("parquet", "parquet"), ("arrow", "arrow"), ("ndjson", "ndjson")):
+        try:
+            payload = encode(df, fmt)
+        except ImportError:
+            print(f"{fmt:<16}{'skipped (pyarrow not installed)':>36}")
+            continue
+        start = time.perf_counter()
+        response = client.post("/api/upload/transactions", files={"file": (f"bench.{extension}", payload)})
+        elapsed = time.perf_counter() - start
+        response.raise_for_status()
+        print(f"{fmt:<16}{len(payload):>14}{elapsed:>10.2f}{args.rows / elapsed:>12.0f}")
+
+    payload = encode(df, "ndjson")
+    chunk_size = 64 * 1024
+
+    def stream():
+        for offset in range(0, len(payload), chunk_size):
+            yield payload[offset:offset + chunk_size]
+
+    start = time.perf_counter()
+    response = client.post("/api/transactions/bulk", content=stream())
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    print(f"{'ndjson (bulk)':<16}{len(payload):>14}{elapsed:>10.2f}{args.rows / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
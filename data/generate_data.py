@@ -0,0 +1,328 @@
+"""
+Synthetic data at benchmark scale.
+
+Generates accounts, transactions, holdings (as tax lots) and daily price
+histories with vectorized NumPy from a fixed seed over a history ending on
+a fixed date (``--end``, DEFAULT_END unless given), so the same arguments
+always produce the same dataset whatever day it runs. Transactions are generated in chunks that
+each cover a consecutive slice of the date range, so memory stays flat from
+1K to 100M rows and ids grow with dates as they would in real use.
+
+Datasets are either loaded into the database through the regular bulk paths
+(``ingest.ingest_transactions`` per chunk, bulk inserts for accounts, lots
+and prices) or written as upload-ready CSV or Parquet files:
+
+    python data/generate_data.py --transactions 1M                      # load into DATABASE_URL
+    python data/generate_data.py --transactions 10M --tenant bench      # load into one tenant
+    python data/generate_data.py --transactions 100M --format parquet --output /tmp/dataset
+    python data/generate_data.py --transactions 1M --end 2026-06-30 --years 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# Last day of generated history unless --end is given
+DEFAULT_END = date(2025, 12, 31)
+
+# (description, category, typical amount, spread of the log-normal amount, account type, weight)
+TEMPLATES = [
+    ("Monthly Salary - Tech Corp", "Salary", 6500.00, 0.02, "checking", 1.0),
+    ("Freelance Project", "Salary", 1200.00, 0.40, "checking", 0.3),
+    ("Interest Payment", "Income", 12.50, 0.50, "savings", 1.0),
+    ("Whole Foods Market", "Food", 85.50, 0.35, "credit", 6.0),
+    ("Grocery Store", "Food", 120.30, 0.30, "checking", 5.0),
+    ("Starbucks Coffee", "Food", 12.75, 0.25, "credit", 8.0),
+    ("Local Restaurant", "Food", 45.00, 0.40, "credit", 4.0),
+    ("Food Delivery", "Food", 25.50, 0.30, "credit", 4.0),
+    ("Gas Station", "Transport", 55.00, 0.25, "credit", 3.0),
+    ("Uber Ride", "Transport", 18.50, 0.45, "credit", 3.0),
+    ("Parking Fee", "Transport", 15.00, 0.30, "checking", 1.5),
+    ("Netflix Subscription", "Entertainment", 15.99, 0.01, "credit", 1.0),
+    ("Spotify Premium", "Entertainment", 9.99, 0.01, "credit", 1.0),
+    ("Movie Theater", "Entertainment", 28.00, 0.30, "credit", 1.0),
+    ("Amazon Purchase", "Shopping", 67.99, 0.70, "credit", 5.0),
+    ("Target", "Shopping", 89.50, 0.50, "credit", 2.0),
+    ("Electronics Store", "Shopping", 299.99, 0.60, "credit", 0.5),
+    ("Electric Bill", "Bills", 125.50, 0.15, "checking", 1.0),
+    ("Internet & Cable", "Bills", 89.99, 0.02, "checking", 1.0),
+    ("Phone Bill", "Bills", 65.00, 0.05, "checking", 1.0),
+    ("Rent Payment", "Bills", 2200.00, 0.01, "checking", 1.0),
+    ("Doctor Visit", "Healthcare", 150.00, 0.40, "credit", 0.5),
+    ("Pharmacy", "Healthcare", 25.99, 0.50, "credit", 1.5),
+    ("401k Contribution", "Investment", 750.00, 0.01, "investment", 1.0),
+    ("Stock Purchase", "Investment", 1000.00, 0.60, "investment", 0.5),
+]
+INCOME_CATEGORIES = ("Salary", "Income")
+# Retail descriptions carry a store number this often, as card statements do
+STORE_SUFFIX_SHARE = 0.5
+STORES = 500
+
+ACCOUNT_NAMES = {
+    "checking": "Chase Checking",
+    "savings": "Wells Fargo Savings",
+    "credit": "Chase Sapphire Credit",
+    "investment": "Vanguard 401k",
+}
+ACCOUNT_TYPES = ("checking", "credit", "savings", "investment")
+
+SYMBOLS = ["SPY", "VTI", "QQQ", "AAPL", "MSFT", "GOOGL", "NVDA", "TSLA", "VTIAX", "BND", "VGIT", "VHT", "VIG", "VNQ"]
+# Simulated with low drift and volatility
+BOND_SYMBOLS = ("BND", "VGIT")
+
+
+def parse_count(value: str) -> int:
+    """``"250K"``, ``"10M"`` or a plain number"""
+    scale = {"K": 1_000, "M": 1_000_000}.get(value[-1:].upper(), 1)
+    number = value[:-1] if scale > 1 else value
+    try:
+        return int(float(number) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a count: {value}")
+
+
+def make_accounts(count: int, seed: int) -> pd.DataFrame:
+    """Accounts cycling through the account types, in the accounts upload format"""
+    rng = np.random.default_rng([seed, 0])
+    types = np.array([ACCOUNT_TYPES[i % len(ACCOUNT_TYPES)] for i in range(count)], dtype=object)
+    names = [
+        ACCOUNT_NAMES[kind] if i < len(ACCOUNT_TYPES) else f"{ACCOUNT_NAMES[kind]} {i // len(ACCOUNT_TYPES) + 1}"
+        for i, kind in enumerate(types)
+    ]
+    opening = np.round(rng.lognormal(np.log(5000.0), 1.0, count), 2)
+    opening[types == "credit"] = 0.0
+    return pd.DataFrame({"name": names, "account_type": types, "balance": opening})
+
+
+def chunk_ranges(rows: int, chunk_size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, rows, chunk_size):
+        yield start, min(start + chunk_size, rows)
+
+
+def make_transactions(accounts: pd.DataFrame, rows: int, start: date, end: date, seed: int,
+                      chunk_size: int = 1_000_000) -> Iterator[pd.DataFrame]:
+    """
+    Chunks of transactions in the upload format (date, amount, description,
+    category, account_name) dated from ``start`` to the end of ``end``, both
+    days included. Chunk i covers the i-th slice of that range, so the chunks
+    come out in date order.
+    """
+    descriptions, categories, amounts, spreads, kinds, weights = (np.array(column) for column in zip(*TEMPLATES))
+    weights = weights.astype(float) / weights.astype(float).sum()
+    signs = np.where(np.isin(categories, INCOME_CATEGORIES), 1.0, -1.0)
+    retail = np.isin(categories, ("Food", "Transport", "Shopping", "Healthcare"))
+    names_by_type = {kind: accounts.loc[accounts["account_type"] == kind, "name"].to_numpy(dtype=object)
+                     for kind in ACCOUNT_TYPES}
+    all_names = accounts["name"].to_numpy(dtype=object)
+
+    total_seconds = ((end - start).days + 1) * 86400
+    origin = np.datetime64(start, "s")
+    for index, (first, last) in enumerate(chunk_ranges(rows, chunk_size)):
+        rng = np.random.default_rng([seed, 1, index])
+        count = last - first
+        picks = rng.choice(len(TEMPLATES), size=count, p=weights)
+
+        low, high = total_seconds * first // rows, total_seconds * last // rows
+        offsets = np.sort(rng.integers(low, max(high, low + 1), count))
+        amount = amounts[picks].astype(float) * rng.lognormal(0.0, spreads[picks].astype(float)) * signs[picks]
+
+        description = pd.Series(descriptions[picks], dtype=object)
+        suffixed = retail[picks] & (rng.random(count) < STORE_SUFFIX_SHARE)
+        description[suffixed] = description[suffixed] + " #" + pd.Series(
+            rng.integers(1, STORES + 1, int(suffixed.sum())), dtype=str
+        ).to_numpy()
+
+        # Each template posts to an account of its type, or any account when there is none
+        account_names = np.empty(count, dtype=object)
+        for kind in ACCOUNT_TYPES:
+            mask = kinds[picks] == kind
+            choices = names_by_type[kind] if len(names_by_type[kind]) else all_names
+            account_names[mask] = choices[rng.integers(0, len(choices), int(mask.sum()))]
+
+        yield pd.DataFrame({
+            "date": origin + offsets.astype("timedelta64[s]"),
+            "amount": np.round(amount, 2),
+            "description": description.to_numpy(),
+            "category": categories[picks],
+            "account_name": account_names,
+        })
+
+
+def make_prices(symbols, start: date, end: date, seed: int) -> pd.DataFrame:
+    """Daily closes (symbol, date, close) from a geometric random walk per symbol"""
+    rng = np.random.default_rng([seed, 2])
+    days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    bonds = np.isin(symbols, BOND_SYMBOLS)
+    drift = np.where(bonds, 0.02, rng.normal(0.07, 0.04, len(symbols))) / 365.0
+    volatility = np.where(bonds, 0.05, rng.uniform(0.12, 0.45, len(symbols))) / np.sqrt(365.0)
+    steps = drift[:, None] - volatility[:, None] ** 2 / 2 + volatility[:, None] * rng.standard_normal((len(symbols), len(days)))
+    steps[:, 0] = 0.0
+    closes = rng.uniform(20.0, 500.0, len(symbols))[:, None] * np.exp(np.cumsum(steps, axis=1))
+    return pd.DataFrame({
+        "symbol": np.repeat(np.asarray(symbols, dtype=object), len(days)),
+        "date": np.tile(days, len(symbols)),
+        "close": np.round(closes.ravel(), 2),
+    })
+
+
+def make_lots(prices: pd.DataFrame, max_lots: int, seed: int) -> pd.DataFrame:
+    """Buy lots per symbol at that day's close, in the investments upload format (one row per lot)"""
+    rng = np.random.default_rng([seed, 3])
+    closes = prices.pivot(index="symbol", columns="date", values="close")
+    symbols = closes.index.to_numpy(dtype=object)
+    per_symbol = rng.integers(1, max_lots + 1, len(symbols))
+    symbol_index = np.repeat(np.arange(len(symbols)), per_symbol)
+    day_index = rng.integers(0, closes.shape[1], len(symbol_index))
+    matrix = closes.to_numpy()
+    return pd.DataFrame({
+        "symbol": symbols[symbol_index],
+        "shares": np.round(rng.lognormal(np.log(20.0), 0.8, len(symbol_index)), 4),
+        "purchase_price": matrix[symbol_index, day_index],
+        "current_price": matrix[symbol_index, -1],
+        "purchase_date": closes.columns.to_numpy()[day_index],
+    }).sort_values("purchase_date", ignore_index=True)
+
+
+def holding_symbols(count: int):
+    return (SYMBOLS + [f"SYN{i:04d}" for i in range(max(count - len(SYMBOLS), 0))])[:count]
+
+
+def write_files(output: str, fmt: str, accounts: pd.DataFrame, chunks: Iterator[pd.DataFrame],
+                lots: pd.DataFrame, prices: pd.DataFrame) -> int:
+    """Write upload-ready files; transactions are streamed chunk by chunk"""
+    os.makedirs(output, exist_ok=True)
+    accounts.to_csv(os.path.join(output, "accounts.csv"), index=False)
+    lots.to_csv(os.path.join(output, "investments.csv"), index=False, date_format="%Y-%m-%d")
+    prices.to_csv(os.path.join(output, "prices.csv"), index=False)
+
+    path = os.path.join(output, f"transactions.{fmt}")
+    written = 0
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow")
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(path, "w", newline="") as handle:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(handle, index=False, header=i == 0, date_format="%Y-%m-%d %H:%M:%S")
+                written += len(chunk)
+    return written
+
+
+def load_database(tenant: Optional[str], accounts: pd.DataFrame, chunks: Iterator[pd.DataFrame],
+                  lots: pd.DataFrame, prices: pd.DataFrame) -> int:
+    """
+    Load the dataset into ``tenant`` (default: DEFAULT_TENANT), which must
+    have no accounts yet, through the bulk write paths; returns the number
+    of transactions added
+    """
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import insert
+
+    from models import DEFAULT_TENANT, Account, Price, create_tables, upsert_insert
+    from ingest import ingest_transactions
+    from lots import add_lots, sync_positions
+    from balances import rebuild_checkpoints
+    from search import create_search_index
+    from tenancy import engine_for, tenant_session
+
+    tenant = tenant or DEFAULT_TENANT
+    create_tables()
+    create_search_index(engine_for(tenant))
+    db = tenant_session(tenant)
+    try:
+        if db.query(Account.id).first() is not None:
+            raise SystemExit(f"Tenant {tenant} already has accounts; load into an empty tenant or database")
+        account_ids = db.execute(
+            insert(Account).returning(Account.id, sort_by_parameter_order=True),
+            [
+                {"name": row.name, "account_type": row.account_type, "balance": row.balance, "opening_balance": row.balance}
+                for row in accounts.itertuples(index=False)
+            ]
+        ).scalars().all()
+        ids = dict(zip(accounts["name"], account_ids))
+
+        insert_stmt = upsert_insert(db.get_bind())(Price)
+        db.execute(
+            insert_stmt.on_conflict_do_update(index_elements=["symbol", "date"], set_={"close": insert_stmt.excluded.close}),
+            prices.assign(date=pd.to_datetime(prices["date"]).dt.date).to_dict("records")
+        )
+        add_lots(db, lots)
+        sync_positions(db, lots["symbol"], lots.groupby("symbol")["current_price"].last().to_dict())
+        db.commit()
+
+        added = 0
+        for chunk in chunks:
+            frame = chunk.assign(account_id=chunk["account_name"].map(ids), currency=None)
+            added += ingest_transactions(db, frame.drop(columns="account_name"))
+            db.commit()
+            print(f"  {added:,} transactions loaded", end="\r", flush=True)
+        print()
+        # Checkpoints for every month end the history now spans
+        rebuild_checkpoints(db)
+        db.commit()
+        return added
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=parse_count, default=parse_count("100K"),
+                        help="transactions to generate, e.g. 1K, 250K, 10M, 100M (default 100K)")
+    parser.add_argument("--accounts", type=int, default=8, help="accounts, cycling through the account types")
+    parser.add_argument("--holdings", type=int, default=len(SYMBOLS), help="symbols held")
+    parser.add_argument("--max-lots", type=int, default=5, help="most buy lots per symbol")
+    parser.add_argument("--years", type=float, default=3.0, help="history length ending on --end")
+    parser.add_argument("--end", type=date.fromisoformat, default=DEFAULT_END,
+                        help=f"last day of the history, YYYY-MM-DD (default {DEFAULT_END.isoformat()})")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=parse_count, default=parse_count("100K"),
+                        help="transactions generated (and ingested) per chunk")
+    parser.add_argument("--format", choices=("db", "csv", "parquet"), default="db",
+                        help="load into the database (default) or write upload-ready files")
+    parser.add_argument("--output", default="dataset", help="directory for csv/parquet output")
+    parser.add_argument("--tenant", default=None, help="tenant to load into (default: DEFAULT_TENANT)")
+    args = parser.parse_args()
+
+    end = args.end
+    start = end - timedelta(days=int(args.years * 365))
+    accounts = make_accounts(args.accounts, args.seed)
+    prices = make_prices(holding_symbols(args.holdings), start, end, args.seed)
+    lots = make_lots(prices, args.max_lots, args.seed)
+    chunks = make_transactions(accounts, args.transactions, start, end, args.seed, args.chunk_size)
+
+    began = time.perf_counter()
+    if args.format == "db":
+        count = load_database(args.tenant, accounts, chunks, lots, prices)
+        where = "the database"
+    else:
+        count = write_files(args.output, args.format, accounts, chunks, lots, prices)
+        where = args.output
+    elapsed = time.perf_counter() - began
+    print(f"{count:,} transactions, {len(accounts)} accounts, {len(lots)} lots over {args.holdings} symbols "
+          f"and {len(prices):,} prices from {start} to {end} -> {where} "
+          f"({elapsed:.1f}s, {count / max(elapsed, 1e-9):,.0f} transactions/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
+import os
 import sys
-sys.path.append('../backend')
 
-from models import Account, Transaction, Investment, Budget, create_tables, SessionLocal
+# Resolve the backend relative to this file, so the script runs from any directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from models import (
+    Account, Transaction, Investment, Budget, TaxLot, LotSale, UploadedFile, MonthlyRollup, AccountSnapshot,
+    NetWorthSnapshot, BalanceCheckpoint, create_tables, tenant_of, SessionLocal
+)
+from archive import archive_table, archive_years
+from rollups import rebuild_rollups
+from budgets import reconcile_budgets
+from dedup import backfill_fingerprints
+from balances import initialize_opening_balances, rebuild_checkpoints
+from lots import backfill_lots
 from datetime import datetime, timedelta
 import random
 import json
@@ -10,10 +22,21 @@ def add_sample_data():
     create_tables()
     db = SessionLocal()
 
-    # Clear existing data
+    # Clear existing data, along with the archived years and everything derived
+    # from earlier uploads, so the same files can be uploaded again
+    for year in archive_years(db.get_bind()):
+        archived = archive_table(year)
+        db.execute(archived.delete().where(archived.c.tenant_id == tenant_of(db)))
     db.query(Transaction).delete()
+    db.query(UploadedFile).delete()
+    db.query(MonthlyRollup).delete()
+    db.query(BalanceCheckpoint).delete()
+    db.query(AccountSnapshot).delete()
+    db.query(NetWorthSnapshot).delete()
     db.query(Account).delete()
     db.query(Investment).delete()
+    db.query(LotSale).delete()
+    db.query(TaxLot).delete()
     db.query(Budget).delete()
     db.commit()
 
@@ -203,13 +226,13 @@ def add_sample_data():
     # Add comprehensive budget tracking
     current_month = datetime.now().strftime("%Y-%m")
     budgets = [
-        Budget(category="Food", monthly_limit=1000, spent=875.50, month=current_month),
-        Budget(category="Transport", monthly_limit=400, spent=325.75, month=current_month),
-        Budget(category="Entertainment", monthly_limit=300, spent=245.30, month=current_month),
-        Budget(category="Shopping", monthly_limit=600, spent=425.99, month=current_month),
-        Budget(category="Bills", monthly_limit=2800, spent=2650.79, month=current_month),
-        Budget(category="Healthcare", monthly_limit=500, spent=395.99, month=current_month),
-        Budget(category="Investment", monthly_limit=2250, spent=2250.00, month=current_month),
+        Budget(category="Food", monthly_limit=1000, month=current_month),
+        Budget(category="Transport", monthly_limit=400, month=current_month),
+        Budget(category="Entertainment", monthly_limit=300, month=current_month),
+        Budget(category="Shopping", monthly_limit=600, month=current_month),
+        Budget(category="Bills", monthly_limit=2800, month=current_month),
+        Budget(category="Healthcare", monthly_limit=500, month=current_month),
+        Budget(category="Investment", monthly_limit=2250, month=current_month),
     ]
 
     for budget in budgets:
@@ -218,19 +241,29 @@ def add_sample_data():
     # Add previous month's budget for comparison
     prev_month = (datetime.now().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
     prev_budgets = [
-        Budget(category="Food", monthly_limit=1000, spent=920.25, month=prev_month),
-        Budget(category="Transport", monthly_limit=400, spent=380.50, month=prev_month),
-        Budget(category="Entertainment", monthly_limit=300, spent=285.75, month=prev_month),
-        Budget(category="Shopping", monthly_limit=600, spent=545.30, month=prev_month),
-        Budget(category="Bills", monthly_limit=2800, spent=2755.60, month=prev_month),
-        Budget(category="Healthcare", monthly_limit=500, spent=150.00, month=prev_month),
-        Budget(category="Investment", monthly_limit=2250, spent=2250.00, month=prev_month),
+        Budget(category="Food", monthly_limit=1000, month=prev_month),
+        Budget(category="Transport", monthly_limit=400, month=prev_month),
+        Budget(category="Entertainment", monthly_limit=300, month=prev_month),
+        Budget(category="Shopping", monthly_limit=600, month=prev_month),
+        Budget(category="Bills", monthly_limit=2800, month=prev_month),
+        Budget(category="Healthcare", monthly_limit=500, month=prev_month),
+        Budget(category="Investment", monthly_limit=2250, month=prev_month),
     ]
 
     for budget in prev_budgets:
         db.add(budget)
 
     db.commit()
+
+    # Transactions were added through the ORM, so derive rollups, budget spending
+    # and balance checkpoints in one pass each
+    backfill_fingerprints(db)
+    rebuild_rollups(db)
+    reconcile_budgets(db)
+    initialize_opening_balances(db)
+    rebuild_checkpoints(db)
+    backfill_lots(db)
+    db.commit()
     db.close()
     print("Enhanced sample data added successfully!")
     print(f"Added {len(accounts)} accounts")
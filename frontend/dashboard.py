@@ -1,12 +1,15 @@
 import os
 import dash
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, dash_table, Input, Output, State, callback
 import plotly.graph_objects as go
 import plotly.express as px
 import requests
 import pandas as pd
-from datetime import datetime
+import math
+import re
+from datetime import date, datetime, timedelta
 import base64
+import json
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,6 +20,27 @@ API_BASE = os.getenv("API_BASE", "http://localhost:8000/api")
 DASH_HOST = os.getenv("DASH_HOST", "0.0.0.0")
 DASH_PORT = int(os.getenv("DASH_PORT", "8050"))
 DASH_DEBUG = os.getenv("DASH_DEBUG", "False").lower() == "true"
+TRANSACTIONS_PAGE_SIZE = int(os.getenv("TRANSACTIONS_PAGE_SIZE", "50"))
+
+# Transactions grid: the DataTable filter operators each column accepts. The
+# API filters are inclusive ranges, an exact category and a description
+# substring; anything else is rejected rather than loosened.
+FILTER_OPERATORS = {
+    'amount': ('=', '>=', '>', '<=', '<'),
+    'date': ('=', 'contains', '>=', '>', '<=', '<'),
+    'category': ('=',),
+    'description': ('contains',),
+}
+FILTER_HINTS = {
+    'amount': '> 100, <= -20, = 9.99',
+    'date': '2024-03, >= 2024-01-15',
+    'category': '= Food',
+    'description': 'coffee',
+}
+OPERATOR_ALIASES = {
+    'eq': '=', 's=': '=', 'seq': '=', 'ge': '>=', 'gt': '>', 'le': '<=', 'lt': '<',
+    'icontains': 'contains', 'datestartswith': 'contains',
+}
 
 # Clean Blue & White Color Palette
 COLORS = {
@@ -161,7 +185,62 @@ app.layout = html.Div([
             html.Div([
                 html.Div([
                     html.H3("Recent Transactions", style={'color': COLORS['text_dark'], 'margin': '0 0 20px 0', 'font-size': '1.2rem', 'font-weight': '600'}),
-                    html.Div(id='transactions-table')
+                    dash_table.DataTable(
+                        id='transactions-table',
+                        columns=[
+                            {'name': 'Date', 'id': 'date',
+                             'filter_options': {'placeholder_text': FILTER_HINTS['date']}},
+                            {'name': 'Description', 'id': 'description',
+                             'filter_options': {'placeholder_text': FILTER_HINTS['description']}},
+                            {'name': 'Category', 'id': 'category',
+                             'filter_options': {'placeholder_text': FILTER_HINTS['category']}},
+                            {'name': 'Amount', 'id': 'amount', 'type': 'numeric',
+                             'format': dash_table.FormatTemplate.money(2),
+                             'filter_options': {'placeholder_text': FILTER_HINTS['amount']}}
+                        ],
+                        data=[],
+                        page_action='custom',
+                        page_current=0,
+                        page_size=TRANSACTIONS_PAGE_SIZE,
+                        sort_action='custom',
+                        sort_mode='single',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query='',
+                        virtualization=True,
+                        fixed_rows={'headers': True},
+                        style_table={'height': '400px', 'overflowY': 'auto'},
+                        style_cell={
+                            'font-family': 'Inter, -apple-system, sans-serif',
+                            'padding': '0.75rem',
+                            'border': 'none',
+                            'border-bottom': f'1px solid {COLORS["border"]}',
+                            'color': COLORS['text_dark'],
+                            'text-align': 'left',
+                            'minWidth': '90px', 'width': '90px', 'maxWidth': '260px',
+                            'overflow': 'hidden',
+                            'textOverflow': 'ellipsis'
+                        },
+                        style_cell_conditional=[
+                            {'if': {'column_id': 'description'}, 'width': '240px'},
+                            {'if': {'column_id': 'amount'}, 'text-align': 'right'}
+                        ],
+                        style_header={
+                            'font-weight': '600',
+                            'background': COLORS['card_bg'],
+                            'border-bottom': f'2px solid {COLORS["border"]}'
+                        },
+                        style_data_conditional=[
+                            {'if': {'filter_query': '{amount} > 0', 'column_id': 'amount'},
+                             'color': COLORS['success'], 'font-weight': '600'},
+                            {'if': {'filter_query': '{amount} < 0', 'column_id': 'amount'},
+                             'color': COLORS['danger'], 'font-weight': '600'}
+                        ]
+                    ),
+                    html.Div(id='transactions-filter-error',
+                             style={'color': COLORS['danger'], 'margin-top': '0.5rem'}),
+                    # Keyset cursors for the pages visited under the current sort/filter
+                    dcc.Store(id='transactions-cursors', data={})
                 ], style={
                     'background': COLORS['card_bg'],
                     'padding': '1.5rem',
@@ -230,7 +309,6 @@ def safe_api_call(url, default_value=None):
      Output('monthly-expenses', 'children'),
      Output('cash-flow-chart', 'figure'),
      Output('asset-allocation-chart', 'figure'),
-     Output('transactions-table', 'children'),
      Output('monte-carlo-analysis', 'children')],
     [Input('interval-component', 'n_intervals')]
 )
@@ -240,7 +318,6 @@ def update_dashboard(n):
     portfolio_data = safe_api_call(f"{API_BASE}/portfolio/value", {"portfolio_value": 0})
     cash_flow_data = safe_api_call(f"{API_BASE}/cash-flow", {"income": [], "expenses": [], "dates": []})
     asset_allocation_data = safe_api_call(f"{API_BASE}/asset-allocation", {})
-    transactions_data = safe_api_call(f"{API_BASE}/transactions", [])
     monte_carlo_data = safe_api_call(f"{API_BASE}/monte-carlo", {})
     
     # Format key metrics
@@ -304,41 +381,6 @@ def update_dashboard(n):
         showlegend=False
     )
     
-    # Transactions Table
-    transactions_table = html.Div([
-        html.Div([
-            html.Div("Date", style={'font-weight': '600', 'color': COLORS['text_dark']}),
-            html.Div("Description", style={'font-weight': '600', 'color': COLORS['text_dark']}),
-            html.Div("Category", style={'font-weight': '600', 'color': COLORS['text_dark']}),
-            html.Div("Amount", style={'font-weight': '600', 'color': COLORS['text_dark'], 'text-align': 'right'})
-        ], style={
-            'display': 'grid',
-            'grid-template-columns': '1fr 2fr 1fr 1fr',
-            'gap': '1rem',
-            'padding': '0.75rem',
-            'border-bottom': f'2px solid {COLORS["border"]}',
-            'margin-bottom': '0.5rem'
-        })
-    ] + [
-        html.Div([
-            html.Div(transaction['date'][:10], style={'color': COLORS['text_light']}),
-            html.Div(transaction['description'][:30] + ("..." if len(transaction['description']) > 30 else ""), 
-                    style={'color': COLORS['text_dark']}),
-            html.Div(transaction['category'], style={'color': COLORS['text_light']}),
-            html.Div(f"${transaction['amount']:,.2f}", 
-                    style={'color': COLORS['success'] if transaction['amount'] > 0 else COLORS['danger'], 
-                          'text-align': 'right', 'font-weight': '600'})
-        ], style={
-            'display': 'grid',
-            'grid-template-columns': '1fr 2fr 1fr 1fr',
-            'gap': '1rem',
-            'padding': '0.75rem',
-            'border-bottom': f'1px solid {COLORS["border"]}',
-            'border-radius': '4px'
-        })
-        for transaction in transactions_data[:10]  # Show only first 10 transactions
-    ])
-    
     # Monte Carlo Analysis
     monte_carlo_analysis = html.Div([
         html.P("10-Year Portfolio Projections:", style={'font-weight': '600', 'margin-bottom': '1rem', 'color': COLORS['text_dark']}),
@@ -362,7 +404,150 @@ def update_dashboard(n):
     ])
     
     return (net_worth, portfolio_value, monthly_income, monthly_expenses, 
-            cash_flow_fig, asset_allocation_fig, transactions_table, monte_carlo_analysis)
+            cash_flow_fig, asset_allocation_fig, monte_carlo_analysis)
+
+class FilterError(ValueError):
+    """A grid filter the transactions API cannot express"""
+
+def _date_range(value):
+    """First and last day of a YYYY, YYYY-MM or YYYY-MM-DD value"""
+    if not re.fullmatch(r'\d{4}(-\d{2}(-\d{2})?)?', value):
+        raise FilterError(f"{value!r} is not a date (YYYY, YYYY-MM or YYYY-MM-DD)")
+    parts = value.split('-')
+    try:
+        if len(parts) == 1:
+            return date(int(parts[0]), 1, 1), date(int(parts[0]), 12, 31)
+        if len(parts) == 2:
+            first = date(int(parts[0]), int(parts[1]), 1)
+            return first, (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        day = date.fromisoformat(value)
+        return day, day
+    except ValueError:
+        raise FilterError(f"{value!r} is not a date (YYYY, YYYY-MM or YYYY-MM-DD)")
+
+def _amount(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise FilterError(f"{value!r} is not an amount")
+
+def _filter_params(column, operator, value):
+    if column == 'category':
+        return {'category': value}
+    if column == 'description':
+        return {'description': value}
+    if column == 'amount':
+        amount = _amount(value)
+        # Strict bounds: the nearest representable amount past the value
+        return {
+            '=': {'min_amount': amount, 'max_amount': amount},
+            '>=': {'min_amount': amount},
+            '>': {'min_amount': math.nextafter(amount, math.inf)},
+            '<=': {'max_amount': amount},
+            '<': {'max_amount': math.nextafter(amount, -math.inf)},
+        }[operator]
+    first, last = _date_range(value)
+    return {
+        '=': {'start_date': first, 'end_date': last},
+        'contains': {'start_date': first, 'end_date': last},
+        '>=': {'start_date': first},
+        '>': {'start_date': last + timedelta(days=1)},
+        '<=': {'end_date': last},
+        '<': {'end_date': first - timedelta(days=1)},
+    }[operator]
+
+def parse_filter_query(filter_query):
+    """
+    Translate a DataTable filter_query into /api/transactions parameters;
+    raises FilterError for filters the API cannot express
+    """
+    params = {}
+    for part in (filter_query or '').split(' && '):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.startswith('{') or '}' not in part:
+            raise FilterError(f"Unsupported filter: {part}")
+        column, expression = part[1:].split('}', 1)
+        operator, _, value = expression.strip().partition(' ')
+        operator = OPERATOR_ALIASES.get(operator, operator)
+        value = value.strip().strip('"\'')
+        if not value:
+            continue
+        if operator not in FILTER_OPERATORS.get(column, ()):
+            accepted = ', '.join(FILTER_OPERATORS.get(column, ())) or 'no filters'
+            raise FilterError(f"Unsupported filter on {column}: {operator} (accepts {accepted})")
+        params.update({
+            name: bound.isoformat() if isinstance(bound, date) else str(bound)
+            for name, bound in _filter_params(column, operator, value).items()
+        })
+    return params
+
+def fetch_transactions_page(params):
+    """Fetch one page of transactions, returning (rows, next_cursor)"""
+    try:
+        response = requests.get(f"{API_BASE}/transactions", params=params, timeout=10)
+        response.raise_for_status()
+        return response.json(), response.headers.get('X-Next-Cursor')
+    except Exception as e:
+        print(f"API call failed for {API_BASE}/transactions: {e}")
+        return [], None
+
+@app.callback(
+    [Output('transactions-table', 'data'),
+     Output('transactions-table', 'page_count'),
+     Output('transactions-table', 'page_current'),
+     Output('transactions-cursors', 'data'),
+     Output('transactions-filter-error', 'children')],
+    [Input('transactions-table', 'page_current'),
+     Input('transactions-table', 'page_size'),
+     Input('transactions-table', 'sort_by'),
+     Input('transactions-table', 'filter_query'),
+     Input('interval-component', 'n_intervals')],
+    [State('transactions-cursors', 'data')]
+)
+def update_transactions_table(page_current, page_size, sort_by, filter_query, n, cursor_state):
+    """
+    Load only the visible page from the API. Pages are addressed by keyset
+    cursors, so each request costs the same however deep the user browses.
+    """
+    params = {'limit': page_size}
+    try:
+        params.update(parse_filter_query(filter_query))
+    except FilterError as e:
+        # Showing unfiltered rows under a filter would be misleading
+        return [], 1, 0, None, str(e)
+    if sort_by and sort_by[0]['column_id'] in ('date', 'amount', 'category', 'description'):
+        params['sort'] = sort_by[0]['column_id']
+        params['order'] = sort_by[0]['direction']
+
+    # Any change in sort or filters invalidates the cursors collected so far
+    query_key = json.dumps(params, sort_keys=True)
+    if not cursor_state or cursor_state.get('key') != query_key:
+        cursor_state = {'key': query_key, 'cursors': {'0': None}}
+        page_current = 0
+
+    cursors = cursor_state['cursors']
+    page_current = page_current or 0
+    if str(page_current) not in cursors:
+        # Only pages reached sequentially have a cursor; fall back to the furthest known
+        page_current = max(int(page) for page in cursors)
+
+    cursor = cursors[str(page_current)]
+    if cursor:
+        params['cursor'] = cursor
+
+    rows, next_cursor = fetch_transactions_page(params)
+    for row in rows:
+        row['date'] = row['date'][:10]
+
+    if next_cursor:
+        cursors[str(page_current + 1)] = next_cursor
+        page_count = None
+    else:
+        page_count = page_current + 1
+
+    return rows, page_count, page_current, cursor_state, ''
 
 if __name__ == '__main__':
     app.run_server(debug=DASH_DEBUG, host=DASH_HOST, port=DASH_PORT)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Shared fixtures: the API runs against a throwaway SQLite database and every
+test works in a tenant of its own, so tests never see each other's rows.
+"""
+import io
+import os
+import sys
+import tempfile
+import uuid
+
+import pandas as pd
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="fpti-tests-")
+# Before the backend modules read their settings
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ["TENANT_DB_DIR"] = os.path.join(_DB_DIR, "tenants")
+os.environ["SNAPSHOT_INTERVAL_HOURS"] = "0"
+os.environ["ARCHIVE_INTERVAL_HOURS"] = "0"
+os.environ["ADMIN_TOKEN"] = ADMIN_TOKEN = "test-admin-token"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+from tenancy import ADMIN_HEADER, TENANT_HEADER, tenant_session  # noqa: E402
+
+
+@pytest.fixture
+def tenant() -> str:
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def client(tenant) -> TestClient:
+    with TestClient(app, headers={TENANT_HEADER: tenant}) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def other_client() -> TestClient:
+    """Client of a second tenant"""
+    with TestClient(app, headers={TENANT_HEADER: f"test-{uuid.uuid4().hex[:12]}"}) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_headers() -> dict:
+    return {ADMIN_HEADER: ADMIN_TOKEN}
+
+
+@pytest.fixture
+def db(tenant):
+    session = tenant_session(tenant)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def csv_file(rows, name: str = "upload.csv"):
+    """``files=`` argument uploading ``rows`` (list of dicts) as a CSV file"""
+    buffer = io.StringIO()
+    pd.DataFrame(rows).to_csv(buffer, index=False)
+    return {"file": (name, buffer.getvalue().encode("utf-8"))}
+
+
+def upload_transactions(client, rows, name: str = "transactions.csv"):
+    response = client.post("/api/upload/transactions", files=csv_file(rows, name))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def transaction(day: str, amount: float, description: str, category=None, account: str = "Checking", **extra):
+    row = {"date": day, "amount": amount, "description": description, "account_name": account}
+    if category is not None:
+        row["category"] = category
+    row.update(extra)
+    return row
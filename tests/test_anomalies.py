@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from anomalies import robust_z
+from conftest import transaction, upload_transactions
+
+GROCERIES = (55.0, 62.0, 58.0, 61.0, 59.0, 60.0, 57.0)
+
+
+def _history():
+    rows = [
+        transaction(f"2024-{month:02d}-10", -amount, f"FRESHMART #{month}", "Food")
+        for month, amount in enumerate(GROCERIES, start=1)
+    ]
+    # Small price rise on a subscription: within the scale floor
+    rows += [
+        transaction(f"2024-{month:02d}-05", -15.99 if month < 7 else -16.99, "Netflix", "Subscriptions")
+        for month in range(1, 8)
+    ]
+    return rows
+
+
+@pytest.fixture
+def history(client):
+    upload_transactions(client, _history())
+
+
+def test_robust_z_floors_the_scale():
+    z = robust_z(np.array([100.0, 110.0]), np.array([100.0, 100.0]), np.array([0.0, 0.0]))
+    # MAD of 0 falls back to 5% of the median
+    np.testing.assert_allclose(z, [0.0, 0.6745 * 10 / 5])
+
+
+def test_steady_history_has_no_anomalies(client, history):
+    assert client.get("/api/anomalies").json() == []
+
+
+def test_outlier_after_an_upload(client, history):
+    upload_transactions(client, [transaction("2024-08-10", -400.0, "FreshMart #8", "Food")], name="august.csv")
+    anomalies = client.get("/api/anomalies").json()
+    assert [(item["kind"], item["date"][:10]) for item in anomalies] == [
+        # Newest first; a category anomaly is dated at the start of its month
+        ("transaction", "2024-08-10"), ("category", "2024-08-01"),
+    ]
+    outlier, month = anomalies
+    # Expected from the seven earlier charges only
+    assert (outlier["amount"], outlier["expected"], outlier["category"]) == (-400.0, -59.0, "Food")
+    assert outlier["score"] < -3.5
+    assert (month["category"], month["month"], month["amount"], month["expected"]) == ("Food", "2024-08", 400.0, 59.0)
+
+
+def test_filters(client, history):
+    upload_transactions(client, [transaction("2024-08-10", -400.0, "FreshMart #8", "Food")], name="august.csv")
+    assert [item["kind"] for item in client.get("/api/anomalies", params={"kind": "category"}).json()] == ["category"]
+    assert client.get("/api/anomalies", params={"since": "2024-08-02"}).json()[0]["kind"] == "transaction"
+    assert len(client.get("/api/anomalies", params={"since": "2024-08-02"}).json()) == 1
+    assert len(client.get("/api/anomalies", params={"limit": 1}).json()) == 1
+    assert client.get("/api/anomalies", params={"min_score": 1000}).json() == []
+    # Rows below the detection threshold are never kept
+    assert client.get("/api/anomalies", params={"min_score": 1}).status_code == 422
+
+
+def test_short_history_is_not_scored(client):
+    upload_transactions(client, [
+        transaction(f"2024-0{month}-10", -amount, "Bakery", "Food")
+        for month, amount in ((1, 5.0), (2, 5.0), (3, 5.0), (4, 500.0))
+    ])
+    assert client.get("/api/anomalies").json() == []
+
+
+def test_price_rise_does_not_flag_earlier_charges(client):
+    rows = [
+        transaction(f"2023-{month:02d}-03", -10.0 if month <= 5 else -15.0, "Gym", "Health")
+        for month in range(1, 13)
+    ]
+    upload_transactions(client, rows)
+    flagged = [item["date"][:10] for item in client.get("/api/anomalies", params={"kind": "transaction"}).json()]
+    # Only the first higher charges stand out, until the trailing median catches up
+    assert flagged and min(flagged) == "2023-06-03"
+
+
+def test_back_dated_rows_rescore_later_charges(client):
+    upload_transactions(client, [transaction(f"2023-{month:02d}-03", -10.0, "Gym", "Health") for month in (1, 2, 8)])
+    assert client.get("/api/anomalies").json() == []
+    # Five earlier charges of 40 make the August one of 10 the outlier
+    upload_transactions(client, [
+        transaction(f"2023-{month:02d}-03", -40.0, "Gym", "Health") for month in range(3, 8)
+    ], name="back-dated.csv")
+    flagged = [item["date"][:10] for item in client.get("/api/anomalies", params={"kind": "transaction"}).json()]
+    assert "2023-08-03" in flagged and "2023-01-03" not in flagged
@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from archive import archive_table, archive_transactions, compact_database, transactions_source
+from conftest import transaction, upload_transactions
+from models import Transaction, engine, tenant_of
+
+RECENT = (date.today() - timedelta(days=3)).isoformat()
+OLD_ROWS = [
+    transaction("2019-03-01", -12.5, "Corner bakery"),
+    transaction("2019-07-14", -80.0, "Hardware store", "Home"),
+    transaction("2020-01-05", 1500.0, "Salary", "Income"),
+]
+HOT_ROWS = [transaction(RECENT, -9.0, "Corner bakery", "Food")]
+
+
+@pytest.fixture
+def archived(client, db):
+    upload_transactions(client, OLD_ROWS + HOT_ROWS)
+    before = client.get("/api/transactions", params={"limit": 1000}).json()
+    moved = archive_transactions(db, date(2021, 1, 1))
+    assert moved == {2019: 2, 2020: 1}
+    return before
+
+
+def test_archived_rows_leave_the_hot_table(db, archived):
+    hot = db.execute(select(Transaction.description)).scalars().all()
+    assert hot == ["Corner bakery"]
+    table = archive_table(2019)
+    rows_2019 = db.execute(select(table.c.description).where(table.c.tenant_id == tenant_of(db))).scalars().all()
+    assert sorted(rows_2019) == ["Corner bakery", "Hardware store"]
+
+
+def test_listing_unions_the_archive(client, archived):
+    assert client.get("/api/transactions", params={"limit": 1000}).json() == archived
+    recent = client.get("/api/transactions", params={"start_date": "2021-01-01"}).json()
+    assert [row["description"] for row in recent] == ["Corner bakery"]
+    old = client.get("/api/transactions", params={"end_date": "2019-12-31"}).json()
+    assert sorted(row["description"] for row in old) == ["Corner bakery", "Hardware store"]
+
+
+def test_archived_rows_are_not_uploaded_again(client, archived):
+    result = upload_transactions(client, OLD_ROWS, name="again.csv")
+    assert (result["added_count"], result["duplicate_count"]) == (0, 3)
+
+
+def test_search_covers_archived_years(client, archived):
+    results = client.get("/api/transactions/search", params={"q": "bakery"}).json()
+    # Ranked hot rows first, then archived matches
+    assert [(row["date"][:4], row["score"] is None) for row in results] == [(RECENT[:4], False), ("2019", True)]
+    assert client.get("/api/transactions/search", params={"q": "hardware"}).json()[0]["category"] == "Home"
+
+
+def test_recategorize_updates_archived_rows(client, db, archived):
+    client.post("/api/categorization/rules", params={"category": "Food", "pattern": "bakery"})
+    result = client.post("/api/categorization/apply").json()
+    assert result["updated_count"] == 1
+    source = transactions_source(db)
+    categories = dict(db.execute(select(source.date, source.category).where(source.description == "Corner bakery")).all())
+    assert {day.year: category for day, category in categories.items()} == {2019: "Food", int(RECENT[:4]): "Food"}
+
+
+def test_new_sqlite_databases_vacuum_incrementally(archived):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+    compact_database(engine)
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from conftest import csv_file, transaction, upload_transactions
+from models import Account
+
+ACCOUNTS = 1200
+
+
+@pytest.fixture
+def many_accounts(client):
+    names = [f"Account {number:04d}" for number in range(ACCOUNTS)]
+    accounts = pd.DataFrame({"name": names, "account_type": "checking", "balance": 100.0})
+    response = client.post("/api/upload/accounts", files=csv_file(accounts.to_dict("records"), "accounts.csv"))
+    assert response.status_code == 200, response.text
+    upload_transactions(client, [
+        transaction(day, amount, f"{name} {day}", account=name)
+        for name in names
+        for day, amount in (("2024-01-10", -10.0), ("2024-02-10", 25.0), ("2024-02-20", -5.0))
+    ])
+    return names
+
+
+def test_checkpoints_cover_more_accounts_than_one_query_can(client, many_accounts):
+    response = client.post("/api/balances/checkpoints", params={"rebuild": True})
+    assert response.status_code == 200, response.text
+    assert response.json()["count"] > 0
+
+    # Seeks from the 2024-01-31 checkpoint of every account
+    response = client.get("/api/balances/checkpoints", params={"as_of": "2024-02-15"})
+    assert response.status_code == 200, response.text
+    balances = response.json()["accounts"]
+    assert len(balances) == ACCOUNTS
+    # Accounts start at their uploaded balance of 100
+    assert {row["balance"] for row in balances} == {115.0}
+    assert {row["checkpoint_date"] for row in balances} == {"2024-01-31"}
+    assert {row["transaction_count"] for row in balances} == {2}
+
+    # Nothing new to add once every account is checkpointed
+    assert client.post("/api/balances/checkpoints").json()["count"] == 0
+    checkpoints = client.get(f"/api/accounts/{balances[0]['account_id']}/checkpoints",
+                             params={"end_date": "2024-03-31"}).json()
+    assert [(row["date"], row["balance"]) for row in checkpoints] == [
+        ("2024-01-31", 90.0), ("2024-02-29", 110.0), ("2024-03-31", 110.0)
+    ]
+
+
+def test_balances_without_checkpoints(client, many_accounts):
+    response = client.get("/api/balances/checkpoints", params={"as_of": "2024-01-31"})
+    assert response.status_code == 200, response.text
+    balances = response.json()["accounts"]
+    assert len(balances) == ACCOUNTS
+    assert {row["balance"] for row in balances} == {90.0}
+    assert {row["checkpoint_date"] for row in balances} == {None}
+
+
+@pytest.fixture
+def checking(client, db):
+    accounts = [{"name": "Checking", "account_type": "checking", "balance": 100.0}]
+    assert client.post("/api/upload/accounts", files=csv_file(accounts, "accounts.csv")).status_code == 200
+    upload_transactions(client, [
+        transaction("2024-01-05", -30.0, "Groceries"),
+        transaction("2024-01-05", 200.0, "Salary"),
+        transaction("2024-02-01", -50.0, "Rent"),
+        transaction("2024-03-01", -20.0, "Phone"),
+    ])
+    return db.query(Account.id).filter(Account.name == "Checking").scalar()
+
+
+def test_running_balances(client, checking):
+    rows = client.get(f"/api/accounts/{checking}/balances").json()["transactions"]
+    # Same-day rows run in id order
+    assert [(row["description"], row["balance"]) for row in rows] == [
+        ("Groceries", 70.0), ("Salary", 270.0), ("Rent", 220.0), ("Phone", 200.0)
+    ]
+
+    # A later range starts from the balance the day before it
+    window = client.get(f"/api/accounts/{checking}/balances",
+                        params={"start_date": "2024-02-01", "end_date": "2024-02-29"}).json()["transactions"]
+    assert [(row["description"], row["balance"]) for row in window] == [("Rent", 220.0)]
+
+
+def test_balance_as_of(client, checking):
+    client.post("/api/balances/checkpoints")
+    expected = {"2024-01-04": 100.0, "2024-01-31": 270.0, "2024-02-15": 220.0, "2024-12-31": 200.0}
+    for as_of, balance in expected.items():
+        response = client.get(f"/api/accounts/{checking}/balance", params={"as_of": as_of})
+        assert response.status_code == 200, response.text
+        assert response.json()["balance"] == balance
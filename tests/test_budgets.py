@@ -0,0 +1,71 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from budgets import compute_budget_deltas
+from conftest import transaction, upload_transactions
+from models import Budget
+
+
+@pytest.fixture
+def budgets(db):
+    this_month = date.today().strftime("%Y-%m")
+    db.add_all([
+        Budget(category="Food", monthly_limit=300.0, month="2024-03"),
+        Budget(category="Transport", monthly_limit=100.0, month="2024-03"),
+        Budget(category="Food", monthly_limit=250.0, month=this_month),
+    ])
+    db.commit()
+    return this_month
+
+
+def _spent(db):
+    db.expire_all()
+    return {(budget.category, budget.month): budget.spent for budget in db.query(Budget)}
+
+
+def test_compute_budget_deltas_nets_refunds_and_skips_uncategorized():
+    deltas = compute_budget_deltas(pd.DataFrame({
+        "category": ["Food", "Food", None, "Food"],
+        "amount": [-40.0, 10.0, -99.0, -5.0],
+        "date": pd.to_datetime(["2024-03-01", "2024-03-09", "2024-03-02", "2024-04-01"]),
+    }))
+    assert deltas.to_dict("records") == [
+        {"category": "Food", "month": "2024-03", "delta": 30.0},
+        {"category": "Food", "month": "2024-04", "delta": 5.0},
+    ]
+
+
+def test_ingest_updates_spent(client, db, budgets):
+    upload_transactions(client, [
+        transaction("2024-03-02", -40.0, "Groceries", "Food"),
+        transaction("2024-03-09", 10.0, "Refund", "Food"),
+        transaction("2024-03-10", -12.5, "Bus pass", "Transport"),
+        # No budget for the month or the category: ignored
+        transaction("2024-04-01", -20.0, "Groceries", "Food"),
+        transaction("2024-03-11", -70.0, "Cinema", "Entertainment"),
+    ])
+    upload_transactions(client, [transaction("2024-03-20", -15.0, "Bakery", "Food")], name="late.csv")
+    assert _spent(db) == {("Food", "2024-03"): 45.0, ("Transport", "2024-03"): 12.5, ("Food", budgets): 0.0}
+
+
+def test_current_month_budget(client, budgets):
+    upload_transactions(client, [transaction(f"{budgets}-01", -100.0, "Groceries", "Food")])
+    assert client.get("/api/budget").json() == [
+        {"category": "Food", "limit": 250.0, "spent": 100.0, "remaining": 150.0}
+    ]
+
+
+def test_reconcile_repairs_drift(client, other_client, db, budgets):
+    upload_transactions(client, [transaction("2024-03-02", -40.0, "Groceries", "Food")])
+    # Another tenant's spending never counts
+    upload_transactions(other_client, [transaction("2024-03-02", -500.0, "Groceries", "Food")])
+    db.query(Budget).filter(Budget.category == "Transport").update({"spent": 999.0})
+    db.commit()
+
+    response = client.post("/api/budget/reconcile")
+    assert response.status_code == 200, response.text
+    assert response.json()["updated_count"] == 1
+    assert _spent(db) == {("Food", "2024-03"): 40.0, ("Transport", "2024-03"): 0.0, ("Food", budgets): 0.0}
+    assert client.post("/api/budget/reconcile").json()["updated_count"] == 0
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import main
+from conftest import transaction
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(main, "BULK_BATCH_SIZE", 2)
+
+
+def _post(client, lines):
+    return client.post("/api/transactions/bulk", content="\n".join(lines).encode("utf-8"))
+
+
+def _row(day, description, **drop):
+    row = transaction(day, -5.0, description, "Food")
+    return json.dumps({key: value for key, value in row.items() if key not in drop})
+
+
+def test_rows_are_inserted_in_batches(client):
+    response = _post(client, [_row(f"2024-05-0{day}", f"Lunch {day}") for day in range(1, 6)])
+    assert response.status_code == 200, response.text
+    assert (response.json()["batches"], response.json()["added_count"]) == (3, 5)
+
+
+def test_missing_column_is_rejected_before_anything_is_stored(client):
+    response = _post(client, [_row("2024-05-01", "Lunch", amount=None) for _ in range(3)])
+    assert response.status_code == 400
+    assert client.get("/api/transactions").json() == []
+
+
+def test_field_missing_in_a_later_batch_is_a_row_error(client):
+    lines = [_row("2024-05-01", "Lunch"), _row("2024-05-02", "Dinner"),
+             _row("2024-05-03", "Snack", amount=None), "{not json", _row("2024-05-04", "Coffee")]
+    response = _post(client, lines)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["added_count"] == 3
+    assert sorted(error.split(":")[0] for error in result["errors"]) == ["Row 3", "Row 4"]
+    assert "Row 3: missing value for 'amount'" in result["errors"]
+    descriptions = {row["description"] for row in client.get("/api/transactions").json()}
+    assert descriptions == {"Lunch", "Dinner", "Coffee"}
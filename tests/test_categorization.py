@@ -0,0 +1,124 @@
+import re
+
+import pandas as pd
+import pytest
+
+from categorization import RuleMatcher, _trie_pattern
+from conftest import transaction, upload_transactions
+from models import CategoryRule
+
+
+def _rule(category, pattern=None, match_type="keyword", min_amount=None, max_amount=None):
+    return CategoryRule(category=category, pattern=pattern, match_type=match_type,
+                        min_amount=min_amount, max_amount=max_amount)
+
+
+def _categorize(rules, descriptions, amounts=None):
+    amounts = pd.Series(amounts if amounts is not None else [-1.0] * len(descriptions))
+    return RuleMatcher(rules).categorize(pd.Series(descriptions), amounts).tolist()
+
+
+def test_trie_pattern_matches_every_word():
+    words = ["uber", "uber eats", "ubs", "shell", "she"]
+    pattern = re.compile(f"^(?:{_trie_pattern(words)})$")
+    assert all(pattern.match(word) for word in words)
+    assert not pattern.match("ube") and not pattern.match("shel")
+
+
+def test_keywords_ignore_case_and_spacing():
+    rules = [_rule("Transport", "uber"), _rule("Food", "uber eats"), _rule("Groceries", "whole foods")]
+    assert _categorize(rules, ["UBER  EATS order", "Uber trip", "WHOLE\tFOODS #12", "Cinema", None]) == [
+        # Earlier rules win even when a later keyword is longer
+        "Transport", "Transport", "Groceries", None, None,
+    ]
+
+
+def test_priority_across_rule_types():
+    rules = [_rule("Coffee", r"^star\w+", match_type="regex"), _rule("Food", "starbucks")]
+    assert _categorize(rules, ["Starbucks 123"]) == ["Coffee"]
+    assert _categorize(rules[::-1], ["Starbucks 123"]) == ["Food"]
+
+
+def test_amount_bounds():
+    rules = [
+        _rule("Big purchase", "amazon", max_amount=-100.0),
+        _rule("Shopping", "amazon"),
+        _rule("Income", min_amount=0.01),
+    ]
+    assert _categorize(rules, ["AMAZON", "AMAZON", "Salary", "Fee"], [-250.0, -20.0, 3000.0, -5.0]) == [
+        "Big purchase", "Shopping", "Income", None,
+    ]
+
+
+@pytest.fixture
+def rules(client):
+    for params in ({"category": "Transport", "pattern": "uber"},
+                   {"category": "Food", "pattern": r"grocer(y|ies)", "match_type": "regex", "priority": 50}):
+        response = client.post("/api/categorization/rules", params=params)
+        assert response.status_code == 200, response.text
+    return client.get("/api/categorization/rules").json()
+
+
+def test_rules_are_listed_by_priority(rules):
+    assert [(rule["category"], rule["priority"]) for rule in rules] == [("Food", 50), ("Transport", 100)]
+
+
+@pytest.mark.parametrize("params", [
+    {"category": " ", "pattern": "x"},
+    {"category": "Food", "match_type": "glob", "pattern": "x"},
+    {"category": "Food"},
+    {"category": "Food", "pattern": "(", "match_type": "regex"},
+    {"category": "Food", "min_amount": 5, "max_amount": 1},
+    # Group references would point into other rules once combined
+    {"category": "Food", "pattern": r"(a)\1", "match_type": "regex"},
+    {"category": "Food", "pattern": r"(a)(?(1)b|c)", "match_type": "regex"},
+    {"category": "Food", "pattern": r"(?P<x>a)(?P=x)", "match_type": "regex"},
+])
+def test_invalid_rules_are_rejected(client, params):
+    assert client.post("/api/categorization/rules", params=params).status_code == 400
+
+
+def test_groups_and_escaped_backslashes_are_allowed(client):
+    # Numbered groups shift inside the combined matcher but still match alone
+    for pattern in (r"(uber|lyft) trip", r"c:\\1", r"(?:a|b)\d+"):
+        response = client.post("/api/categorization/rules",
+                               params={"category": "Transport", "pattern": pattern, "match_type": "regex"})
+        assert response.status_code == 200, (pattern, response.text)
+    upload_transactions(client, [transaction("2024-01-05", -9.0, "LYFT TRIP"), transaction("2024-01-06", -9.0, "b12")])
+    assert sorted(row["category"] for row in client.get("/api/transactions").json()) == ["Transport", "Transport"]
+
+
+def test_ingest_fills_missing_categories(client, rules):
+    upload_transactions(client, [
+        transaction("2024-01-05", -12.0, "UBER TRIP"),
+        transaction("2024-01-06", -40.0, "Groceries"),
+        transaction("2024-01-07", -9.0, "Uber ride", "Work travel"),
+        transaction("2024-01-08", -15.0, "Cinema"),
+    ])
+    rows = client.get("/api/transactions", params={"sort": "date", "order": "asc"}).json()
+    assert [row["category"] for row in rows] == ["Transport", "Food", "Work travel", None]
+
+
+def test_apply_recategorizes_history(client, other_client):
+    upload_transactions(client, [
+        transaction("2024-01-05", -12.0, "UBER TRIP"),
+        transaction("2024-01-06", -9.0, "Uber ride", "Work travel"),
+    ])
+    upload_transactions(other_client, [transaction("2024-01-05", -12.0, "UBER TRIP")])
+    client.post("/api/categorization/rules", params={"category": "Transport", "pattern": "uber"})
+
+    assert client.post("/api/categorization/apply").json()["updated_count"] == 1
+    assert client.post("/api/categorization/apply", params={"overwrite": True}).json()["updated_count"] == 1
+    rows = client.get("/api/transactions").json()
+    assert {row["category"] for row in rows} == {"Transport"}
+    # Derived data follows the new categories
+    breakdown = client.get("/api/analytics/categories", params={"start_month": "2024-01", "end_month": "2024-01"}).json()
+    assert [(row["category"], row["count"]) for row in breakdown] == [("Transport", 2)]
+    # The other tenant's rows are untouched
+    assert [row["category"] for row in other_client.get("/api/transactions").json()] == [None]
+
+
+def test_delete_rule(client, rules):
+    assert client.delete(f"/api/categorization/rules/{rules[0]['id']}").status_code == 200
+    assert client.delete(f"/api/categorization/rules/{rules[0]['id']}").status_code == 404
+    assert [rule["category"] for rule in client.get("/api/categorization/rules").json()] == ["Transport"]
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarTransactionStore, StringDictionary, group_by_period, grouped_median
+from conftest import transaction, upload_transactions
+
+
+def test_string_dictionary_codes_are_stable():
+    dictionary = StringDictionary()
+    np.testing.assert_array_equal(dictionary.encode(["Food", None, "Rent", "Food"]), [0, -1, 1, 0])
+    np.testing.assert_array_equal(dictionary.encode(["Rent", "Travel"]), [1, 2])
+    assert dictionary.code("Travel") == 2 and dictionary.code("Missing") is None
+
+
+def _store(rows):
+    store = ColumnarTransactionStore()
+    store.loaded = True
+    store.append(pd.DataFrame(rows, columns=["id", "date", "amount", "account_id", "category", "description"]))
+    return store
+
+
+def test_group_by_period_weeks_start_on_monday():
+    store = _store([
+        (1, "2024-01-07", -10.0, 1, "Food", "Sunday"),
+        (2, "2024-01-08", -20.0, 1, "Food", "Monday"),
+        (3, "2024-01-14", 50.0, 1, "Income", "Sunday"),
+    ])
+    weeks = group_by_period(store, store.mask(), "W")
+    assert weeks["dates"] == ["2024-01-01", "2024-01-08"]
+    np.testing.assert_array_equal(weeks["income"], [0.0, 50.0])
+    np.testing.assert_array_equal(weeks["expenses"], [10.0, 20.0])
+    np.testing.assert_array_equal(weeks["count"], [1, 2])
+
+
+def test_appends_grow_the_store():
+    store = _store([(1, "2024-01-01", -1.0, 1, "Food", "A")])
+    version = store.version
+    store.append(pd.DataFrame({
+        "id": range(2, 2002), "date": "2024-01-02", "amount": -1.0,
+        "account_id": 1, "category": None, "description": "B",
+    }))
+    assert len(store) == 2001 and store.version == version + 1
+    assert store.ids[-1] == 2001 and store.category_codes[-1] == -1
+
+
+def test_grouped_median():
+    medians = grouped_median(np.array([5.0, 1.0, 3.0, 2.0, 4.0]), np.array([0, 0, 0, 2, 2]), 3)
+    np.testing.assert_array_equal(medians[[0, 2]], [3.0, 3.0])
+    assert np.isnan(medians[1])
+
+
+def test_trends_follow_new_uploads(client):
+    upload_transactions(client, [
+        transaction("2024-01-05", 1000.0, "Salary", "Income"),
+        transaction("2024-01-06", -40.0, "Groceries", "Food"),
+    ])
+    assert client.get("/api/analytics/trends").json()["dates"] == ["2024-01"]
+    version = client.get("/api/analytics/cache").json()["version"]
+
+    # Appended to the loaded store rather than reloaded
+    upload_transactions(client, [transaction("2024-02-06", -60.0, "Groceries", "Food")], name="feb.csv")
+    assert client.get("/api/analytics/cache").json()["version"] == version + 1
+    trends = client.get("/api/analytics/trends").json()
+    assert trends == {
+        "dates": ["2024-01", "2024-02"], "income": [1000.0, 0.0], "expenses": [40.0, 60.0],
+        "net": [960.0, -60.0], "count": [2, 1],
+    }
+
+
+def test_trends_apply_the_list_filters(client, other_client):
+    upload_transactions(client, [
+        transaction("2024-01-05", 1000.0, "Salary", "Income"),
+        transaction("2024-01-06", -40.0, "Groceries", "Food"),
+        transaction("2024-01-07", -25.0, "Groceries", "Food"),
+    ])
+    upload_transactions(other_client, [transaction("2024-01-06", -999.0, "Groceries", "Food")])
+    trends = client.get("/api/analytics/trends", params={"category": "Food", "freq": "D"}).json()
+    assert (trends["dates"], trends["expenses"]) == (["2024-01-06", "2024-01-07"], [40.0, 25.0])
+    assert client.get("/api/analytics/trends", params={"category": "Unknown"}).json()["dates"] == []
+    trends = client.get("/api/analytics/trends", params={"description": "SALA", "freq": "D"}).json()
+    assert (trends["dates"], trends["income"]) == (["2024-01-05"], [1000.0])
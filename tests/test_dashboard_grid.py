@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend"))
+
+import dashboard  # noqa: E402
+from conftest import transaction, upload_transactions  # noqa: E402
+
+
+@pytest.mark.parametrize("query, params", [
+    ("{amount} >= 10 && {category} = \"Food\"", {"min_amount": "10.0", "category": "Food"}),
+    ("{date} < 2024-03-01 && {date} >= 2024-02-01", {"end_date": "2024-02-29", "start_date": "2024-02-01"}),
+    ("{date} > 2024-02", {"start_date": "2024-03-01"}),
+    ("{date} datestartswith 2024-02", {"start_date": "2024-02-01", "end_date": "2024-02-29"}),
+    ("{amount} = -30", {"min_amount": "-30.0", "max_amount": "-30.0"}),
+    ("{amount} > 10 && {amount} lt 20", {"min_amount": "10.000000000000002", "max_amount": "19.999999999999996"}),
+    ("{description} contains coffee", {"description": "coffee"}),
+    ("", {}),
+])
+def test_parse_filter_query(query, params):
+    assert dashboard.parse_filter_query(query) == params
+
+
+@pytest.mark.parametrize("query", [
+    "{category} contains Fo", "{amount} contains 10", "{date} contains 01-05", "{description} = Coffee",
+    "{amount} != 5", "{account} = Checking", "{amount} > ten",
+])
+def test_filters_the_api_cannot_express_are_rejected(query):
+    with pytest.raises(dashboard.FilterError):
+        dashboard.parse_filter_query(query)
+
+
+@pytest.fixture
+def api(client, monkeypatch):
+    """Route the grid's API calls to the test client"""
+    def fetch(params):
+        response = client.get("/api/transactions", params=params)
+        assert response.status_code == 200, response.text
+        return response.json(), response.headers.get("X-Next-Cursor")
+    monkeypatch.setattr(dashboard, "fetch_transactions_page", fetch)
+    upload_transactions(client, [transaction(f"2024-01-{day:02d}", -float(day), f"Shop {day}", "Food")
+                                 for day in range(1, 6)])
+
+
+def test_grid_pages_forward_with_cursors(api):
+    sort_by = [{"column_id": "amount", "direction": "asc"}]
+    rows, page_count, page, state, error = dashboard.update_transactions_table(0, 2, sort_by, "", 0, None)
+    assert ([row["amount"] for row in rows], page_count, page, error) == ([-5.0, -4.0], None, 0, "")
+    assert rows[0]["date"] == "2024-01-05"
+
+    rows, page_count, page, state, _ = dashboard.update_transactions_table(1, 2, sort_by, "", 0, state)
+    assert [row["amount"] for row in rows] == [-3.0, -2.0]
+    rows, page_count, page, state, _ = dashboard.update_transactions_table(2, 2, sort_by, "", 0, state)
+    assert ([row["amount"] for row in rows], page_count) == ([-1.0], 3)
+
+
+def test_grid_resets_to_the_first_page_when_filters_change(api):
+    _, _, _, state, _ = dashboard.update_transactions_table(0, 2, None, "", 0, None)
+    _, _, _, state, _ = dashboard.update_transactions_table(1, 2, None, "", 0, state)
+    rows, page_count, page, _, _ = dashboard.update_transactions_table(1, 2, None, "{amount} <= -4", 0, state)
+    assert ([row["description"] for row in rows], page_count, page) == (["Shop 5", "Shop 4"], 1, 0)
+
+
+def test_unknown_page_falls_back_to_the_furthest_known(api):
+    _, _, _, state, _ = dashboard.update_transactions_table(0, 2, None, "", 0, None)
+    _, _, page, _, _ = dashboard.update_transactions_table(5, 2, None, "", 0, state)
+    assert page == 1
+
+
+def test_grid_filters_by_description_substring_and_strict_bounds(api):
+    rows, *_ = dashboard.update_transactions_table(0, 10, None, "{description} contains SHOP 4", 0, None)
+    assert [row["description"] for row in rows] == ["Shop 4"]
+    rows, *_ = dashboard.update_transactions_table(0, 10, None, "{amount} < -2 && {amount} > -5", 0, None)
+    assert [row["amount"] for row in rows] == [-4.0, -3.0]
+
+
+def test_grid_shows_unsupported_filters_instead_of_loosening_them(api):
+    rows, page_count, page, state, error = dashboard.update_transactions_table(
+        0, 10, None, "{category} contains Fo", 0, None
+    )
+    assert (rows, page_count, page, state) == ([], 1, 0, None)
+    assert "category" in error and "accepts =" in error
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+from sqlalchemy import create_mock_engine
+from sqlalchemy.pool import QueuePool
+
+import models
+from models import Transaction, make_engine, upsert_insert
+
+
+def test_engine_comes_from_database_url():
+    assert models.engine.url.render_as_string(hide_password=False) == os.environ["DATABASE_URL"]
+
+
+def test_pool_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(models, "DB_MAX_OVERFLOW", 2)
+    monkeypatch.setattr(models, "DB_POOL_TIMEOUT", 7.5)
+    monkeypatch.setattr(models, "DB_POOL_RECYCLE", 60)
+    engine = make_engine(f"sqlite:///{tmp_path}/pool.db")
+    try:
+        assert isinstance(engine.pool, QueuePool)
+        assert (engine.pool.size(), engine.pool._max_overflow, engine.pool._timeout) == (3, 2, 7.5)
+        assert (engine.pool._recycle, engine.pool._pre_ping) == (60, models.DB_POOL_PRE_PING)
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_statement_timeout_waits_for_locks(tmp_path, monkeypatch):
+    monkeypatch.setattr(models, "DB_STATEMENT_TIMEOUT_MS", 2500)
+    engine = make_engine(f"sqlite:///{tmp_path}/timeout.db")
+    try:
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 2500
+    finally:
+        engine.dispose()
+
+
+def test_in_memory_sqlite_keeps_the_default_pool():
+    engine = make_engine("sqlite://")
+    try:
+        assert not isinstance(engine.pool, QueuePool)
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "postgresql://"])
+def test_upserts_compile_for_each_dialect(url):
+    engine = create_mock_engine(url, executor=None)
+    stmt = upsert_insert(engine)(Transaction).on_conflict_do_nothing(index_elements=["fingerprint"])
+    assert "ON CONFLICT (fingerprint) DO NOTHING" in str(stmt.compile(dialect=engine.dialect))
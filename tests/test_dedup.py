@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import main
+from conftest import csv_file, transaction, upload_transactions
+
+ROWS = [
+    transaction("2024-03-01", -4.5, "Coffee", "Food"),
+    transaction("2024-03-01", -4.5, "Coffee", "Food"),
+    transaction("2024-03-02", -60.0, "Groceries", "Food"),
+]
+
+
+def _count(client):
+    return len(client.get("/api/transactions").json())
+
+
+def test_repeated_rows_in_one_file_are_kept(client):
+    assert upload_transactions(client, ROWS)["added_count"] == 3
+
+
+def test_identical_file_is_recognized(client):
+    upload_transactions(client, ROWS)
+    result = upload_transactions(client, ROWS)
+    assert result["added_count"] == 0
+    assert result["message"].startswith("File already uploaded")
+    assert _count(client) == 3
+
+
+def test_reupload_in_another_file_is_deduplicated(client):
+    upload_transactions(client, ROWS)
+    # Same rows, different bytes: cosmetic description changes do not matter
+    result = upload_transactions(client, [dict(row, description="  COFFEE ") for row in ROWS[:2]] + ROWS[2:])
+    assert (result["added_count"], result["duplicate_count"]) == (0, 3)
+
+
+def test_overlapping_statement_adds_only_new_rows(client):
+    upload_transactions(client, ROWS[:1])
+    result = upload_transactions(client, ROWS, name="march.csv")
+    assert (result["added_count"], result["duplicate_count"]) == (2, 1)
+    assert _count(client) == 3
+
+
+def test_file_with_rejected_rows_can_be_uploaded_again(client):
+    rows = ROWS + [transaction("not a date", -1.0, "Broken")]
+    first = upload_transactions(client, rows)
+    assert first["added_count"] == 3 and first["errors"]
+    # Not remembered as processed, so the fixed file is read again
+    fixed = upload_transactions(client, rows[:3] + [transaction("2024-03-03", -1.0, "Broken")])
+    assert not fixed["message"].startswith("File already uploaded")
+    assert (fixed["added_count"], fixed["duplicate_count"]) == (1, 3)
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(main, "BULK_BATCH_SIZE", 1)
+
+
+def _ndjson(rows):
+    return "\n".join(json.dumps(row) for row in rows).encode("utf-8")
+
+
+def test_bulk_repeats_across_batches_are_kept(client, small_batches):
+    response = client.post("/api/transactions/bulk", content=_ndjson(ROWS))
+    assert response.status_code == 200, response.text
+    assert (response.json()["batches"], response.json()["added_count"]) == (3, 3)
+
+    # Re-sending the stream is a no-op
+    response = client.post("/api/transactions/bulk", content=_ndjson(ROWS))
+    assert (response.json()["added_count"], response.json()["duplicate_count"]) == (0, 3)
+    assert _count(client) == 3
+
+
+def test_bulk_then_upload_of_the_same_rows(client, small_batches):
+    client.post("/api/transactions/bulk", content=_ndjson(ROWS))
+    result = client.post("/api/upload/transactions", files=csv_file(ROWS)).json()
+    assert result["added_count"] == 0
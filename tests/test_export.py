@@ -0,0 +1,71 @@
+import io
+
+import pandas as pd
+import pytest
+
+import export
+from conftest import csv_file, transaction, upload_transactions
+
+ROWS = [
+    transaction("2024-01-05", 1000.0, "Salary", "Income"),
+    transaction("2024-01-06", -40.0, "Groceries, weekly", "Food"),
+    transaction("2024-01-07", -15.0, "Unknown shop"),
+]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 1)
+
+
+@pytest.fixture
+def uploaded(client, other_client):
+    upload_transactions(client, ROWS)
+    upload_transactions(other_client, [transaction("2024-01-05", -1.0, "Other tenant")])
+
+
+def test_csv_export_streams_every_row(client, uploaded, small_chunks):
+    response = client.get("/api/export/transactions")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="transactions-' in response.headers["content-disposition"]
+    frame = pd.read_csv(io.StringIO(response.text))
+    assert list(frame.columns) == ["id", "date", "amount", "description", "category", "account"]
+    assert list(frame["description"]) == ["Salary", "Groceries, weekly", "Unknown shop"]
+    assert set(frame["account"]) == {"Checking"}
+    assert frame["category"].isna().tolist() == [False, False, True]
+
+
+def test_csv_export_applies_the_list_filters(client, uploaded):
+    response = client.get("/api/export/transactions", params={"max_amount": 0, "start_date": "2024-01-07"})
+    assert pd.read_csv(io.StringIO(response.text))["description"].tolist() == ["Unknown shop"]
+
+
+def test_empty_export_has_a_header(client):
+    assert client.get("/api/export/transactions").text == "id,date,amount,description,category,account\n"
+
+
+def test_parquet_export(client, uploaded, small_chunks):
+    pytest.importorskip("pyarrow")
+    response = client.get("/api/export/transactions", params={"format": "parquet"})
+    assert response.status_code == 200, response.text
+    frame = pd.read_parquet(io.BytesIO(response.content))
+    assert frame["amount"].tolist() == [1000.0, -40.0, -15.0]
+    assert str(frame["date"].iloc[0]) == "2024-01-05 00:00:00"
+
+
+def test_holdings_export(client):
+    lots = [
+        {"symbol": "EXPTESTA", "shares": 2, "purchase_price": 10.0, "current_price": 12.5, "purchase_date": "2024-01-02"},
+        {"symbol": "EXPTESTB", "shares": 4, "purchase_price": 5.0, "current_price": 6.0, "purchase_date": "2024-01-03"},
+    ]
+    assert client.post("/api/upload/investments", files=csv_file(lots, "lots.csv")).status_code == 200
+    response = client.get("/api/export/holdings", params={"symbol": "EXPTESTA"})
+    frame = pd.read_csv(io.StringIO(response.text))
+    assert frame[["symbol", "shares", "market_value"]].to_dict("records") == [
+        {"symbol": "EXPTESTA", "shares": 2.0, "market_value": 25.0}
+    ]
+
+
+def test_unknown_format_is_rejected(client):
+    assert client.get("/api/export/transactions", params={"format": "xlsx"}).status_code == 422
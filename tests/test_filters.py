@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import transaction, upload_transactions
+
+
+@pytest.fixture
+def rows(client):
+    upload_transactions(client, [
+        transaction("2024-02-01", -15.0, "Cinema", "Fun"),
+        transaction("2024-02-10", -120.0, "Groceries", "Food", account="Card"),
+        transaction("2024-02-29", 2500.0, "Salary", "Income"),
+        transaction("2024-03-01", -30.0, "Dinner", "Food"),
+    ])
+    return client.get("/api/transactions").json()
+
+
+def _descriptions(client, **params):
+    response = client.get("/api/transactions", params=params)
+    assert response.status_code == 200, response.text
+    return [row["description"] for row in response.json()]
+
+
+def test_newest_first_with_account_names(rows):
+    assert [row["description"] for row in rows] == ["Dinner", "Salary", "Groceries", "Cinema"]
+    assert {row["description"]: row["account"] for row in rows}["Groceries"] == "Card"
+
+
+def test_date_range_includes_the_end_day(client, rows):
+    assert _descriptions(client, start_date="2024-02-10", end_date="2024-02-29") == ["Salary", "Groceries"]
+
+
+def test_amount_range_and_category(client, rows):
+    assert _descriptions(client, min_amount=-100, max_amount=0) == ["Dinner", "Cinema"]
+    assert _descriptions(client, category="Food", max_amount=-50) == ["Groceries"]
+
+
+def test_description_substring(client, rows):
+    assert _descriptions(client, description="IN") == ["Dinner", "Cinema"]
+    # LIKE wildcards are matched literally
+    assert _descriptions(client, description="%") == []
+    assert _descriptions(client, description="in", category="Fun") == ["Cinema"]
+
+
+def test_account_filter(client, rows):
+    account_id = next(row for row in client.get("/api/balances/checkpoints").json()["accounts"]
+                      if row["balance"] == -120.0)["account_id"]
+    assert _descriptions(client, account_id=account_id) == ["Groceries"]
+
+
+def test_sort_by_amount(client, rows):
+    assert _descriptions(client, sort="amount", order="asc") == ["Groceries", "Dinner", "Cinema", "Salary"]
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 1001}, {"sort": "fingerprint"}, {"order": "up"}])
+def test_invalid_parameters_are_rejected(client, params):
+    assert client.get("/api/transactions", params=params).status_code == 422
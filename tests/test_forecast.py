@@ -0,0 +1,104 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import csv_file, transaction, upload_transactions
+from forecast import forecast_series, recurring_schedule, seasonal_index
+from fx import record_rates
+from ingest import bump_version_after_commit
+
+
+def _past_months(count):
+    """First day of each of the ``count`` complete months before this one, oldest first"""
+    this_month = pd.Timestamp(date.today()).to_period("M")
+    return [(this_month - offset).start_time for offset in range(count, 0, -1)]
+
+
+def test_seasonal_index_needs_two_years():
+    history = np.tile(np.arange(1.0, 13.0), 2)[None, :]
+    np.testing.assert_array_equal(seasonal_index(history[:, :23], 0), np.ones((1, 12)))
+    np.testing.assert_allclose(seasonal_index(history, 0)[0], np.arange(1.0, 13.0) / 6.5)
+
+
+def test_recurring_schedule_places_occurrences_in_their_months():
+    items = [
+        {"category": "Rent", "type": "expense", "period": "quarterly", "next_date": "2025-02-01",
+         "amount": -900.0, "monthly_amount": -300.0},
+        {"category": None, "type": "income", "period": "weekly", "next_date": "2025-01-30",
+         "amount": 10.0, "monthly_amount": 43.49},
+        {"category": "Unknown", "type": "expense", "period": "monthly", "next_date": "2025-01-01",
+         "amount": -5.0, "monthly_amount": -5.0},
+    ]
+    january_2025 = 2025 * 12
+    scheduled, monthly = recurring_schedule(items, ["Rent", "Uncategorized"], january_2025, 6)
+    np.testing.assert_array_equal(scheduled["expense"][0], [0, 900, 0, 0, 900, 0])
+    # Jan 30, then four Thursdays in February, ...
+    np.testing.assert_array_equal(scheduled["income"][1][:3], [10, 40, 40])
+    np.testing.assert_array_equal(monthly["expense"], [300.0, 0.0])
+
+
+def test_forecast_series_bands_widen_with_the_horizon():
+    history = np.array([[100.0, 120.0, 80.0, 100.0]])
+    mean, lower, upper = forecast_series(history, 0, 4, 3, np.zeros((1, 3)), np.zeros(1), z=1.0)
+    np.testing.assert_allclose(mean, [[100.0, 100.0, 100.0]])
+    width = upper - mean
+    assert np.all(np.diff(width[0]) > 0)
+    np.testing.assert_allclose(mean - lower, width)
+
+
+@pytest.fixture
+def steady_history(client):
+    months = _past_months(12)
+    upload_transactions(client, [
+        row
+        for start in months
+        for row in (
+            transaction(start.replace(day=3).date().isoformat(), 2000.0, "Salary", "Income"),
+            transaction(start.replace(day=12).date().isoformat(), -100.0, "Groceries", "Food"),
+        )
+    ])
+
+
+def test_forecast_from_steady_history(client, steady_history):
+    response = client.get("/api/cash-flow/forecast", params={"months": 3})
+    assert response.status_code == 200, response.text
+    forecast = response.json()
+    next_month = pd.Timestamp(date.today()).to_period("M") + 1
+    assert forecast["months"] == [str(next_month + step) for step in range(3)]
+    categories = {entry["category"]: entry for entry in forecast["categories"]}
+    # Salary on the 3rd of every month is recurring: scheduled, not baseline
+    assert categories["Income"]["income"]["mean"] == [2000.0] * 3
+    assert categories["Food"]["expenses"] == {"mean": [100.0] * 3, "lower": [100.0] * 3, "upper": [100.0] * 3}
+    assert forecast["totals"]["net"] == [1900.0] * 3
+
+
+def test_forecast_follows_new_uploads(client, steady_history):
+    client.get("/api/cash-flow/forecast")
+    last_month = _past_months(1)[0].replace(day=20).date().isoformat()
+    upload_transactions(client, [transaction(last_month, -1200.0, "Laptop", "Shopping")], name="late.csv")
+    categories = {entry["category"] for entry in client.get("/api/cash-flow/forecast").json()["categories"]}
+    assert "Shopping" in categories
+
+
+def test_forecast_is_in_the_base_currency(client, db):
+    # Rates are shared; EUR is only ever stored at 2.0
+    record_rates(db, {"EUR": 2.0}, date(2020, 1, 1))
+    bump_version_after_commit(db, shared=True)
+    db.commit()
+    accounts = [{"name": "Girokonto", "account_type": "checking", "balance": 0.0, "currency": "EUR"}]
+    assert client.post("/api/upload/accounts", files=csv_file(accounts, "accounts.csv")).status_code == 200
+    upload_transactions(client, [
+        transaction(start.replace(day=12).date().isoformat(), -100.0, "Groceries", "Food", account="Girokonto")
+        for start in _past_months(12)
+    ])
+    food, = client.get("/api/cash-flow/forecast", params={"months": 2}).json()["categories"]
+    assert food["expenses"]["mean"] == [200.0, 200.0]
+    breakdown = client.get("/api/analytics/categories").json()
+    assert food["expenses"]["mean"][0] == breakdown[0]["expenses"] / 12
+
+
+def test_forecast_without_history(client):
+    forecast = client.get("/api/cash-flow/forecast", params={"months": 2}).json()
+    assert (len(forecast["months"]), forecast["categories"], forecast["totals"]) == (2, [], None)
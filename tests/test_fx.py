@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from conftest import csv_file, transaction, upload_transactions
+from fx import BASE_CURRENCY, RateTable, StaticRateSource, record_rates, refresh_rates, to_base
+from ingest import bump_version_after_commit
+
+# FX rates are shared by every tenant; these tests only ever store EUR at 2.0
+EUR_RATE = 2.0
+
+
+@pytest.fixture
+def eur_rate(db):
+    record_rates(db, {"EUR": EUR_RATE}, date(2020, 1, 1))
+    bump_version_after_commit(db, shared=True)
+    db.commit()
+
+
+def test_rate_table_looks_up_the_last_rate_on_or_before_each_day():
+    table = RateTable(pd.DataFrame({
+        "currency": ["EUR", "EUR", "GBP"],
+        "date": ["2024-01-01", "2024-02-01", "2024-01-01"],
+        "rate": [1.1, 1.2, 1.3],
+    }))
+    rates = table.rates(["EUR", "eur", "GBP", None, "EUR"],
+                        ["2024-01-15", "2024-02-15", "2024-03-01", "2024-01-01", "2023-12-01"])
+    # Days before the first rate take it; missing currencies are the base currency
+    np.testing.assert_allclose(rates, [1.1, 1.2, 1.3, 1.0, 1.1])
+
+
+def test_rate_table_rejects_currencies_without_rates():
+    table = RateTable(pd.DataFrame({"currency": ["EUR"], "date": ["2024-01-01"], "rate": [1.1]}))
+    with pytest.raises(HTTPException) as raised:
+        table.rates(["EUR", "XTS"])
+    assert raised.value.status_code == 409
+    assert "XTS" in raised.value.detail
+
+
+def test_to_base(db, eur_rate):
+    np.testing.assert_allclose(to_base(db, [10.0, 10.0], ["EUR", BASE_CURRENCY]), [10.0 * EUR_RATE, 10.0])
+
+
+def test_refresh_rates_from_a_static_source(db):
+    source = StaticRateSource({"eur": EUR_RATE, "XTS": 5.0})
+    # Only currencies in use are fetched; a fresh tenant uses none
+    assert refresh_rates(db, source, date(2020, 1, 1)) == {}
+    assert source.fetch(["EUR"], date.today()) == {"EUR": EUR_RATE}
+
+
+def _upload_accounts(client, rows):
+    response = client.post("/api/upload/accounts", files=csv_file(rows, "accounts.csv"))
+    assert response.status_code == 200, response.text
+
+
+def test_net_worth_converts_balances(client, eur_rate):
+    _upload_accounts(client, [
+        {"name": "Checking", "account_type": "checking", "balance": 100.0},
+        {"name": "Girokonto", "account_type": "checking", "balance": 100.0, "currency": "EUR"},
+        {"name": "Card", "account_type": "credit", "balance": 50.0},
+    ])
+    assert client.get("/api/net-worth").json()["net_worth"] == pytest.approx(100.0 + 100.0 * EUR_RATE - 50.0)
+
+
+def test_missing_rate_is_a_conflict(client):
+    _upload_accounts(client, [{"name": "Kyoto", "account_type": "checking", "balance": 100.0, "currency": "XTS"}])
+    response = client.get("/api/net-worth")
+    assert response.status_code == 409
+    assert "XTS" in response.json()["detail"]
+
+
+def test_cash_flow_converts_each_account(client, eur_rate):
+    _upload_accounts(client, [{"name": "Girokonto", "account_type": "checking", "balance": 0.0, "currency": "EUR"}])
+    day = (date.today().replace(day=1) - timedelta(days=1)).isoformat()
+    upload_transactions(client, [
+        transaction(day, 1000.0, "Salary", "Income"),
+        transaction(day, -100.0, "Rent", "Housing", account="Girokonto"),
+    ])
+    cash_flow = client.get("/api/cash-flow").json()
+    assert cash_flow["income"] == [pytest.approx(1000.0 - 100.0 * EUR_RATE)]
+
+
+@pytest.fixture
+def mixed_currency_holdings(client, eur_rate):
+    purchased = (date.today() - timedelta(days=30)).isoformat()
+    lots = [
+        # 10 x 100 USD and 5 x 100 EUR: equal values in the base currency
+        {"symbol": "FXTESTUSD", "shares": 10, "purchase_price": 80.0, "current_price": 100.0,
+         "purchase_date": purchased, "currency": BASE_CURRENCY},
+        {"symbol": "BONDFXTEST", "shares": 5, "purchase_price": 80.0, "current_price": 100.0,
+         "purchase_date": purchased, "currency": "EUR"},
+    ]
+    response = client.post("/api/upload/investments", files=csv_file(lots, "lots.csv"))
+    assert response.status_code == 200, response.text
+
+
+def test_rebalance_agrees_with_the_asset_allocation(client, mixed_currency_holdings):
+    assert client.get("/api/asset-allocation").json() == {"Other": 50.0, "Bonds": 50.0}
+    plan = client.get("/api/portfolio/rebalance", params={"targets": "Bonds=50,Other=50"}).json()
+    assert plan["total_value"] == pytest.approx(2000.0)
+    assert {row["asset_class"]: row["weight"] for row in plan["classes"]} == {"Bonds": 0.5, "Other": 0.5}
+    assert plan["trades"] == []
+
+
+def test_rebalance_trades_in_the_base_currency(client, mixed_currency_holdings):
+    plan = client.get("/api/portfolio/rebalance", params={"targets": "Bonds=75,Other=25", "tolerance": 0}).json()
+    bond = next(trade for trade in plan["trades"] if trade["symbol"] == "BONDFXTEST")
+    assert (bond["action"], bond["amount"]) == ("buy", 500.0)
+    # 500 in the base currency buys 2.5 shares at 100 EUR
+    assert bond["shares"] == pytest.approx(2.5)
+
+
+def test_performance_values_holdings_in_the_base_currency(client, mixed_currency_holdings):
+    performance = client.get("/api/portfolio/performance").json()
+    values = {row["symbol"]: (row["value"], row["invested"]) for row in performance["holdings"]}
+    assert values == {"FXTESTUSD": (1000.0, 800.0), "BONDFXTEST": (1000.0, 800.0)}
+    assert performance["portfolio"]["value"] == pytest.approx(2000.0)
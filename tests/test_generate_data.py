@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "generate_data.py")
+FILES = ("accounts.csv", "investments.csv", "prices.csv", "transactions.csv")
+
+
+def _generate(output, *args):
+    subprocess.run([sys.executable, SCRIPT, "--transactions", "2K", "--chunk-size", "500", "--format", "csv",
+                    "--output", str(output), *args], check=True, capture_output=True)
+    return {name: (output / name).read_bytes() for name in FILES}
+
+
+def test_same_arguments_give_the_same_files(tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+    assert _generate(tmp_path / "first") == _generate(tmp_path / "second")
+
+
+def test_history_ends_on_the_end_date(tmp_path):
+    _generate(tmp_path, "--end", "2022-06-30", "--years", "1")
+    transactions = pd.read_csv(tmp_path / "transactions.csv", parse_dates=["date"])
+    assert len(transactions) == 2000
+    # Both ends of the range are included
+    assert transactions["date"].max().normalize() == pd.Timestamp("2022-06-30")
+    assert transactions["date"].min().normalize() == pd.Timestamp("2021-06-30")
+    prices = pd.read_csv(tmp_path / "prices.csv")
+    assert prices["date"].max() == "2022-06-30"
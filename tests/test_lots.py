@@ -0,0 +1,117 @@
+import pytest
+
+from conftest import csv_file
+from lots import LotMatchError, LotQueue
+from models import Investment
+
+# Three lots of 10 shares; the symbol is only ever used by these tests
+LOTS = [
+    {"symbol": "LOTTEST", "shares": 10, "purchase_price": 100.0, "current_price": 130.0, "purchase_date": "2022-01-03"},
+    {"symbol": "LOTTEST", "shares": 10, "purchase_price": 150.0, "current_price": 130.0, "purchase_date": "2023-06-01"},
+    {"symbol": "LOTTEST", "shares": 10, "purchase_price": 120.0, "current_price": 130.0, "purchase_date": "2024-03-01"},
+]
+
+
+def _queue():
+    return LotQueue([1, 2, 3], [10, 20, 30], [5.0, 5.0, 5.0])
+
+
+def test_fifo_takes_the_oldest_open_lots():
+    queue = _queue()
+    assert queue.take("fifo", 7.0, sold=40) == [(0, 5.0), (1, 2.0)]
+    assert queue.take("fifo", 3.0, sold=40) == [(1, 3.0)]
+
+
+def test_lifo_takes_the_newest_lot_held_on_the_sale_date():
+    queue = _queue()
+    # Lot 3 was bought after the sale
+    assert queue.take("lifo", 7.0, sold=25) == [(1, 5.0), (0, 2.0)]
+    assert queue.take("lifo", 4.0, sold=40) == [(2, 4.0)]
+    assert queue.take("lifo", 4.0, sold=40) == [(2, 1.0), (0, 3.0)]
+
+
+def test_specific_and_short_sales():
+    queue = _queue()
+    assert queue.take("specific", 5.0, sold=40, lot_id=2) == [(1, 5.0)]
+    with pytest.raises(LotMatchError):
+        queue.take("specific", 1.0, sold=40, lot_id=2)
+    with pytest.raises(LotMatchError):
+        queue.take("specific", 1.0, sold=25, lot_id=3)
+    with pytest.raises(LotMatchError):
+        queue.take("fifo", 6.0, sold=25)
+
+
+@pytest.fixture
+def lots(client):
+    response = client.post("/api/upload/investments", files=csv_file(LOTS, "lots.csv"))
+    assert response.status_code == 200, response.text
+    return [lot["lot_id"] for lot in client.get("/api/portfolio/tax-lots").json()]
+
+
+def _sell(client, **params):
+    response = client.post("/api/portfolio/sell", params={"symbol": "LOTTEST", "price": 200.0, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _remaining(client, **params):
+    lots = client.get("/api/portfolio/tax-lots", params={"include_closed": True, **params}).json()
+    return [lot["remaining"] for lot in lots]
+
+
+def test_fifo_sale(client, db, lots):
+    sale = _sell(client, shares=15, sold="2024-02-01T00:00:00")
+    assert [(lot["lot_id"], lot["shares"], lot["gain"], lot["long_term"]) for lot in sale["lots"]] == [
+        (lots[0], 10.0, 1000.0, True), (lots[1], 5.0, 250.0, False),
+    ]
+    assert (sale["proceeds"], sale["cost_basis"], sale["gain"]) == (3000.0, 1750.0, 1250.0)
+    assert _remaining(client) == [0.0, 5.0, 10.0]
+    # The position is rebuilt from the open lots
+    position = db.query(Investment).filter(Investment.symbol == "LOTTEST").one()
+    assert (position.shares, position.purchase_price) == (15.0, pytest.approx((5 * 150.0 + 10 * 120.0) / 15))
+    assert position.purchase_date.date().isoformat() == "2023-06-01"
+
+
+def test_lifo_sale_skips_lots_bought_later(client, lots):
+    sale = _sell(client, shares=15, method="lifo", sold="2024-02-01T00:00:00")
+    assert [(lot["lot_id"], lot["shares"]) for lot in sale["lots"]] == [(lots[1], 10.0), (lots[0], 5.0)]
+
+
+def test_specific_sale_and_dry_run(client, lots):
+    preview = _sell(client, shares=12, method="specific", lot_ids=[lots[2], lots[0]], dry_run=True)
+    assert [(lot["lot_id"], lot["shares"]) for lot in preview["lots"]] == [(lots[2], 10.0), (lots[0], 2.0)]
+    assert _remaining(client) == [10.0, 10.0, 10.0]
+
+    _sell(client, shares=12, method="specific", lot_ids=[lots[2], lots[0]])
+    assert _remaining(client) == [8.0, 10.0, 0.0]
+
+
+def test_sales_that_cannot_be_matched_are_rejected(client, lots):
+    params = {"symbol": "LOTTEST", "price": 200.0}
+    assert client.post("/api/portfolio/sell", params={**params, "shares": 31}).status_code == 400
+    before_first_lot = {**params, "shares": 1, "sold": "2021-12-31T00:00:00"}
+    assert client.post("/api/portfolio/sell", params=before_first_lot).status_code == 400
+    assert client.post("/api/portfolio/sell", params={**params, "shares": 1, "method": "specific"}).status_code == 400
+
+    # A back-dated sale must leave enough shares for the later ones
+    _sell(client, shares=25, sold="2024-04-01T00:00:00")
+    late = client.post("/api/portfolio/sell", params={**params, "shares": 10, "sold": "2024-01-01T00:00:00"})
+    assert late.status_code == 400
+    assert _remaining(client) == [0.0, 0.0, 5.0]
+
+
+def test_gains_report(client, lots):
+    _sell(client, shares=15, sold="2024-02-01T00:00:00")
+    gains = client.get("/api/portfolio/gains").json()
+    assert gains["realized"] == {
+        "proceeds": 3000.0, "cost_basis": 1750.0, "gain": 1250.0, "short_term": 250.0, "long_term": 1000.0,
+        "by_symbol": [{"symbol": "LOTTEST", "proceeds": 3000.0, "cost_basis": 1750.0, "gain": 1250.0,
+                       "short_term": 250.0, "long_term": 1000.0}],
+    }
+    assert (gains["unrealized"]["cost_basis"], gains["unrealized"]["market_value"]) == (1950.0, 1950.0)
+    assert client.get("/api/portfolio/gains", params={"year": 2023}).json()["realized"]["gain"] == 0.0
+
+    # The same sale matched LIFO: 10 from the 150 lot and 5 from the 100 lot
+    lifo = client.get("/api/portfolio/gains", params={"method": "lifo"}).json()
+    assert (lifo["method"], lifo["realized"]["gain"]) == ("lifo", 1000.0)
+    assert _remaining(client, method="lifo") == [5.0, 0.0, 10.0]
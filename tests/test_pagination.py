@@ -0,0 +1,50 @@
+import pytest
+
+from conftest import transaction, upload_transactions
+
+
+def _all_pages(client, **params):
+    ids, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/api/transactions", params=query)
+        assert response.status_code == 200, response.text
+        ids += [row["id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+
+
+@pytest.fixture
+def mixed_categories(client):
+    upload_transactions(client, [
+        transaction("2024-01-01", -10.0, "Coffee", "Food"),
+        transaction("2024-01-02", -20.0, "Bus", ""),
+        transaction("2024-01-03", -30.0, "Lunch", "Food"),
+        transaction("2024-01-04", -40.0, "Taxi", ""),
+        transaction("2024-01-05", -50.0, "Books", "Shopping"),
+    ])
+    return [row["id"] for row in client.get("/api/transactions").json()]
+
+
+@pytest.mark.parametrize("sort", ["date", "amount", "category", "description"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_row_once(client, mixed_categories, sort, order):
+    ids = _all_pages(client, sort=sort, order=order, limit=1)
+    assert sorted(ids) == sorted(mixed_categories)
+    assert len(ids) == len(set(ids))
+
+
+def test_null_categories_sort_first_ascending(client, mixed_categories):
+    rows = client.get("/api/transactions", params={"sort": "category", "order": "asc"}).json()
+    assert [row["category"] for row in rows] == [None, None, "Food", "Food", "Shopping"]
+
+
+def test_filters_and_cursor_combine(client, mixed_categories):
+    ids = _all_pages(client, category="Food", limit=1)
+    rows = {row["id"]: row for row in client.get("/api/transactions").json()}
+    assert sorted(ids) == sorted(i for i, row in rows.items() if row["category"] == "Food")
+
+
+def test_invalid_cursor_is_rejected(client, mixed_categories):
+    assert client.get("/api/transactions", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from conftest import csv_file
+from performance import irr, max_drawdown, return_statistics
+
+
+def test_irr():
+    years = np.array([0.0, 0.5, 1.0])
+    rates = irr(np.array([
+        [-100.0, 0.0, 110.0],
+        [-100.0, -100.0, 0.0],   # no money back: no rate
+        [-100.0, 0.0, 0.0],
+    ]), years)
+    assert rates[0] == pytest.approx(0.1)
+    assert np.isnan(rates[1]) and np.isnan(rates[2])
+
+
+def test_max_drawdown():
+    growth = np.array([[1.0, 1.2, 0.9, 1.3, 1.04], [1.0, 1.1, 1.2, 1.3, 1.4]])
+    np.testing.assert_allclose(max_drawdown(growth), [-0.25, 0.0])
+
+
+def test_return_statistics_skip_days_not_held():
+    stats = return_statistics(np.array([[np.nan, 0.1, -0.5, 1.0]]), risk_free_rate=0.0)
+    assert stats["time_weighted_return"][0] == pytest.approx(1.1 * 0.5 * 2.0 - 1.0)
+    assert stats["max_drawdown"][0] == pytest.approx(-0.5)
+    assert np.isfinite(stats["volatility"][0]) and np.isfinite(stats["sharpe_ratio"][0])
+
+
+def _day(days_ago):
+    return (date.today() - timedelta(days=days_ago)).isoformat()
+
+
+@pytest.fixture
+def two_purchases(client, admin_headers):
+    # PERFTESTA: bought at 100, 150 eleven days ago, now 200. PERFTESTB: flat at 50,
+    # bought ten days ago. Each symbol is one position; prices are only recorded here
+    lots = [
+        {"symbol": "PERFTESTA", "shares": 1, "purchase_price": 100.0, "current_price": 200.0,
+         "purchase_date": _day(20)},
+        {"symbol": "PERFTESTB", "shares": 1, "purchase_price": 50.0, "current_price": 50.0,
+         "purchase_date": _day(10)},
+    ]
+    assert client.post("/api/upload/investments", files=csv_file(lots, "lots.csv")).status_code == 200
+    response = client.post("/api/admin/prices", params={"symbol": "PERFTESTA", "close": 150.0, "date": _day(11)},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+
+def test_time_weighted_return_takes_out_the_deposit(client, two_purchases):
+    response = client.get("/api/portfolio/performance")
+    assert response.status_code == 200, response.text
+    performance = response.json()
+    assert (performance["start_date"], performance["end_date"]) == (_day(20), _day(0))
+
+    portfolio = performance["portfolio"]
+    assert (portfolio["value"], portfolio["invested"]) == (250.0, 150.0)
+    # +50% on 100, nothing on the day 50 came in, then 200 -> 250
+    assert portfolio["time_weighted_return"] == pytest.approx(1.5 * 250.0 / 200.0 - 1.0)
+    assert portfolio["max_drawdown"] == 0.0
+    assert portfolio["irr"] > 0
+
+    growth, flat = performance["holdings"]
+    assert (growth["symbol"], growth["time_weighted_return"]) == ("PERFTESTA", pytest.approx(1.0))
+    assert growth["irr"] == pytest.approx(2.0 ** (365.0 / 20.0) - 1.0, rel=1e-6)
+    assert (flat["time_weighted_return"], flat["irr"], flat["volatility"]) == (0.0, 0.0, 0.0)
+
+
+def test_start_date_values_earlier_purchases_at_market(client, two_purchases):
+    performance = client.get("/api/portfolio/performance", params={"start_date": _day(11)}).json()
+    # PERFTESTA enters at its 150 close, PERFTESTB at cost
+    assert performance["portfolio"]["invested"] == 200.0
+    assert performance["portfolio"]["time_weighted_return"] == pytest.approx(250.0 / 200.0 - 1.0)
+
+
+def test_no_holdings(client):
+    performance = client.get("/api/portfolio/performance").json()
+    assert (performance["portfolio"], performance["holdings"]) == (None, [])
+
+
+def test_partial_sale_pays_out_and_reduces_the_position(client):
+    lot = {"symbol": "PERFTESTS", "shares": 2, "purchase_price": 100.0, "current_price": 200.0,
+           "purchase_date": _day(20)}
+    assert client.post("/api/upload/investments", files=csv_file([lot], "lots.csv")).status_code == 200
+    sale = {"symbol": "PERFTESTS", "shares": 1, "price": 150.0, "sold": f"{_day(10)}T00:00:00"}
+    assert client.post("/api/portfolio/sell", params=sale).status_code == 200
+
+    performance = client.get("/api/portfolio/performance").json()
+    holding, = performance["holdings"]
+    assert (holding["shares"], holding["value"], holding["invested"], holding["proceeds"]) == (1.0, 200.0, 200.0, 150.0)
+    # 100 -> 150 -> 200 whatever was sold on the way
+    assert holding["time_weighted_return"] == pytest.approx(1.0)
+    flows = np.zeros((1, 21))
+    flows[0, [0, 10, 20]] = [-200.0, 150.0, 200.0]
+    assert holding["irr"] == pytest.approx(irr(flows, np.arange(21) / 365.0)[0], rel=1e-6)
+    assert performance["portfolio"]["proceeds"] == 150.0
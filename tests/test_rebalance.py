@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from conftest import csv_file
+from rebalance import class_trades, classify_assets, parse_targets
+
+
+def test_classify_assets():
+    assert classify_assets(["SPY", "BONDX", "AAPL"]).tolist() == ["Stocks", "Bonds", "Other"]
+
+
+def test_parse_targets():
+    assert parse_targets("stocks=60, Bonds=40") == {"Stocks": 0.6, "Bonds": 0.4}
+    assert parse_targets("Stocks=0.75,Bonds=0.25") == {"Stocks": 0.75, "Bonds": 0.25}
+
+
+@pytest.mark.parametrize("targets", ["Stocks=60,Bonds=30", "Stocks=sixty", "Stocks=-10,Bonds=110", ""])
+def test_invalid_targets(targets):
+    with pytest.raises(HTTPException) as raised:
+        parse_targets(targets)
+    assert raised.value.status_code == 400
+
+
+def test_trades_stop_at_the_band_edge():
+    values, targets = np.array([70.0, 30.0]), np.array([0.6, 0.4])
+    np.testing.assert_allclose(class_trades(values, targets, 0.05, 0.0), [-5.0, 5.0])
+    np.testing.assert_allclose(class_trades(values, targets, 0.05, 0.0, to_target=True), [-10.0, 10.0])
+    # Inside the band: nothing to do
+    np.testing.assert_allclose(class_trades(values, targets, 0.15, 0.0), [0.0, 0.0])
+
+
+def test_cash_goes_to_the_most_underweight_class_first():
+    trades = class_trades(np.array([70.0, 30.0]), np.array([0.6, 0.4]), 0.05, 20.0)
+    # 12 lifts bonds to its band, then 8 more fill both up to their targets
+    np.testing.assert_allclose(trades, [2.0, 18.0])
+    trades = class_trades(np.array([70.0, 30.0]), np.array([0.6, 0.4]), 0.05, -10.0)
+    np.testing.assert_allclose(trades.sum(), -10.0)
+    assert trades[0] < 0 and trades[1] >= 0
+
+
+@pytest.fixture
+def holdings(client):
+    lots = [
+        # Old lot with a gain and a recent one at a loss; both now at 100
+        {"symbol": "SPY", "shares": 10, "purchase_price": 50.0, "current_price": 100.0, "purchase_date": "2020-01-02"},
+        {"symbol": "SPY", "shares": 10, "purchase_price": 120.0, "current_price": 100.0, "purchase_date": "2024-06-03"},
+        {"symbol": "BONDTEST", "shares": 5, "purchase_price": 100.0, "current_price": 100.0,
+         "purchase_date": "2024-06-03"},
+    ]
+    response = client.post("/api/upload/investments", files=csv_file(lots, "lots.csv"))
+    assert response.status_code == 200, response.text
+
+
+def _plan(client, **params):
+    params = {"targets": "Stocks=60,Bonds=40", "tolerance": 0, **params}
+    response = client.get("/api/portfolio/rebalance", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_plan_splits_class_trades_over_positions(client, holdings):
+    plan = _plan(client)
+    assert plan["total_value"] == 2500.0
+    assert {row["asset_class"]: (row["weight"], row["trade"]) for row in plan["classes"]} == {
+        "Stocks": (0.8, -500.0), "Bonds": (0.2, 500.0),
+    }
+    trades = {trade["symbol"]: trade for trade in plan["trades"]}
+    assert (trades["SPY"]["action"], trades["SPY"]["shares"]) == ("sell", 5.0)
+    assert (trades["BONDTEST"]["action"], trades["BONDTEST"]["shares"]) == ("buy", 5.0)
+    # Average cost 85: 15% of the proceeds is gain
+    assert trades["SPY"]["estimated_gain"] == 75.0
+    assert plan["turnover"] == 1000.0
+
+
+def test_tax_aware_plan_sells_the_loss_lot(client, holdings):
+    plan = _plan(client, tax_aware=True)
+    spy = next(trade for trade in plan["trades"] if trade["symbol"] == "SPY")
+    assert spy["estimated_gain"] == -100.0
+    assert len(spy["lots"]) == 1 and spy["lots"][0]["shares"] == 5.0
+    lots = client.get("/api/portfolio/tax-lots", params={"symbol": "SPY"}).json()
+    assert {lot["lot_id"]: lot["cost"] for lot in lots}[spy["lots"][0]["lot_id"]] == 120.0
+
+
+def test_new_asset_class_and_cash(client, holdings):
+    plan = _plan(client, targets="Stocks=50,Bonds=30,Other=20", cash=500)
+    other = next(trade for trade in plan["trades"] if trade["asset_class"] == "Other")
+    assert (other["symbol"], other["action"], other["amount"]) == (None, "buy", 600.0)
+    assert client.get("/api/portfolio/rebalance", params={"cash": -5000}).status_code == 400
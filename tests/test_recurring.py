@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import transaction, upload_transactions
+from recurring import normalize_merchant
+
+MONTHS = range(1, 7)
+
+
+def _history():
+    rows = [
+        transaction(f"2024-{month:02d}-05", -15.99, f"NETFLIX.COM {8840 + month}", "Subscriptions")
+        for month in MONTHS
+    ]
+    # One-off purchase at the same merchant, far outside the subscription's amount band
+    rows.append(transaction("2024-03-18", -120.0, "Netflix.com gift", "Gifts"))
+    start = date(2024, 1, 5)
+    rows += [
+        transaction((start + timedelta(days=14 * week)).isoformat(), 2000.0, "ACME PAYROLL", "Income")
+        for week in range(13)
+    ]
+    # Paid on a different day each month
+    for day, amount in zip(("01-03", "02-27", "03-15", "04-02", "05-20", "06-11"), (80, 85, 78, 82, 90, 80)):
+        rows.append(transaction(f"2024-{day}", -amount, "City Power", "Utilities"))
+    # Cancelled after March
+    rows += [transaction(f"2024-{month:02d}-01", -30.0, "Gym", "Health") for month in (1, 2, 3)]
+    # Irregular days and amounts
+    for day, amount in (("01-09", 3.0), ("01-10", 7.0), ("02-21", 4.5), ("04-30", 12.0)):
+        rows.append(transaction(f"2024-{day}", -amount, "Corner coffee", "Food"))
+    return rows
+
+
+@pytest.fixture
+def history(client):
+    upload_transactions(client, _history())
+
+
+def _by_merchant(response):
+    assert response.status_code == 200, response.text
+    return {normalize_merchant(item["merchant"]): item for item in response.json()["items"]}
+
+
+def test_normalize_merchant():
+    assert normalize_merchant("NETFLIX.COM 8841") == normalize_merchant("Netflix.com  #12") == "netflix com"
+
+
+def test_detects_recurring_series(client, history):
+    items = _by_merchant(client.get("/api/recurring", params={"active_only": False}))
+    assert set(items) == {"netflix com", "acme payroll", "city power", "gym"}
+
+    netflix = items["netflix com"]
+    assert (netflix["period"], netflix["occurrences"], netflix["amount"]) == ("monthly", 6, -15.99)
+    assert (netflix["category"], netflix["next_date"]) == ("Subscriptions", "2024-07-05T00:00:00")
+    payroll = items["acme payroll"]
+    assert (payroll["type"], payroll["period"], payroll["interval_days"]) == ("income", "biweekly", 14.0)
+    assert payroll["monthly_amount"] == pytest.approx(2000.0 * 30.44 / 14, abs=0.01)
+    assert (items["city power"]["period"], items["city power"]["amount"]) == ("monthly", -81.0)
+    assert not items["gym"]["active"]
+
+
+def test_active_only_and_type_filters(client, history):
+    response = client.get("/api/recurring")
+    assert set(_by_merchant(response)) == {"netflix com", "acme payroll", "city power"}
+    assert response.json()["monthly_expenses"] == pytest.approx(15.99 + 81.0)
+
+    expenses = _by_merchant(client.get("/api/recurring", params={"type": "expense"}))
+    assert set(expenses) == {"netflix com", "city power"}
+    # Sorted by next expected date
+    dates = [item["next_date"] for item in client.get("/api/recurring").json()["items"]]
+    assert dates == sorted(dates)
+
+
+def test_new_uploads_refresh_only_their_merchants(client, history):
+    assert "gym" not in _by_merchant(client.get("/api/recurring"))
+    upload_transactions(client, [
+        transaction(f"2024-{month:02d}-01", -30.0, "GYM", "Health") for month in (4, 5, 6)
+    ], name="gym.csv")
+    items = _by_merchant(client.get("/api/recurring"))
+    assert (items["gym"]["occurrences"], items["gym"]["active"]) == (6, True)
+    assert items["netflix com"]["occurrences"] == 6
@@ -0,0 +1,66 @@
+import json
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+import responses
+from conftest import transaction, upload_transactions
+from responses import FastJSONResponse, negotiate_encoding
+
+PAYLOAD = {
+    "when": datetime(2024, 5, 1, 12, 30),
+    "day": date(2024, 5, 1),
+    "count": np.int64(3),
+    "amounts": np.array([1.5, 2.5]),
+}
+EXPECTED = {"when": "2024-05-01T12:30:00", "day": "2024-05-01", "count": 3, "amounts": [1.5, 2.5]}
+
+
+def test_fast_json_serializes_numpy_and_dates():
+    assert json.loads(FastJSONResponse(PAYLOAD).body) == EXPECTED
+
+
+def test_fallback_encoder_without_orjson(monkeypatch):
+    monkeypatch.setattr(responses, "orjson", None)
+    assert json.loads(FastJSONResponse(PAYLOAD).body) == EXPECTED
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=0.5, br;q=0", "gzip"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_brotli_is_preferred_when_installed():
+    expected = "br" if responses.brotli is not None else "gzip"
+    assert negotiate_encoding("gzip, br") == expected
+
+
+@pytest.fixture
+def many_rows(client):
+    upload_transactions(client, [transaction(f"2024-01-{day:02d}", -float(day), f"Shop {day}") for day in range(1, 29)])
+
+
+def test_large_responses_are_compressed(client, many_rows):
+    response = client.get("/api/transactions", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 28
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_streamed_responses_are_compressed(client, many_rows):
+    response = client.get("/api/export/transactions", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("\n") == 29
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+
+import sample_data  # noqa: E402
+from conftest import transaction, upload_transactions  # noqa: E402
+from models import NetWorthSnapshot, UploadedFile  # noqa: E402
+from snapshots import take_snapshot  # noqa: E402
+from tenancy import tenant_session  # noqa: E402
+
+
+def test_reloading_sample_data_clears_uploads_and_snapshots(client, tenant, db, monkeypatch):
+    monkeypatch.setattr(sample_data, "SessionLocal", lambda: tenant_session(tenant))
+    rows = [transaction("2024-01-05", -12.5, "Cafe", "Food")]
+    upload_transactions(client, rows)
+    take_snapshot(db)
+    db.commit()
+
+    sample_data.add_sample_data()
+    assert (db.query(UploadedFile).count(), db.query(NetWorthSnapshot).count()) == (0, 0)
+    # The same file is new again
+    assert upload_transactions(client, rows)["added_count"] == 1
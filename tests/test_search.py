@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import transaction, upload_transactions
+from search import build_match_query
+
+
+def test_build_match_query():
+    assert build_match_query("whole foo") == '"whole"* "foo"*'
+    # Operators and quotes are not passed through to FTS5
+    assert build_match_query('coffee" OR -x') == '"coffee"* "OR"* "x"*'
+    assert build_match_query("  ...  ") == ""
+
+
+@pytest.fixture
+def rows(client):
+    upload_transactions(client, [
+        transaction("2024-06-01", -85.5, "Whole Foods Market", "Food"),
+        transaction("2024-06-02", -12.0, "Café Crème", "Food"),
+        transaction("2024-06-03", -40.0, "Foot Locker", "Shopping"),
+        transaction("2024-06-04", -9.0, "Whole Foods Market Whole Foods", "Food"),
+    ])
+
+
+def _search(client, q, **params):
+    response = client.get("/api/transactions/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_prefix_terms_are_anded(client, rows):
+    assert {row["description"] for row in _search(client, "whole foo")} == {
+        "Whole Foods Market", "Whole Foods Market Whole Foods"
+    }
+    assert {row["description"] for row in _search(client, "foo")} == {
+        "Whole Foods Market", "Foot Locker", "Whole Foods Market Whole Foods"
+    }
+
+
+def test_diacritics_are_ignored(client, rows):
+    assert [row["description"] for row in _search(client, "cafe creme")] == ["Café Crème"]
+
+
+def test_results_are_ranked_and_filtered(client, rows):
+    results = _search(client, "whole foods")
+    assert results[0]["description"] == "Whole Foods Market Whole Foods"
+    assert results[0]["score"] > results[1]["score"]
+    assert [row["description"] for row in _search(client, "foo", category="Shopping")] == ["Foot Locker"]
+    assert len(_search(client, "foo", limit=1)) == 1
+
+
+def test_other_tenants_rows_are_not_found(other_client, rows):
+    assert _search(other_client, "whole") == []
+
+
+def test_empty_query_is_rejected(client):
+    assert client.get("/api/transactions/search", params={"q": ""}).status_code == 422
+    assert _search(client, "!!!") == []
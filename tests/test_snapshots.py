@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from conftest import csv_file, transaction, upload_transactions
+from snapshots import backfill_snapshots
+
+DAYS = ["2024-01-10", "2024-01-11", "2024-01-12", "2024-01-13"]
+
+
+@pytest.fixture
+def history(client, admin_headers):
+    accounts = [
+        {"name": "Checking", "account_type": "checking", "balance": 100.0},
+        {"name": "Card", "account_type": "credit", "balance": 0.0},
+    ]
+    assert client.post("/api/upload/accounts", files=csv_file(accounts, "accounts.csv")).status_code == 200
+    upload_transactions(client, [
+        transaction("2024-01-10", 50.0, "Refund"),
+        transaction("2024-01-12", -30.0, "Groceries"),
+        transaction("2024-01-11", 20.0, "Dinner", account="Card"),
+    ])
+    lots = [{"symbol": "SNAPTEST", "shares": 2, "purchase_price": 40.0, "current_price": 50.0,
+             "purchase_date": "2024-01-11"}]
+    assert client.post("/api/upload/investments", files=csv_file(lots, "lots.csv")).status_code == 200
+    # SNAPTEST prices are only ever recorded by this test
+    response = client.post("/api/admin/prices", params={"symbol": "SNAPTEST", "close": 45.0, "date": "2024-01-12"},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+
+def _history(client, **params):
+    response = client.get("/api/net-worth/history", params={"start_date": DAYS[0], "end_date": DAYS[-1], **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_backfill_reconstructs_each_day(client, history):
+    response = client.post("/api/net-worth/snapshots", params={"start_date": DAYS[0]})
+    assert response.status_code == 200, response.text
+    assert response.json()["days"] == (date.today() - date(2024, 1, 10)).days + 1
+
+    snapshots = _history(client)
+    assert snapshots["dates"] == DAYS
+    # Balances run backwards from the current 120 on checking and 20 on the card
+    assert snapshots["cash"] == [150.0, 150.0, 120.0, 120.0]
+    assert snapshots["liabilities"] == [0.0, 20.0, 20.0, 20.0]
+    # From the purchase date: purchase price, then the recorded close
+    assert snapshots["holdings_value"] == [0.0, 80.0, 90.0, 90.0]
+    assert snapshots["net_worth"] == [150.0, 210.0, 190.0, 190.0]
+
+
+def test_account_balances(client, history):
+    client.post("/api/net-worth/snapshots", params={"backfill": True})
+    snapshots = _history(client, include_accounts=True)
+    assert sorted(snapshots["accounts"].values()) == [[0.0, 20.0, 20.0, 20.0], [150.0, 150.0, 120.0, 120.0]]
+
+
+def test_today_matches_the_live_net_worth(client, history):
+    snapshot = client.post("/api/net-worth/snapshots").json()
+    assert snapshot["date"] == date.today().isoformat()
+    assert snapshot["net_worth"] == pytest.approx(client.get("/api/net-worth").json()["net_worth"])
+
+
+def test_rerunning_a_backfill_replaces_days(client, db, history):
+    client.post("/api/net-worth/snapshots", params={"start_date": DAYS[0]})
+    upload_transactions(client, [transaction("2024-01-11", -10.0, "Late entry")], name="late.csv")
+    # Nothing changes until the days are snapshotted again
+    assert _history(client)["cash"] == [150.0, 150.0, 120.0, 120.0]
+    assert backfill_snapshots(db, start=date(2024, 1, 10), end=date(2024, 1, 13)) == 4
+    db.commit()
+    assert _history(client)["cash"] == [150.0, 140.0, 110.0, 110.0]
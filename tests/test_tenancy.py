@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+from datetime import date
+
+from sqlalchemy import select
+
+from conftest import csv_file, transaction, upload_transactions
+from models import FxRate, MonthlyRollup, Price
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+
+def _first_account_id(client):
+    return client.get("/api/balances/checkpoints").json()["accounts"][0]["account_id"]
+
+
+def test_tenants_only_see_their_own_rows(client, other_client):
+    upload_transactions(client, [transaction("2024-04-01", -20.0, "Pharmacy", "Health")])
+    upload_transactions(other_client, [transaction("2024-04-02", -35.0, "Cinema", "Fun")])
+
+    assert [row["description"] for row in client.get("/api/transactions").json()] == ["Pharmacy"]
+    assert [row["description"] for row in other_client.get("/api/transactions").json()] == ["Cinema"]
+    assert [row["category"] for row in client.get("/api/analytics/categories", params={"start_month": "2024-01"}).json()] == ["Health"]
+    # Same fingerprintable row in another tenant is not a duplicate
+    assert upload_transactions(other_client, [transaction("2024-04-01", -20.0, "Pharmacy")])["added_count"] == 1
+
+
+def test_cross_tenant_reads_are_not_found(client, other_client):
+    upload_transactions(client, [transaction("2024-04-01", -20.0, "Pharmacy")])
+    account_id = _first_account_id(client)
+    assert client.get(f"/api/accounts/{account_id}/balance").status_code == 200
+    for path in ("balance", "balances", "checkpoints"):
+        assert other_client.get(f"/api/accounts/{account_id}/{path}").status_code == 404
+
+
+def test_cross_tenant_rule_delete_is_not_found(client, other_client):
+    rule = client.post("/api/categorization/rules", params={"category": "Food", "pattern": "cafe"}).json()
+    assert other_client.delete(f"/api/categorization/rules/{rule['id']}").status_code == 404
+    assert [row["id"] for row in client.get("/api/categorization/rules").json()] == [rule["id"]]
+
+
+def test_invalid_tenant_header_is_rejected(client):
+    assert client.get("/api/transactions", headers={"X-Tenant-ID": "../other"}).status_code == 400
+
+
+def test_tenants_cannot_write_fx_rates(client, admin_headers):
+    params = {"currency": "CHF", "rate": 1.1, "date": "2020-01-01"}
+    assert client.post("/api/fx/rates", params=params).status_code == 405
+    assert client.post("/api/admin/fx/rates", params=params).status_code == 403
+    assert client.post("/api/admin/fx/rates", params=params, headers={"X-Admin-Token": "guess"}).status_code == 403
+
+    assert client.post("/api/admin/fx/rates", params=params, headers=admin_headers).status_code == 200
+    rates = client.get("/api/fx/rates", params={"currency": "CHF"}).json()["rates"]
+    assert rates == [{"currency": "CHF", "date": "2020-01-01", "rate": 1.1}]
+
+
+def test_portfolio_refresh_leaves_shared_prices_alone(client, db):
+    lots = [{"symbol": "TENANTONLY", "shares": 1, "purchase_price": 10.0, "current_price": 12.0,
+             "purchase_date": "2024-01-02"}]
+    assert client.post("/api/upload/investments", files=csv_file(lots, "lots.csv")).status_code == 200
+    assert client.get("/api/portfolio/value").status_code == 200
+    assert db.execute(select(Price).where(Price.symbol == "TENANTONLY")).first() is None
+
+
+def test_admin_records_prices(client, db, admin_headers):
+    params = {"symbol": "ADMINSYM", "close": 42.0, "date": "2024-06-28"}
+    assert client.post("/api/admin/prices", params=params).status_code == 403
+    assert client.post("/api/admin/prices", params=params, headers=admin_headers).status_code == 200
+    price = db.execute(select(Price).where(Price.symbol == "ADMINSYM")).scalar_one()
+    assert (price.date, price.close) == (date(2024, 6, 28), 42.0)
+    # Market data rows carry no tenant
+    assert not hasattr(FxRate, "tenant_id") and not hasattr(Price, "tenant_id")
+
+
+def test_maintenance_scripts_run_for_every_tenant(client, other_client, tenant, db):
+    upload_transactions(client, [transaction("2024-04-01", -20.0, "Pharmacy", "Health")])
+    upload_transactions(other_client, [transaction("2024-04-02", -35.0, "Cinema", "Fun")])
+    db.query(MonthlyRollup).delete()
+    db.commit()
+
+    script = subprocess.run([sys.executable, os.path.join(BACKEND, "rollups.py")],
+                            check=True, capture_output=True, text=True)
+    assert f"{tenant}: rebuilt" in script.stdout
+    assert db.query(MonthlyRollup.category).scalar() == "Health"
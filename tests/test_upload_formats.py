@@ -0,0 +1,69 @@
+import io
+
+import pandas as pd
+import pytest
+
+from conftest import transaction
+
+pa = pytest.importorskip("pyarrow")
+
+ROWS = [
+    transaction("2024-01-05", 1000.0, "Salary", "Income"),
+    transaction("2024-01-06", -40.0, "Groceries", "Food"),
+]
+
+
+def _upload(client, name, contents):
+    response = client.post("/api/upload/transactions", files={"file": (name, contents)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _arrow_file(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _arrow_stream(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _parquet(frame):
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("name, encode", [
+    ("transactions.parquet", _parquet),
+    ("transactions.arrow", lambda frame: _arrow_file(pa.Table.from_pandas(frame, preserve_index=False))),
+    ("transactions.ipc", lambda frame: _arrow_stream(pa.Table.from_pandas(frame, preserve_index=False))),
+    ("transactions.jsonl", lambda frame: frame.to_json(orient="records", lines=True).encode("utf-8")),
+])
+def test_columnar_and_ndjson_uploads(client, name, encode):
+    frame = pd.DataFrame(ROWS)
+    # Typed dates, as columnar files usually carry them
+    if not name.endswith(".jsonl"):
+        frame["date"] = pd.to_datetime(frame["date"])
+    assert _upload(client, name, encode(frame))["added_count"] == 2
+    rows = client.get("/api/transactions", params={"sort": "date", "order": "asc"}).json()
+    assert [(row["date"][:10], row["amount"], row["category"]) for row in rows] == [
+        ("2024-01-05", 1000.0, "Income"), ("2024-01-06", -40.0, "Food"),
+    ]
+
+
+def test_formats_share_deduplication(client):
+    _upload(client, "january.parquet", _parquet(pd.DataFrame(ROWS)))
+    result = _upload(client, "january.csv", pd.DataFrame(ROWS).to_csv(index=False).encode("utf-8"))
+    assert (result["added_count"], result["duplicate_count"]) == (0, 2)
+
+
+def test_unknown_extension_is_rejected(client):
+    response = client.post("/api/upload/transactions", files={"file": ("transactions.xlsx", b"")})
+    assert response.status_code == 400
+    assert "Parquet" in response.json()["detail"]
@@ -0,0 +1,65 @@
+import pandas as pd
+
+from conftest import csv_file, transaction, upload_transactions
+from validation import ACCOUNT_SCHEMA, TRANSACTION_SCHEMA, missing_columns, validate_frame
+
+
+def test_valid_rows_are_coerced():
+    clean, errors = validate_frame(pd.DataFrame({
+        "date": ["2024-01-05", "05/02/2024"],
+        "amount": ["-4.50", "12"],
+        "description": ["  Coffee ", "Refund"],
+        "category": ["", "Food"],
+        "account_name": ["Checking", "Checking"],
+    }), TRANSACTION_SCHEMA)
+    assert errors == []
+    assert list(clean["date"]) == [pd.Timestamp("2024-01-05"), pd.Timestamp("2024-05-02")]
+    assert list(clean["amount"]) == [-4.5, 12.0]
+    # Strings are trimmed; blank optional strings become None
+    assert list(clean["description"]) == ["Coffee", "Refund"]
+    assert list(clean["category"]) == [None, "Food"]
+    assert list(clean["currency"]) == [None, None]
+
+
+def test_invalid_rows_are_dropped_and_reported():
+    clean, errors = validate_frame(pd.DataFrame({
+        "date": ["2024-01-05", "someday", "2024-01-07"],
+        "amount": ["1", "2", "lots"],
+        "description": ["Ok", "   ", "Bad amount"],
+        "account_name": ["Checking"] * 3,
+    }), TRANSACTION_SCHEMA)
+    assert list(clean.index) == [0]
+    # Row numbers are 1-based; problems come in row then column order
+    assert errors == [
+        "Row 2: invalid datetime value for 'date': 'someday'",
+        "Row 2: missing value for 'description'",
+        "Row 3: invalid numeric value for 'amount': 'lots'",
+    ]
+
+
+def test_allowed_values_and_error_limit():
+    frame = pd.DataFrame({"name": [f"A{i}" for i in range(20)], "account_type": "brokerage", "balance": 1.0})
+    clean, errors = validate_frame(frame, ACCOUNT_SCHEMA, error_limit=3)
+    assert clean.empty and len(errors) == 3
+    assert errors[0] == "Row 1: 'account_type' must be one of checking, savings, investment, credit, got 'brokerage'"
+
+
+def test_missing_columns_lists_only_required_fields():
+    assert missing_columns(pd.DataFrame(columns=["date", "amount", "currency"]), TRANSACTION_SCHEMA) == [
+        "description", "account_name"
+    ]
+
+
+def test_upload_reports_row_errors(client):
+    result = upload_transactions(client, [
+        transaction("2024-01-05", -4.5, "Coffee"),
+        transaction("2024-01-06", "ten", "Lunch"),
+    ])
+    assert result["added_count"] == 1
+    assert result["errors"] == ["Row 2: invalid numeric value for 'amount': 'ten'"]
+
+
+def test_upload_without_a_required_column_is_rejected(client):
+    response = client.post("/api/upload/transactions", files=csv_file([{"date": "2024-01-05", "amount": 1.0}]))
+    assert response.status_code == 400
+    assert "description" in response.json()["detail"]